@@ -0,0 +1,204 @@
+"""
+Compressed output encodings for finished conversions.
+
+The WAV assembled during synthesis is re-encoded (FLAC, Opus/Ogg or MP3) in a
+separate worker process, so compressing a long audiobook never competes for
+the GIL with the threads serving requests. StreamingEncoder encodes the audio
+while it is still being synthesized, so a finished conversion only waits for
+its last chunk to be encoded; encode_in_background re-encodes a finished file.
+Imported by the worker processes, so it stays free of heavy dependencies.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+import soundfile as sf
+
+# Output encodings by name: libsndfile container, codec and file suffix
+OUTPUT_FORMATS = {
+    "wav": {"format": "WAV", "subtype": "PCM_16", "suffix": ".wav", "label": "WAV (uncompressed)"},
+    "flac": {"format": "FLAC", "subtype": "PCM_16", "suffix": ".flac", "label": "FLAC (lossless)"},
+    "opus": {"format": "OGG", "subtype": "OPUS", "suffix": ".ogg", "label": "Opus/Ogg"},
+    "mp3": {"format": "MP3", "subtype": "MPEG_LAYER_III", "suffix": ".mp3", "label": "MP3"},
+}
+DEFAULT_OUTPUT_FORMAT = "wav"
+
+# Speech stays clear well below music bitrates
+DEFAULT_BITRATES_KBPS = {"opus": 32, "mp3": 64}
+
+# Bitrates libsndfile spreads compression levels 0..1 over, for 24 kHz mono
+# (OpenAI TTS output): level 0 is the highest bitrate, level 1 the lowest
+_BITRATE_RANGES_KBPS = {"opus": (256, 6), "mp3": (160, 8)}
+
+# Ten seconds of 24 kHz audio per read/write
+ENCODE_BLOCK_FRAMES = 240000
+
+# Seconds close() waits for a streaming encoder to finish the audio it was sent
+STREAM_CLOSE_TIMEOUT = 300
+
+# Process pools by worker count, so converters configured with different sizes each get theirs
+_encoding_pools = {}
+_encoding_pool_lock = threading.Lock()
+
+
+def available_output_formats() -> List[str]:
+    """Return the output formats the installed libsndfile can write."""
+    formats = sf.available_formats()
+    available = []
+    for name, spec in OUTPUT_FORMATS.items():
+        if spec["format"] in formats and spec["subtype"] in sf.available_subtypes(spec["format"]):
+            available.append(name)
+    return available
+
+
+def compression_level(output_format: str, bitrate_kbps: Optional[float] = None) -> Optional[float]:
+    """Return the libsndfile compression level that gives roughly bitrate_kbps for a lossy format."""
+    if output_format not in _BITRATE_RANGES_KBPS:
+        return None
+    bitrate_kbps = bitrate_kbps or DEFAULT_BITRATES_KBPS[output_format]
+    highest, lowest = _BITRATE_RANGES_KBPS[output_format]
+    level = (highest - bitrate_kbps) / (highest - lowest)
+    # libsndfile rejects a level of exactly 1.0 for MP3
+    return min(max(level, 0.0), 0.99)
+
+
+def output_path_for(input_path: str, output_format: str) -> str:
+    """Return input_path with the suffix of output_format."""
+    return os.path.splitext(input_path)[0] + OUTPUT_FORMATS[output_format]["suffix"]
+
+
+def open_encoded_output(output_path: str, output_format: str, sample_rate: int, channels: int,
+                        bitrate_kbps: Optional[float] = None) -> sf.SoundFile:
+    """Open output_path for writing in output_format."""
+    spec = OUTPUT_FORMATS[output_format]
+    options = {}
+    level = compression_level(output_format, bitrate_kbps)
+    if level is not None:
+        options["compression_level"] = level
+    if output_format == "mp3":
+        # Constant bitrate keeps the file size predictable
+        options["bitrate_mode"] = "CONSTANT"
+    return sf.SoundFile(output_path, mode="w", samplerate=sample_rate, channels=channels,
+                        subtype=spec["subtype"], format=spec["format"], **options)
+
+
+def encode_audio_file(input_path: str, output_path: str, output_format: str,
+                      bitrate_kbps: Optional[float] = None) -> str:
+    """Encode an audio file into output_format block by block. Returns output_path."""
+    with sf.SoundFile(input_path) as source:
+        with open_encoded_output(output_path, output_format, source.samplerate, source.channels,
+                                 bitrate_kbps) as output:
+            for block in source.blocks(blocksize=ENCODE_BLOCK_FRAMES, dtype="int16"):
+                output.write(block)
+    return output_path
+
+
+def encode_stream(blocks, results, output_path: str, output_format: str, sample_rate: int,
+                  bitrate_kbps: Optional[float] = None):
+    """Encode 16-bit mono PCM blocks from the blocks queue until a None; runs in a worker process.
+
+    Sends None on results once the file is complete, or an error message.
+    """
+    try:
+        with open_encoded_output(output_path, output_format, sample_rate, 1, bitrate_kbps) as output:
+            while True:
+                block = blocks.get()
+                if block is None:
+                    break
+                output.write(np.frombuffer(block, dtype="<i2"))
+        results.send(None)
+    except Exception as e:
+        results.send(f"{e.__class__.__name__}: {e}")
+    finally:
+        results.close()
+
+
+class StreamingEncoder:
+    """Encode audio to output_format in a worker process while it is being produced.
+
+    append() only queues the samples (a feeder thread hands them to the worker), so
+    synthesis never waits on the encoder, not even while its process is starting.
+    Each encoder has its own process rather than a pool slot, so it never queues
+    behind other conversions' encoders. If the worker fails, close() raises and the
+    caller can deliver the WAV instead.
+    """
+
+    def __init__(self, output_path: str, output_format: str, sample_rate: int,
+                 bitrate_kbps: Optional[float] = None):
+        self.output_path = output_path
+        self.output_format = output_format
+        context = multiprocessing.get_context("spawn")
+        self._blocks = context.Queue()
+        self._results, worker_results = context.Pipe(duplex=False)
+        self._process = context.Process(target=encode_stream, name="stream-encode", daemon=True,
+                                        args=(self._blocks, worker_results, output_path, output_format,
+                                              sample_rate, bitrate_kbps))
+        self._process.start()
+        worker_results.close()
+
+    def append(self, samples: np.ndarray):
+        """Queue 16-bit mono samples for the encoder."""
+        if len(samples):
+            self._blocks.put(samples.astype("<i2", copy=False).tobytes())
+
+    def close(self) -> str:
+        """Wait for the encoder to finish the audio sent so far. Returns the encoded file; raises RuntimeError on failure."""
+        error = None
+        try:
+            self._blocks.put(None)
+            if not self._results.poll(STREAM_CLOSE_TIMEOUT):
+                error = "encoder timed out"
+            else:
+                error = self._results.recv()
+        except (OSError, EOFError) as e:
+            # The worker died without reporting back
+            error = f"encoder stopped ({e.__class__.__name__})"
+        finally:
+            self._finish(kill=error is not None)
+        if error is not None:
+            self._remove_output()
+            raise RuntimeError(error)
+        return self.output_path
+
+    def abort(self):
+        """Stop the encoder and remove its partial output."""
+        self._finish(kill=True)
+        self._remove_output()
+
+    def _finish(self, kill: bool = False):
+        if kill and self._process.is_alive():
+            self._process.terminate()
+        self._process.join(timeout=5)
+        self._results.close()
+        # Blocks the worker never read are dropped rather than flushed to it
+        self._blocks.cancel_join_thread()
+        self._blocks.close()
+
+    def _remove_output(self):
+        try:
+            os.unlink(self.output_path)
+        except FileNotFoundError:
+            pass
+
+
+def get_encoding_process_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Return the process pool used to encode finished files, with max_workers workers (one per core by default)."""
+    max_workers = max(1, int(max_workers or os.cpu_count() or 1))
+    with _encoding_pool_lock:
+        pool = _encoding_pools.get(max_workers)
+        if pool is None:
+            # Spawned workers don't inherit the server's threads or open files
+            pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+            _encoding_pools[max_workers] = pool
+        return pool
+
+
+def encode_in_background(input_path: str, output_format: str, bitrate_kbps: Optional[float] = None) -> Future:
+    """Start encoding input_path next to itself in a worker process. The future's result is the new path."""
+    output_path = output_path_for(input_path, output_format)
+    return get_encoding_process_pool().submit(encode_audio_file, input_path, output_path,
+                                              output_format, bitrate_kbps)
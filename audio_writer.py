@@ -0,0 +1,83 @@
+"""
+Incremental audio assembly for PDF to Audio conversions.
+"""
+
+import io
+from typing import Callable, Optional
+
+import numpy as np
+import soundfile as sf
+
+# Pause inserted between consecutive chunks
+DEFAULT_PAUSE_SECONDS = 0.5
+
+
+class IncrementalAudioWriter:
+    """Append chunk audio to a single mono output file as it arrives.
+
+    The output is opened once, on the first chunk (which fixes the sample
+    rate), and every chunk is written straight through as it arrives, so peak
+    memory stays at a few chunks no matter how long the document is. Samples
+    are stored as 16-bit PCM.
+    """
+
+    def __init__(self, output_path: str, pause_seconds: float = DEFAULT_PAUSE_SECONDS,
+                 subtype: str = "PCM_16", tee: Optional[Callable[[np.ndarray], None]] = None):
+        self.output_path = output_path
+        # Also called with every block written, pauses included (e.g. StreamingEncoder.append)
+        self.tee = tee
+        self.pause_seconds = pause_seconds
+        self.subtype = subtype
+        self.sample_rate = None
+        self.frames_written = 0
+        self.chunks_written = 0
+        self._output = None
+
+    def _open(self, sample_rate: int):
+        self.sample_rate = sample_rate
+        self._output = sf.SoundFile(self.output_path, mode="w", samplerate=sample_rate,
+                                    channels=1, subtype=self.subtype)
+
+    def _write(self, samples: np.ndarray):
+        self._output.write(samples)
+        self.frames_written += len(samples)
+        if self.tee is not None:
+            self.tee(samples)
+
+    def _write_pause(self):
+        # No pause before the first chunk or after the last one
+        if self.chunks_written > 0 and self.pause_seconds > 0:
+            self._write(np.zeros(int(self.pause_seconds * self.sample_rate), dtype=np.int16))
+
+    def append_samples(self, samples: np.ndarray, sample_rate: int) -> bool:
+        """Append mono samples to the output. Returns False if they were skipped."""
+        if self._output is None:
+            self._open(sample_rate)
+        elif sample_rate != self.sample_rate:
+            print(f"⚠️ Skipping chunk: sample rate {sample_rate} Hz does not match {self.sample_rate} Hz")
+            return False
+
+        self._write_pause()
+        self._write(samples)
+        self.chunks_written += 1
+        return True
+
+    @property
+    def duration(self) -> float:
+        """Seconds of audio written so far."""
+        return self.frames_written / self.sample_rate if self.sample_rate else 0.0
+
+    def close(self) -> Optional[str]:
+        """Finish the output file. Returns its path, or None if nothing was written."""
+        if self._output is None:
+            return None
+        self._output.close()
+        self._output = None
+        return self.output_path if self.chunks_written else None
+
+
+def encode_wav_bytes(sample_rate: int, samples: np.ndarray) -> bytes:
+    """Encode mono samples as an in-memory WAV file."""
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, sample_rate, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Headless batch conversion of PDFs to audio.
+
+Extraction runs across a process pool (PDF parsing is CPU-bound) and synthesis
+across a thread pool in this process (OpenAI TTS is I/O-bound), so a large
+backlog keeps every core and the TTS request budget busy at the same time.
+A JSON summary records per-file timings, character counts and failures.
+
+Usage:
+    python batch_convert.py pdfs/ --output-dir audio/
+    python batch_convert.py --manifest backlog.txt --output-dir audio/ --voice nova
+    python batch_convert.py manuals/ --output-dir audio/ --revisions   # re-voice only what changed
+    python batch_convert.py books/ --output-dir audio/ --chapters --format mp3   # a directory of chapters per book
+    python batch_convert.py drafts/ --output-dir audio/ --engine espeak   # offline, on local cores, no API key
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+import soundfile as sf
+
+import metrics
+from audio_encoding import OUTPUT_FORMATS, available_output_formats
+from cache import DEFAULT_CACHE_DIR
+from chapters import CHAPTER_INDEX_FILENAME, DEFAULT_CHAPTER_LEVEL
+from mineru_client import DEFAULT_SHARD_PAGES
+from chunking import CHUNKING_MODES, CHUNKING_PACKED
+from converter import PDFToAudioConverter
+from tts_engines import DEFAULT_TTS_ENGINE, ENGINE_OPENAI, TTS_ENGINES
+
+VOICES = ["alloy", "echo", "fable", "onyx", "nova", "shimmer"]
+
+# Documents synthesized at the same time; their requests share one rate budget
+DEFAULT_FILES_IN_FLIGHT = 4
+# TTS requests in flight across all documents
+DEFAULT_BATCH_TTS_CONCURRENCY = 8
+
+SUMMARY_FILENAME = "summary.json"
+
+# Converter used for extraction inside each worker process
+_worker_converter = None
+
+
+def find_pdfs(paths: List[str], manifest: Optional[str] = None, suffix: str = ".wav") -> List[Tuple[str, str]]:
+    """Collect (PDF path, output name) pairs from files, directories and an optional manifest.
+
+    Directories are searched recursively and keep their layout in the output
+    names. A manifest lists one PDF per line; blank lines and lines starting
+    with # are ignored, and relative paths are resolved against the manifest.
+    """
+    jobs = []
+    if manifest:
+        base_dir = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    pdf_path = os.path.join(base_dir, line)
+                    jobs.append((pdf_path, os.path.basename(pdf_path)))
+
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(".pdf"):
+                        pdf_path = os.path.join(root, name)
+                        jobs.append((pdf_path, os.path.relpath(pdf_path, path)))
+        else:
+            jobs.append((path, os.path.basename(path)))
+
+    # Each PDF once, and no two outputs with the same name
+    unique_jobs = []
+    seen_pdfs = set()
+    seen_outputs = set()
+    for pdf_path, name in jobs:
+        pdf_path = os.path.abspath(pdf_path)
+        if pdf_path in seen_pdfs:
+            continue
+        seen_pdfs.add(pdf_path)
+        output_name = os.path.splitext(name)[0] + suffix
+        copy_number = 2
+        while output_name in seen_outputs:
+            output_name = f"{os.path.splitext(name)[0]}-{copy_number}{suffix}"
+            copy_number += 1
+        seen_outputs.add(output_name)
+        unique_jobs.append((pdf_path, output_name))
+    return unique_jobs
+
+
+def _init_extraction_worker(converter_options: dict):
+    global _worker_converter
+    _worker_converter = PDFToAudioConverter(**converter_options)
+
+
+def _extract_in_worker(pdf_path: str) -> Tuple[str, float]:
+    start = time.perf_counter()
+    # The streaming extractor raises on failure, where extract_text_from_pdf would return an
+    # error message that can't be told apart from a document starting with the same words
+    with _worker_converter.extraction_slot():
+        text = ' '.join(_worker_converter.iter_text_from_pdf(pdf_path))
+    return text, time.perf_counter() - start
+
+
+def _extract_sections_in_worker(pdf_path: str) -> Tuple[list, float, str]:
+    start = time.perf_counter()
+    sections = _worker_converter.extract_sections_from_pdf(pdf_path)
+    return sections, time.perf_counter() - start, _worker_converter.document_title(pdf_path)
+
+
+def synthesize_file(converter: PDFToAudioConverter, text: str, voice: str, output_path: str,
+                    revision_key: Optional[str] = None) -> Tuple[float, float]:
+    """Synthesize text into output_path. Returns (seconds taken, audio duration); raises RuntimeError on failure."""
+    start = time.perf_counter()
+    # The converter's output format and bitrate apply
+    audio_file, status_message = converter.text_to_speech(text, voice, revision_key=revision_key)
+    if not audio_file:
+        raise RuntimeError(status_message)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    shutil.move(audio_file, output_path)
+    return time.perf_counter() - start, sf.info(output_path).duration
+
+
+def synthesize_chapters(converter: PDFToAudioConverter, sections: list, title: str, voice: str, output_dir: str,
+                        revision_key: Optional[str] = None) -> Tuple[float, float]:
+    """Synthesize section pieces into chapter files in output_dir. Returns (seconds taken, audio duration); raises RuntimeError on failure."""
+    start = time.perf_counter()
+    output_files, status_message = converter.sections_to_speech(sections, voice, output_dir=output_dir, title=title,
+                                                                revision_key=revision_key)
+    if not output_files:
+        raise RuntimeError(status_message)
+    with open(os.path.join(output_dir, CHAPTER_INDEX_FILENAME), encoding="utf-8") as f:
+        duration = json.load(f)["duration_seconds"]
+    return time.perf_counter() - start, duration
+
+
+def run_batch(jobs: List[Tuple[str, str]], output_dir: str, converter: PDFToAudioConverter, voice: str,
+              extract_workers: int, files_in_flight: int, converter_options: dict,
+              skip_existing: bool = False, track_revisions: bool = False, chapters: bool = False) -> dict:
+    """Convert every job and return the batch summary.
+    
+    With track_revisions, each output file name identifies a document across
+    batches, and audio of chunks unchanged since its last conversion is reused.
+    With chapters, each output is a directory of chapter files with a playlist
+    and chapter table.
+    """
+    started_at = datetime.now(timezone.utc)
+    wall_start = time.perf_counter()
+    results = []
+    pending = []
+    for pdf_path, output_name in jobs:
+        output_path = os.path.join(output_dir, output_name)
+        record = {"pdf": pdf_path, "output": output_path, "status": "pending", "error": None,
+                  "characters": 0, "extract_seconds": None, "synthesize_seconds": None, "audio_seconds": None}
+        results.append(record)
+        # A chapter directory is only complete once its chapter table has been written
+        done_marker = os.path.join(output_path, CHAPTER_INDEX_FILENAME) if chapters else output_path
+        if skip_existing and os.path.exists(done_marker):
+            record["status"] = "skipped"
+        else:
+            pending.append(record)
+
+    total = len(pending)
+    done = 0
+
+    def report(record: dict):
+        nonlocal done
+        done += 1
+        name = os.path.basename(record["pdf"])
+        if record["status"] == "succeeded":
+            print(f"✅ [{done}/{total}] {name}: {record['audio_seconds']:.1f}s of audio "
+                  f"(extract {record['extract_seconds']:.1f}s, synthesize {record['synthesize_seconds']:.1f}s)")
+        else:
+            print(f"❌ [{done}/{total}] {name}: {record['error']}")
+
+    print(f"🚀 Converting {total} PDFs ({extract_workers} extraction processes, {files_in_flight} documents synthesizing)...")
+
+    # Extracted text waiting for synthesis is held in memory, so extraction
+    # only runs a bounded distance ahead of synthesis
+    max_ahead = extract_workers * 2 + files_in_flight
+    queued = iter(pending)
+    extracting = {}
+    synthesizing = {}
+
+    # Spawned workers don't inherit this process's threads or open connections
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=extract_workers, mp_context=context,
+                             initializer=_init_extraction_worker, initargs=(converter_options,)) as extract_pool, \
+            ThreadPoolExecutor(max_workers=files_in_flight, thread_name_prefix="synthesis") as synthesis_pool:
+        while True:
+            while len(extracting) + len(synthesizing) < max_ahead:
+                record = next(queued, None)
+                if record is None:
+                    break
+                extract = _extract_sections_in_worker if chapters else _extract_in_worker
+                extracting[extract_pool.submit(extract, record["pdf"])] = record
+            if not extracting and not synthesizing:
+                break
+
+            finished, _ = wait(list(extracting) + list(synthesizing), return_when=FIRST_COMPLETED)
+            for future in finished:
+                if future in extracting:
+                    record = extracting.pop(future)
+                    error = None
+                    try:
+                        if chapters:
+                            sections, record["extract_seconds"], title = future.result()
+                            text = ' '.join(section_text for _, _, section_text in sections)
+                        else:
+                            text, record["extract_seconds"] = future.result()
+                        if not text.strip():
+                            error = "No text found in the PDF file."
+                    except ImportError:
+                        error = "PDF extraction failed. Please install PyMuPDF: pip install PyMuPDF"
+                    except Exception as e:
+                        error = f"Error extracting text from PDF: {str(e)}"
+                    if error:
+                        record["status"] = "failed"
+                        record["error"] = error
+                        report(record)
+                        continue
+                    record["characters"] = len(text)
+                    revision_key = os.path.relpath(record["output"], output_dir) if track_revisions else None
+                    if chapters:
+                        future = synthesis_pool.submit(synthesize_chapters, converter, sections, title, voice,
+                                                       record["output"], revision_key)
+                    else:
+                        future = synthesis_pool.submit(synthesize_file, converter, text, voice,
+                                                       record["output"], revision_key)
+                    synthesizing[future] = record
+                else:
+                    record = synthesizing.pop(future)
+                    try:
+                        record["synthesize_seconds"], record["audio_seconds"] = future.result()
+                        record["status"] = "succeeded"
+                    except Exception as e:
+                        record["status"] = "failed"
+                        record["error"] = str(e)
+                    report(record)
+
+    succeeded = [record for record in results if record["status"] == "succeeded"]
+    return {
+        "started_at": started_at.isoformat(),
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "wall_seconds": time.perf_counter() - wall_start,
+        "voice": voice,
+        "files": len(results),
+        "succeeded": len(succeeded),
+        "failed": sum(record["status"] == "failed" for record in results),
+        "skipped": sum(record["status"] == "skipped" for record in results),
+        "characters": sum(record["characters"] for record in succeeded),
+        "audio_seconds": sum(record["audio_seconds"] for record in succeeded),
+        "results": results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run a batch conversion from the command line. Returns the exit status."""
+    parser = argparse.ArgumentParser(description="Convert a batch of PDFs to audio without the web interface.")
+    parser.add_argument("paths", nargs="*", help="PDF files or directories of PDFs (searched recursively)")
+    parser.add_argument("--manifest", help="Text file listing one PDF path per line")
+    parser.add_argument("--output-dir", required=True, help="Directory for the audio files and the summary")
+    parser.add_argument("--voice", default="alloy", choices=VOICES,
+                        help="OpenAI TTS voice (the espeak engine uses a similar espeak-ng voice)")
+    parser.add_argument("--engine", default=DEFAULT_TTS_ENGINE, choices=TTS_ENGINES,
+                        help="TTS engine: OpenAI's API, or espeak-ng on local cores (offline, no API key)")
+    parser.add_argument("--local-tts-workers", type=int, default=None,
+                        help="Processes running local TTS with --engine espeak (default: one per core)")
+    parser.add_argument("--format", default="wav", choices=list(OUTPUT_FORMATS), dest="output_format",
+                        help="Output encoding")
+    parser.add_argument("--bitrate", type=float, default=None,
+                        help="Bitrate in kbps for MP3 and Opus (default: 64 and 32)")
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"),
+                        help="OpenAI API key (defaults to the OPENAI_API_KEY environment variable)")
+    parser.add_argument("--openai-base-url", default=os.environ.get("OPENAI_BASE_URL"),
+                        help="OpenAI-compatible API base URL (default: OPENAI_BASE_URL or api.openai.com)")
+    parser.add_argument("--extract-workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes extracting text in parallel (default: one per core)")
+    parser.add_argument("--files-in-flight", type=int, default=DEFAULT_FILES_IN_FLIGHT,
+                        help="Documents synthesized at the same time")
+    parser.add_argument("--tts-concurrency", type=int, default=DEFAULT_BATCH_TTS_CONCURRENCY,
+                        help="TTS requests in flight across all documents")
+    parser.add_argument("--requests-per-minute", type=float, default=None,
+                        help="TTS request budget (default: the converter's default)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Cache directory shared by all workers")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the extraction and audio caches")
+    parser.add_argument("--mineru-shard-pages", type=int, default=DEFAULT_SHARD_PAGES,
+                        help="Pages per MinerU request for long documents")
+    parser.add_argument("--always-mineru", action="store_true",
+                        help="Send every PDF to MinerU, even born-digital ones whose text layer could be read locally")
+    parser.add_argument("--chunking", default=CHUNKING_PACKED, choices=CHUNKING_MODES,
+                        help="Chunk boundaries: packed to the TTS limit, or content-defined so revised documents "
+                             "keep most of their chunks")
+    parser.add_argument("--revisions", action="store_true",
+                        help="Treat each output file as a document with revisions: reuse the audio of chunks "
+                             "unchanged since its last conversion (uses content-defined chunking)")
+    parser.add_argument("--chapters", action="store_true",
+                        help="Write a directory per PDF with one audio file per chapter (from the PDF outline or "
+                             "MinerU's headings), an M3U playlist and a JSON chapter table")
+    parser.add_argument("--chapter-level", type=int, default=DEFAULT_CHAPTER_LEVEL,
+                        help="Deepest outline or heading level that starts a new chapter file")
+    parser.add_argument("--skip-existing", action="store_true",
+                        help="Skip PDFs whose output file (or chapter table, with --chapters) already exists")
+    parser.add_argument("--summary", help=f"Summary path (default: OUTPUT_DIR/{SUMMARY_FILENAME})")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics for the synthesis stages on this port while the batch runs "
+                             "(extraction runs in worker processes and is timed in the summary)")
+    args = parser.parse_args(argv)
+
+    if not args.paths and not args.manifest:
+        parser.error("give at least one PDF, directory or --manifest")
+    if args.engine == ENGINE_OPENAI and not args.api_key:
+        parser.error("an OpenAI API key is required (--api-key or OPENAI_API_KEY)")
+
+    if args.output_format not in available_output_formats():
+        parser.error(f"the installed libsndfile can't write {args.output_format}")
+
+    # Chapter output goes to a directory per PDF, named like the single file would be without its suffix
+    jobs = find_pdfs(args.paths, args.manifest, "" if args.chapters else OUTPUT_FORMATS[args.output_format]["suffix"])
+    if not jobs:
+        print("No PDF files found.")
+        return 1
+
+    cache_dir = None if args.no_cache else args.cache_dir
+    # Each worker parses one document at a time, so no nested process pools
+    converter_options = {"cache_dir": cache_dir, "fallback_workers": 1,
+                         "mineru_shard_pages": args.mineru_shard_pages,
+                         "born_digital_fast_path": not args.always_mineru, "chapter_level": args.chapter_level}
+
+    converter_kwargs = {"tts_concurrency": args.tts_concurrency, "cache_dir": cache_dir,
+                        "output_format": args.output_format, "output_bitrate_kbps": args.bitrate,
+                        "openai_base_url": args.openai_base_url, "chunking": args.chunking,
+                        "chapter_level": args.chapter_level, "tts_engine": args.engine,
+                        "local_tts_workers": args.local_tts_workers}
+    if args.requests_per_minute:
+        converter_kwargs["tts_requests_per_minute"] = args.requests_per_minute
+    converter = PDFToAudioConverter(**converter_kwargs)
+    if converter.default_engine.needs_api_key:
+        status = converter.set_api_key(args.api_key)
+        print(status)
+        if not converter.client:
+            return 1
+    engine_error = converter.engine_error(converter.default_engine)
+    if engine_error:
+        print(engine_error)
+        return 1
+
+    if args.metrics_port:
+        metrics.start_metrics_server(args.metrics_port)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    summary = run_batch(jobs, args.output_dir, converter, args.voice,
+                        extract_workers=max(1, args.extract_workers),
+                        files_in_flight=max(1, args.files_in_flight),
+                        converter_options=converter_options,
+                        skip_existing=args.skip_existing,
+                        track_revisions=args.revisions,
+                        chapters=args.chapters)
+
+    summary_path = args.summary or os.path.join(args.output_dir, SUMMARY_FILENAME)
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    print("=" * 60)
+    print(f"🎊 Batch finished in {summary['wall_seconds']:.1f}s: {summary['succeeded']} succeeded, "
+          f"{summary['failed']} failed, {summary['skipped']} skipped. "
+          f"{summary['audio_seconds'] / 60:.1f} minutes of audio from {summary['characters']} characters.")
+    print(f"📋 Summary written to {summary_path}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the text and audio hot paths.
+
+Runs offline on synthetic MinerU-style markdown and synthetic PDFs, and
+reports throughput for text cleaning, chunking, PyMuPDF fallback extraction
+and audio assembly. Results can be saved as JSON (tagged with the git
+revision) and compared against an earlier run to catch regressions:
+
+    python benchmark.py --output before.json
+    python benchmark.py --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+
+import chunking
+import text_cleaning
+from audio_writer import IncrementalAudioWriter
+
+BENCHMARK_SUITES = ["import", "cleaning", "chunking", "extraction", "audio"]
+
+# Modules timed by the import benchmark, and dependencies they must not load at import time
+IMPORT_MODULES = ["converter", "batch_convert", "pdf_to_audio"]
+HEAVY_MODULES = ["gradio", "openai", "httpx", "fitz", "pymupdf"]
+
+# Slowdown (as a fraction of the baseline time) reported as a regression
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+
+# Audio the offline TTS stub returns per character, close to OpenAI TTS speaking rate
+STUB_SAMPLE_RATE = 24000
+STUB_SECONDS_PER_CHARACTER = 1 / 15
+
+# Building blocks for synthetic MinerU markdown output
+PROSE_SENTENCES = [
+    "The experimental results confirm the hypothesis stated in the previous section.",
+    "Each participant completed the survey within **thirty minutes** of the session.",
+    "Further details are given in the [appendix](https://example.org/appendix).",
+    "We refer to the *baseline* configuration as `cfg-0` throughout this chapter.",
+    "Contact the authors at research@example.org or visit www.example.org for data.",
+    "本研究采用了 MinerU 解析框架, 并对 PDF 文档进行了结构化处理.",
+    "The 8th iteration converged after $8 ^ { \\mathrm { t h } }$ epochs with $x^2$ loss.",
+    "The ratio $\\frac{a}{b}$ stays below $\\alpha + \\beta$ for all inputs.",
+]
+MARKDOWN_BLOCKS = [
+    "# Chapter {n}: Results",
+    "## Section {n}.1 Methodology",
+    "![Figure {n}](images/figure_{n}.jpg)",
+    "- First finding for item {n}\n- Second finding for item {n}\n- Third finding",
+    "1. Step one\n2. Step two\n3. Step three",
+    "> A quoted remark about section {n}.",
+    "| Metric | Value |\n|---|---|\n| Accuracy | 0.{n} |\n| Recall | 0.8 |",
+    "```\ncode_block_{n}()\n```",
+    "---",
+    "Page {n}",
+    "2024年1月{d}日",
+]
+
+
+def generate_mineru_markdown(size_bytes: int, seed: int = 0) -> str:
+    """Generate synthetic MinerU markdown with headers, LaTeX, CJK text and tables."""
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    n = 0
+    while total < size_bytes:
+        n += 1
+        if rng.random() < 0.3:
+            block = rng.choice(MARKDOWN_BLOCKS).format(n=n, d=n % 28 + 1)
+        else:
+            block = " ".join(rng.choice(PROSE_SENTENCES) for _ in range(rng.randint(3, 8)))
+        parts.append(block)
+        total += len(block.encode("utf-8")) + 2
+    return "\n\n".join(parts)
+
+
+def generate_synthetic_pdf(path: str, pages: int, seed: int = 0):
+    """Write a PDF with running headers, page numbers and paragraphs of prose on every page."""
+    import fitz  # PyMuPDF
+
+    rng = random.Random(seed)
+    # The built-in PDF fonts only cover Latin text
+    sentences = [sentence for sentence in PROSE_SENTENCES if sentence.isascii()]
+    doc = fitz.open()
+    for page_number in range(1, pages + 1):
+        page = doc.new_page()
+        page.insert_text((72, 40), "Synthetic Benchmark Report - Chapter 1", fontsize=9)
+        body = "\n\n".join(" ".join(rng.choice(sentences) for _ in range(6)) for _ in range(5))
+        page.insert_textbox(fitz.Rect(72, 72, 540, 760), body, fontsize=10)
+        page.insert_text((300, 800), str(page_number), fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+class _StubSpeechResponse:
+    def __init__(self, audio_bytes: bytes):
+        self.audio_bytes = audio_bytes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def iter_bytes(self, chunk_size: int):
+        for start in range(0, len(self.audio_bytes), chunk_size):
+            yield self.audio_bytes[start:start + chunk_size]
+
+
+class _StubSpeech:
+    def __init__(self):
+        self.with_streaming_response = self
+
+    def create(self, model, voice, input, response_format="pcm"):
+        samples = int(len(input) * STUB_SECONDS_PER_CHARACTER * STUB_SAMPLE_RATE)
+        return _StubSpeechResponse(np.zeros(samples, dtype="<i2").tobytes())
+
+
+class StubTTSClient:
+    """Offline stand-in for openai.OpenAI that returns silent PCM sized like real speech, instantly."""
+
+    def __init__(self):
+        self.audio = type("Audio", (), {})()
+        self.audio.speech = _StubSpeech()
+
+
+def time_function(func, argument, repeat: int) -> float:
+    """Return the best wall time of func(argument) over repeat runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(argument)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_import_benchmarks(repeat: int) -> dict:
+    """Time a cold import of each entry module in a fresh interpreter, and list the heavy dependencies it loads."""
+    probe = ("import json, sys, time; start = time.perf_counter(); import {module}; "
+             "seconds = time.perf_counter() - start; "
+             "print(json.dumps([seconds, [name for name in {heavy!r} if name in sys.modules]]))")
+    results = {}
+    for module in IMPORT_MODULES:
+        best = float("inf")
+        loaded = []
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable, "-c", probe.format(module=module, heavy=HEAVY_MODULES)],
+                                    capture_output=True, text=True, check=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+            seconds, loaded = json.loads(output.strip().splitlines()[-1])
+            best = min(best, seconds)
+        results[f"import {module}"] = {"seconds": best, "heavy_modules": loaded}
+        print(f"  {'import ' + module:<40} {best * 1000:9.1f} ms  {', '.join(loaded) or 'no heavy dependencies'}")
+    return results
+
+
+def run_text_cleaning_benchmarks(size_mb: float, repeat: int) -> dict:
+    """Time every text cleaning function on the same synthetic document."""
+    markdown = generate_mineru_markdown(int(size_mb * 1024 * 1024))
+    megabytes = len(markdown.encode("utf-8")) / (1024 * 1024)
+    cleaned = text_cleaning.clean_mineru_markdown_text(markdown)
+    math_fragments = [
+        "8 ^ { \\mathrm { t h } }", "x^2", "\\frac{a}{b}", "\\alpha + \\beta",
+    ] * 2500
+
+    def convert_fragments(fragments):
+        text_cleaning.convert_math_to_text.cache_clear()
+        for fragment in fragments:
+            text_cleaning.convert_math_to_text(fragment)
+
+    cases = [
+        ("clean_mineru_markdown_text", text_cleaning.clean_mineru_markdown_text, markdown),
+        ("clean_markdown_text", text_cleaning.clean_markdown_text, markdown),
+        ("basic_text_cleaning", text_cleaning.basic_text_cleaning, markdown),
+        ("normalize_for_tts (already clean)", text_cleaning.normalize_for_tts, cleaned),
+    ]
+
+    print(f"📄 Synthetic MinerU markdown: {megabytes:.2f} MB")
+    results = {}
+    for name, func, argument in cases:
+        seconds = time_function(func, argument, repeat)
+        size = len(argument.encode("utf-8")) / (1024 * 1024)
+        results[name] = {"seconds": seconds, "mb_per_second": size / seconds}
+        print(f"  {name:<40} {seconds * 1000:9.1f} ms  {size / seconds:8.1f} MB/s")
+
+    seconds = time_function(convert_fragments, math_fragments, repeat)
+    results["convert_math_to_text"] = {"seconds": seconds, "calls_per_second": len(math_fragments) / seconds}
+    print(f"  {'convert_math_to_text (10k fragments)':<40} {seconds * 1000:9.1f} ms  {len(math_fragments) / seconds:8.0f} calls/s")
+    return results
+
+
+def run_chunking_benchmarks(size_mb: float, repeat: int) -> dict:
+    """Time TTS chunking of cleaned text, whole and fed page by page, and report how full the chunks are."""
+    text = text_cleaning.clean_mineru_markdown_text(generate_mineru_markdown(int(size_mb * 1024 * 1024), seed=1))
+    megabytes = len(text.encode("utf-8")) / (1024 * 1024)
+    # Roughly page-sized pieces, as the streaming pipeline feeds them
+    pages = [text[start:start + 3000] for start in range(0, len(text), 3000)]
+
+    def chunk_pages(pieces):
+        chunker = chunking.TextChunker()
+        chunks = []
+        for piece in pieces:
+            chunks.extend(chunker.feed(piece))
+        chunks.extend(chunker.flush())
+        return chunks
+
+    cases = [
+        ("split_text_into_chunks", chunking.split_text_into_chunks, text),
+        ("TextChunker (3,000-character pages)", chunk_pages, pages),
+        ("split_text_into_chunks (content-defined)",
+         lambda whole: chunking.split_text_into_chunks(whole, mode=chunking.CHUNKING_CONTENT_DEFINED), text),
+    ]
+
+    print(f"📄 Cleaned text: {megabytes:.2f} MB")
+    results = {}
+    for name, func, argument in cases:
+        seconds = time_function(func, argument, repeat)
+        results[name] = {"seconds": seconds, "mb_per_second": megabytes / seconds}
+        print(f"  {name:<40} {seconds * 1000:9.1f} ms  {megabytes / seconds:8.1f} MB/s")
+
+    chunks = chunking.split_text_into_chunks(text)
+    lengths = [len(chunk) for chunk in chunks]
+    fill = sum(lengths) / (len(lengths) * chunking.DEFAULT_MAX_CHUNK_LENGTH)
+    results["chunks"] = {"count": len(chunks), "mean_fill": fill, "shortest": min(lengths)}
+    print(f"  {len(chunks)} chunks, {fill:.1%} average fill, shortest {min(lengths)} characters")
+    return results
+
+
+def run_extraction_benchmarks(pages: int, repeat: int) -> dict:
+    """Time the PyMuPDF fallback extraction (with cleaning) of a synthetic PDF, serially and across processes."""
+    from converter import PDFToAudioConverter
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = os.path.join(temp_dir, "synthetic.pdf")
+        generate_synthetic_pdf(pdf_path, pages)
+        print(f"📄 Synthetic PDF: {pages} pages, {os.path.getsize(pdf_path) / (1024 * 1024):.2f} MB")
+
+        cases = [("extract_text_from_pdf_fallback (serial)", 1)]
+        if (os.cpu_count() or 1) > 1:
+            cases.append((f"extract_text_from_pdf_fallback ({os.cpu_count()} processes)", os.cpu_count()))
+        for name, workers in cases:
+            # No cache, so every run really extracts
+            converter = PDFToAudioConverter(cache_dir=None, fallback_workers=workers)
+            seconds = time_function(converter.extract_text_from_pdf_fallback, pdf_path, repeat)
+            results[name] = {"seconds": seconds, "pages_per_second": pages / seconds}
+            print(f"  {name:<40} {seconds * 1000:9.1f} ms  {pages / seconds:8.0f} pages/s")
+    return results
+
+
+def run_audio_benchmarks(chunks: int, repeat: int) -> dict:
+    """Time audio assembly: raw chunk appends, and text_to_speech end to end with an instant offline TTS stub."""
+    from converter import PDFToAudioConverter
+
+    results = {}
+    # One full 4,000-character chunk is about four and a half minutes of speech
+    chunk_samples = int(chunking.DEFAULT_MAX_CHUNK_LENGTH * STUB_SECONDS_PER_CHARACTER * STUB_SAMPLE_RATE)
+    chunk_audio = [np.zeros(chunk_samples, dtype=np.int16) for _ in range(chunks)]
+    megabytes = chunks * chunk_samples * 2 / (1024 * 1024)
+    print(f"🔊 {chunks} chunks of {chunk_samples / STUB_SAMPLE_RATE:.0f} s audio ({megabytes:.0f} MB of PCM)")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        def append_chunks(samples_list):
+            writer = IncrementalAudioWriter(os.path.join(temp_dir, "assembled.wav"))
+            for samples in samples_list:
+                writer.append_samples(samples, STUB_SAMPLE_RATE)
+            writer.close()
+
+        seconds = time_function(append_chunks, chunk_audio, repeat)
+        results["IncrementalAudioWriter"] = {"seconds": seconds, "mb_per_second": megabytes / seconds}
+        print(f"  {'IncrementalAudioWriter':<40} {seconds * 1000:9.1f} ms  {megabytes / seconds:8.1f} MB/s")
+
+    # Enough text for the requested number of chunks; no cache, rate limit or checkpoints
+    text = text_cleaning.clean_mineru_markdown_text(
+        generate_mineru_markdown(chunks * chunking.DEFAULT_MAX_CHUNK_LENGTH, seed=2))
+    converter = PDFToAudioConverter(cache_dir=None, tts_requests_per_minute=None)
+    converter.client = StubTTSClient()
+
+    def synthesize(source_text):
+        audio_file, status_message = converter.text_to_speech(source_text, output_format="wav")
+        if audio_file is None:
+            raise RuntimeError(status_message)
+        os.unlink(audio_file)
+
+    seconds = time_function(synthesize, text, repeat)
+    results["text_to_speech (offline TTS stub)"] = {"seconds": seconds, "characters_per_second": len(text) / seconds}
+    print(f"  {'text_to_speech (offline TTS stub)':<40} {seconds * 1000:9.1f} ms  {len(text) / seconds:8.0f} chars/s")
+    return results
+
+
+def git_revision() -> Optional[str]:
+    """Return the current commit (with -dirty for uncommitted changes), or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results: dict, baseline: dict, threshold: float = DEFAULT_REGRESSION_THRESHOLD) -> list:
+    """Print each benchmark's time against a baseline run. Returns the names that slowed down by more than threshold."""
+    regressions = []
+    print(f"📊 Compared with {baseline.get('revision') or 'baseline'} ({baseline.get('timestamp', 'unknown date')})")
+    for suite, cases in results["suites"].items():
+        baseline_cases = baseline.get("suites", {}).get(suite, {})
+        for name, result in cases.items():
+            before = baseline_cases.get(name, {}).get("seconds")
+            if "seconds" not in result or not before:
+                continue
+            change = result["seconds"] / before - 1
+            flag = ""
+            if change > threshold:
+                flag = "  ⚠️ regression"
+                regressions.append(f"{suite}/{name}")
+            print(f"  {suite + '/' + name:<52} {before * 1000:9.1f} → {result['seconds'] * 1000:9.1f} ms  {change:+7.1%}{flag}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    """Run the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description="Benchmark the PDF to Audio text and audio hot paths.")
+    parser.add_argument("--suite", nargs="+", choices=BENCHMARK_SUITES, default=BENCHMARK_SUITES,
+                        help="Benchmark suites to run (default: all)")
+    parser.add_argument("--size-mb", type=float, default=4.0, help="Size of the synthetic markdown document")
+    parser.add_argument("--pages", type=int, default=200, help="Pages in the synthetic PDF")
+    parser.add_argument("--audio-chunks", type=int, default=20, help="Chunks assembled by the audio benchmarks")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; the best time is reported")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare with the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="Slowdown reported as a regression by --compare (default: 0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    suites = {
+        "import": ("Import time", lambda: run_import_benchmarks(args.repeat)),
+        "cleaning": ("Text cleaning", lambda: run_text_cleaning_benchmarks(args.size_mb, args.repeat)),
+        "chunking": ("Chunking", lambda: run_chunking_benchmarks(args.size_mb, args.repeat)),
+        "extraction": ("PDF extraction", lambda: run_extraction_benchmarks(args.pages, args.repeat)),
+        "audio": ("Audio assembly", lambda: run_audio_benchmarks(args.audio_chunks, args.repeat)),
+    }
+    results = {
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": {"size_mb": args.size_mb, "pages": args.pages, "audio_chunks": args.audio_chunks,
+                       "repeat": args.repeat},
+        "suites": {},
+    }
+    for suite in BENCHMARK_SUITES:
+        if suite not in args.suite:
+            continue
+        title, run = suites[suite]
+        print(f"⏱️ {title} benchmarks")
+        print("=" * 50)
+        results["suites"][suite] = run()
+        print()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print(f"⚠️ {len(regressions)} benchmarks slowed down by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""
+On-disk caches shared by PDF to Audio conversions.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+# Root directory for all persistent caches (override with PDF2AUDIO_CACHE_DIR)
+DEFAULT_CACHE_DIR = os.environ.get(
+    "PDF2AUDIO_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "pdf2audio"),
+)
+
+# Default quota for synthesized audio (1 GB)
+DEFAULT_TTS_CACHE_BYTES = 1024 * 1024 * 1024
+
+# Default quota and lifetime for extracted PDF text (256 MB, 30 days)
+DEFAULT_EXTRACTION_CACHE_BYTES = 256 * 1024 * 1024
+DEFAULT_EXTRACTION_CACHE_TTL = 30 * 24 * 3600
+
+# Eviction trims the cache down to this fraction of its quota so that a full
+# cache doesn't rescan the directory on every single write
+EVICTION_LOW_WATERMARK = 0.9
+
+# Temp files older than this are leftovers from crashed writers
+STALE_TEMP_FILE_SECONDS = 3600
+
+TEMP_FILE_PREFIX = ".tmp-"
+
+
+class DiskCache:
+    """Content-addressed byte store with a size quota and LRU eviction.
+
+    Each entry is a single file named after its key. Writes go to a temp file
+    in the destination directory and are moved into place with os.replace, so
+    several processes can share one cache directory without ever reading a
+    partially written entry. Recency is tracked through file modification
+    times, which keeps a single LRU order across all of those processes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, suffix: str = ".bin"):
+        self.directory = Path(directory)
+        self.max_bytes = int(max_bytes)
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Running estimate of the cache size; other processes may also write,
+        # so eviction always re-measures the directory before deleting anything
+        self._approx_bytes = sum(size for _, size, _ in self._scan_entries())
+
+    def _entry_path(self, key: str) -> Path:
+        # Fan out into subdirectories so huge caches don't end up in one directory
+        return self.directory / key[:2] / f"{key}{self.suffix}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached bytes for key, or None on a miss."""
+        path = self._entry_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Mark the entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def delete(self, key: str) -> None:
+        """Remove the entry for key if it exists."""
+        try:
+            self._entry_path(key).unlink()
+        except OSError:
+            pass
+
+    def put(self, key: str, data: bytes) -> None:
+        """Store data under key, evicting least recently used entries if needed."""
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._entry_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # An overwritten entry's old bytes leave the cache with it
+            try:
+                replaced_bytes = path.stat().st_size
+            except FileNotFoundError:
+                replaced_bytes = 0
+            fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=TEMP_FILE_PREFIX)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            except BaseException:
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    pass
+                raise
+        except OSError as e:
+            print(f"⚠️ Could not write cache entry {path.name}: {e}")
+            return
+
+        with self._lock:
+            self._approx_bytes += len(data) - replaced_bytes
+            over_quota = self._approx_bytes > self.max_bytes
+        if over_quota:
+            self.evict()
+
+    def _scan_entries(self) -> list:
+        """Return (mtime, size, path) for every entry, removing stale temp files."""
+        entries = []
+        now = time.time()
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = Path(root) / filename
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                if filename.startswith(TEMP_FILE_PREFIX):
+                    if now - stat.st_mtime > STALE_TEMP_FILE_SECONDS:
+                        try:
+                            path.unlink()
+                        except OSError:
+                            pass
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self) -> None:
+        """Delete least recently used entries until the cache fits its quota."""
+        entries = self._scan_entries()
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICTION_LOW_WATERMARK
+        evicted = 0
+
+        if total > self.max_bytes:
+            entries.sort(key=lambda entry: entry[0])
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    # Another process evicted it first
+                    pass
+                except OSError:
+                    continue
+                total -= size
+                evicted += 1
+
+        with self._lock:
+            self._approx_bytes = total
+            self.evictions += evicted
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current estimated size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "bytes": self._approx_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def tts_cache_key(model: str, voice: str, response_format: str, text: str) -> str:
+    """Build the cache key for a synthesized chunk."""
+    # Whitespace differences don't change the spoken audio
+    normalized_text = " ".join(text.split())
+    payload = json.dumps([model, voice, response_format, normalized_text], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    """Cache of cleaned PDF text keyed by file digest, parser settings and extraction path.
+
+    Entries are stored as JSON with their creation time so that they expire
+    after ttl_seconds even while they keep being read.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_EXTRACTION_CACHE_BYTES,
+                 ttl_seconds: Optional[float] = DEFAULT_EXTRACTION_CACHE_TTL):
+        self.store = DiskCache(directory, max_bytes, suffix=".json")
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def make_key(pdf_digest: str, method: str, params: dict) -> str:
+        """Build the cache key for one extraction of a PDF."""
+        payload = json.dumps([pdf_digest, method, params], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, pdf_digest: str, method: str, params: dict) -> Optional[str]:
+        """Return the cached text, or None if it is missing or expired."""
+        key = self.make_key(pdf_digest, method, params)
+        data = self.store.get(key)
+        if data is None:
+            return None
+
+        try:
+            entry = json.loads(data.decode("utf-8"))
+        except ValueError:
+            self.store.delete(key)
+            return None
+
+        if self.ttl_seconds is not None and time.time() - entry.get("created", 0) > self.ttl_seconds:
+            self.store.delete(key)
+            return None
+
+        return entry.get("text")
+
+    def put(self, pdf_digest: str, method: str, params: dict, text: str) -> None:
+        """Store the cleaned text extracted from a PDF."""
+        entry = {"created": time.time(), "method": method, "text": text}
+        key = self.make_key(pdf_digest, method, params)
+        self.store.put(key, json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+
+    def stats(self) -> dict:
+        """Return hit/miss counters for the underlying store."""
+        return self.store.stats()
+
+
+def file_sha256(path: str) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    stat = os.stat(path)
+    # A conversion looks the same file up several times; only hash it again if it changed
+    return _file_sha256(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=64)
+def _file_sha256(path: str, size: int, mtime_ns: int, block_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,182 @@
+"""
+Chapter structure for split audio output.
+
+A document's sections come from its PDF outline (bookmarks) when it has one,
+and otherwise from the headings in MinerU's markdown. Extraction yields
+section pieces, (heading, level, text) tuples in document order: a piece with
+a heading starts a new section, and a piece whose heading is None continues
+the current one. SectionChunker chunks each section on its own, so no chunk
+spans two sections, and every section is synthesized into its own audio file.
+write_chapter_index then lists the files in an M3U playlist and a JSON chapter
+table with each section's sample offset and duration, so players can load and
+seek to a chapter without downloading the rest of the book.
+"""
+
+import json
+import os
+import re
+from typing import Callable, List, Optional, Tuple
+
+import text_cleaning
+from chunking import TextChunker
+
+# Outline entries and markdown headings at this depth or shallower start a section
+DEFAULT_CHAPTER_LEVEL = 1
+# A section with less text than this when the next heading arrives runs on into the
+# next section and takes its title (e.g. a part title page before its first chapter)
+MIN_SECTION_CHARACTERS = 2000
+# Headings longer than this are cut in titles and file names
+MAX_TITLE_LENGTH = 120
+
+PLAYLIST_FILENAME = "playlist.m3u"
+CHAPTER_INDEX_FILENAME = "chapters.json"
+
+_MARKDOWN_HEADING = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$', re.MULTILINE)
+_UNSAFE_FILENAME = re.compile(r'[^\w]+')
+
+
+def clean_heading(heading: str) -> Optional[str]:
+    """Return a heading as plain text for titles, or None if nothing readable is left."""
+    title = text_cleaning.normalize_for_tts(text_cleaning.clean_markdown_text(heading))
+    return title[:MAX_TITLE_LENGTH].strip() or None
+
+
+def outline_sections(outline: list, page_count: int,
+                     max_level: int = DEFAULT_CHAPTER_LEVEL) -> List[Tuple[Optional[str], int, int, int]]:
+    """Turn PDF outline entries (level, title, 1-based page) into (title, level, start_page, end_page) sections.
+
+    Page ranges are 0-based with the end excluded. Pages before the first entry form
+    an untitled section, and entries deeper than max_level stay inside their section.
+    Sections can only start at a page boundary, so of several entries on one page
+    the last one (usually the chapter after a part title) starts the section.
+    """
+    starts = []
+    for level, title, page in outline:
+        if level > max_level or not 1 <= page <= page_count:
+            continue
+        start = page - 1
+        if starts and start < starts[-1][2]:
+            # Out of order (e.g. a bookmark to an appendix figure); it can't start a page range
+            continue
+        if starts and start == starts[-1][2]:
+            starts.pop()
+        starts.append((clean_heading(title), level, start))
+    if not starts:
+        return []
+    if starts[0][2] > 0:
+        starts.insert(0, (None, None, 0))
+    ends = [start for _, _, start in starts[1:]] + [page_count]
+    return [(title, level, start, end) for (title, level, start), end in zip(starts, ends)]
+
+
+def split_markdown_sections(markdown_text: str,
+                            max_level: int = DEFAULT_CHAPTER_LEVEL) -> List[Tuple[Optional[str], Optional[int], str]]:
+    """Split markdown at headings of max_level or shallower into (heading, level, markdown) sections.
+
+    Each heading line stays at the start of its section's markdown, so it is still
+    read aloud. Text before the first heading comes first, with no heading.
+    """
+    sections = []
+    heading, level, start = None, None, 0
+    for match in _MARKDOWN_HEADING.finditer(markdown_text):
+        depth = len(match.group(1))
+        if depth > max_level:
+            continue
+        if heading is not None or markdown_text[start:match.start()].strip():
+            sections.append((heading, level, markdown_text[start:match.start()]))
+        heading, level, start = clean_heading(match.group(2)), depth, match.start()
+    if heading is not None or markdown_text[start:].strip():
+        sections.append((heading, level, markdown_text[start:]))
+    return sections
+
+
+class SectionChunker:
+    """Chunk section pieces fed in document order, ending the last chunk of a section at its boundary.
+
+    feed returns (section index, chunk) pairs, with the sections described in
+    self.sections as they are found: title, level, characters and chunks. A
+    section with less than min_characters of text when the next heading arrives
+    runs on into that section instead of ending.
+    """
+
+    def __init__(self, new_chunker: Callable[[], TextChunker], min_characters: int = MIN_SECTION_CHARACTERS):
+        self.new_chunker = new_chunker
+        self.min_characters = min_characters
+        self.sections = []
+        self._chunker = None
+
+    def feed(self, heading: Optional[str], level: Optional[int], text: str) -> List[Tuple[int, str]]:
+        """Add the next section piece and return the chunks it completes."""
+        chunks = []
+        current = self.sections[-1] if self.sections else None
+        if current is None or (heading is not None and current["characters"] >= self.min_characters):
+            if current is not None:
+                chunks = self._tag(self._chunker.flush())
+            self.sections.append({"title": heading, "level": level, "characters": 0, "chunks": 0})
+            self._chunker = self.new_chunker()
+        elif heading is not None:
+            # Too short to stand alone (a title page, a part divider): named after the section it runs into
+            current["title"], current["level"] = heading, level
+        self.sections[-1]["characters"] += len(text)
+        return chunks + self._tag(self._chunker.feed(text))
+
+    def flush(self) -> List[Tuple[int, str]]:
+        """Return the remaining chunks of the last section."""
+        return self._tag(self._chunker.flush()) if self._chunker is not None else []
+
+    def _tag(self, chunks: List[str]) -> List[Tuple[int, str]]:
+        self.sections[-1]["chunks"] += len(chunks)
+        index = len(self.sections) - 1
+        return [(index, chunk) for chunk in chunks]
+
+
+def chapter_filename(number: int, title: Optional[str], suffix: str) -> str:
+    """Return the file name of a chapter's audio, e.g. 003-methods-and-materials.mp3."""
+    slug = _UNSAFE_FILENAME.sub('-', (title or "").lower()).strip('-_')[:60].rstrip('-_')
+    return f"{number:03d}-{slug or 'section'}{suffix}"
+
+
+def write_chapter_index(output_dir: str, title: str, chapters: list, sample_rate: int) -> Tuple[str, str]:
+    """Write the M3U playlist and JSON chapter table for chapter audio files. Returns their paths.
+
+    chapters lists each chapter's title, level, file (relative to output_dir),
+    samples, characters and chunks, in order. The table adds each chapter's
+    sample offset and start time in the whole book.
+    """
+    entries = []
+    offset = 0
+    for number, chapter in enumerate(chapters, start=1):
+        entries.append({
+            "number": number,
+            "title": chapter["title"],
+            "level": chapter["level"],
+            "file": chapter["file"],
+            "start_sample": offset,
+            "samples": chapter["samples"],
+            "start_seconds": round(offset / sample_rate, 3),
+            "duration_seconds": round(chapter["samples"] / sample_rate, 3),
+            "characters": chapter["characters"],
+            "chunks": chapter["chunks"],
+        })
+        offset += chapter["samples"]
+
+    index = {
+        "title": title,
+        "sample_rate": sample_rate,
+        "total_samples": offset,
+        "duration_seconds": round(offset / sample_rate, 3),
+        "chapters": entries,
+    }
+    index_path = os.path.join(output_dir, CHAPTER_INDEX_FILENAME)
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+
+    # Extended M3U: players show the titles and durations without opening the files
+    lines = ["#EXTM3U", f"#PLAYLIST:{title}"]
+    for entry in entries:
+        lines.append(f"#EXTINF:{round(entry['duration_seconds'])},{entry['title']}")
+        lines.append(entry["file"])
+    playlist_path = os.path.join(output_dir, PLAYLIST_FILENAME)
+    with open(playlist_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return playlist_path, index_path
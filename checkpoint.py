@@ -0,0 +1,342 @@
+"""
+Checkpointed conversion jobs with a per-chunk manifest.
+
+Each job (one source text or PDF with one set of TTS settings) gets a
+directory holding manifest.json and a segments/ folder. The manifest records
+every chunk's hash, status, error and segment file; each synthesized chunk's
+raw PCM is written to its segment before the manifest marks it done, so after
+a crash or a failed request a rerun of the same job only synthesizes the
+chunks that are missing.
+
+A DocumentRevision carries audio over between versions of a document: it keeps
+the chunk hashes of the last completed version (identified by a caller-chosen
+key, such as its file name) with each chunk's audio stored by hash, so a new
+revision only synthesizes the chunks whose text changed.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+MANIFEST_FILENAME = "manifest.json"
+SEGMENTS_DIRNAME = "segments"
+
+# Unfinished jobs nobody resumed within this time are deleted
+DEFAULT_JOB_TTL = 7 * 24 * 3600
+# Documents not converted again within this time lose their revision audio
+DEFAULT_REVISION_TTL = 90 * 24 * 3600
+
+CHUNK_PENDING = "pending"
+CHUNK_DONE = "done"
+CHUNK_FAILED = "failed"
+
+JOB_RUNNING = "running"
+JOB_FAILED = "failed"
+JOB_COMPLETED = "completed"
+
+
+def chunk_hash(text: str) -> str:
+    """Return the hash identifying a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def job_id(source_digest: str, settings: dict) -> str:
+    """Return the job id for a source (text or file digest) converted with settings."""
+    payload = json.dumps([source_digest, settings], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+
+def _write_atomic(path: Path, data: bytes):
+    # Write, flush to disk, then move into place: readers see the old or the new file, never half of one
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ConversionJob:
+    """Durable record of one conversion's chunks and their synthesized segments.
+
+    Chunks are registered by index as they are produced, so the chunk list can
+    grow while text is still being extracted. A registered chunk whose hash
+    matches a finished entry with an intact segment is not synthesized again.
+    """
+
+    def __init__(self, job_dir: str, settings: dict):
+        self.job_dir = Path(job_dir)
+        self.segments_dir = self.job_dir / SEGMENTS_DIRNAME
+        self.manifest_path = self.job_dir / MANIFEST_FILENAME
+        self._lock = threading.Lock()
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+
+        manifest = self._load_manifest()
+        if manifest is None or manifest.get("settings") != settings or manifest.get("status") == JOB_COMPLETED:
+            # New job, or a finished one being run again from scratch
+            manifest = {"job_id": self.job_dir.name, "settings": settings, "created": time.time(),
+                        "chunks": {}}
+        manifest["status"] = JOB_RUNNING
+        manifest["total_chunks"] = None
+        manifest["output"] = None
+        self.manifest = manifest
+        # Chunks reused from an earlier run of this job
+        self.resumed = 0
+        self.save()
+
+    @classmethod
+    def open(cls, jobs_dir: str, source_digest: str, settings: dict,
+             ttl_seconds: Optional[float] = DEFAULT_JOB_TTL) -> "ConversionJob":
+        """Open (or resume) the job for a source and settings under jobs_dir."""
+        if ttl_seconds is not None:
+            prune_stale_jobs(jobs_dir, ttl_seconds)
+        return cls(os.path.join(jobs_dir, job_id(source_digest, settings)), settings)
+
+    def _load_manifest(self) -> Optional[dict]:
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self):
+        """Write the manifest to disk."""
+        with self._lock:
+            self.manifest["updated"] = time.time()
+            data = json.dumps(self.manifest, indent=1).encode("utf-8")
+            _write_atomic(self.manifest_path, data)
+
+    def _segment_path(self, index: int) -> Path:
+        return self.segments_dir / f"{index:05d}.pcm"
+
+    def register_chunk(self, index: int, text: str) -> bool:
+        """Record chunk index with its text. Returns True if its audio is already on disk."""
+        digest = chunk_hash(text)
+        key = str(index)
+        with self._lock:
+            entry = self.manifest["chunks"].get(key)
+            if entry and entry["hash"] == digest and entry["status"] == CHUNK_DONE:
+                try:
+                    if self._segment_path(index).stat().st_size == entry["bytes"]:
+                        self.resumed += 1
+                        return True
+                except OSError:
+                    pass
+            # New chunk, changed text or a lost segment
+            self.manifest["chunks"][key] = {"hash": digest, "characters": len(text), "status": CHUNK_PENDING,
+                                            "segment": None, "bytes": 0, "attempts": 0, "error": None}
+            return False
+
+    def load_segment(self, index: int) -> bytes:
+        """Return the audio stored for a finished chunk."""
+        with open(self._segment_path(index), "rb") as f:
+            return f.read()
+
+    def complete_chunk(self, index: int, audio_bytes: bytes):
+        """Store a chunk's audio and mark it done."""
+        path = self._segment_path(index)
+        _write_atomic(path, audio_bytes)
+        with self._lock:
+            entry = self.manifest["chunks"][str(index)]
+            entry.update(status=CHUNK_DONE, segment=f"{SEGMENTS_DIRNAME}/{path.name}",
+                         bytes=len(audio_bytes), attempts=entry["attempts"] + 1, error=None)
+        self.save()
+
+    def fail_chunk(self, index: int, error: str):
+        """Mark a chunk as failed with the reason."""
+        with self._lock:
+            entry = self.manifest["chunks"][str(index)]
+            entry.update(status=CHUNK_FAILED, attempts=entry["attempts"] + 1, error=error)
+        self.save()
+
+    def set_total_chunks(self, total: int):
+        """Fix the chunk count once all chunks are known, dropping entries left over from older text."""
+        with self._lock:
+            self.manifest["total_chunks"] = total
+            for key in [key for key in self.manifest["chunks"] if int(key) >= total]:
+                del self.manifest["chunks"][key]
+                try:
+                    self._segment_path(int(key)).unlink()
+                except OSError:
+                    pass
+        self.save()
+
+    def first_missing_chunk(self) -> Optional[int]:
+        """Return the index of the first chunk that isn't done, or None if all of them are."""
+        with self._lock:
+            total = self.manifest["total_chunks"]
+            if total is None:
+                total = len(self.manifest["chunks"])
+            for index in range(total):
+                if self.manifest["chunks"].get(str(index), {}).get("status") != CHUNK_DONE:
+                    return index
+        return None
+
+    @property
+    def is_complete(self) -> bool:
+        """True once the chunk count is known and every chunk is done."""
+        return self.manifest["total_chunks"] is not None and self.first_missing_chunk() is None
+
+    def mark_failed(self):
+        """Record that the run stopped with chunks missing; their segments stay for the next run."""
+        with self._lock:
+            self.manifest["status"] = JOB_FAILED
+        self.save()
+
+    def mark_completed(self, output_path: str):
+        """Record the final output and free the segments, which it now contains."""
+        with self._lock:
+            self.manifest["status"] = JOB_COMPLETED
+            self.manifest["output"] = output_path
+        self.save()
+        shutil.rmtree(self.segments_dir, ignore_errors=True)
+
+    def stats(self) -> dict:
+        """Return chunk counts by status."""
+        with self._lock:
+            statuses = [entry["status"] for entry in self.manifest["chunks"].values()]
+        return {
+            "done": statuses.count(CHUNK_DONE),
+            "failed": statuses.count(CHUNK_FAILED),
+            "pending": statuses.count(CHUNK_PENDING),
+            "resumed": self.resumed,
+        }
+
+
+def diff_chunk_hashes(previous: list, current: list) -> dict:
+    """Compare a revision's chunk hashes with the previous version's.
+    
+    Returns how many of the current chunks are unchanged (their audio can be
+    reused), how many are new or changed, and how many old chunks are gone.
+    """
+    remaining = Counter(previous)
+    unchanged = 0
+    for digest in current:
+        if remaining[digest] > 0:
+            remaining[digest] -= 1
+            unchanged += 1
+    return {"unchanged": unchanged, "changed": len(current) - unchanged,
+            "removed": sum(remaining.values())}
+
+
+class DocumentRevision:
+    """Audio of the last completed version of a document, stored by chunk hash.
+    
+    Segments synthesized while converting a new revision are stored alongside the
+    previous version's, so a failed run keeps them for the next attempt. Once
+    the new revision completes, commit() makes it the previous version and
+    deletes segments it doesn't use.
+    """
+
+    def __init__(self, revision_dir: str, key: str, settings: dict):
+        self.revision_dir = Path(revision_dir)
+        self.segments_dir = self.revision_dir / SEGMENTS_DIRNAME
+        self.manifest_path = self.revision_dir / MANIFEST_FILENAME
+        self.key = key
+        self.settings = settings
+        self._lock = threading.Lock()
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+
+        manifest = None
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            pass
+        # Chunk hashes of the previous version, in order
+        self.previous_hashes = manifest["chunks"] if manifest and manifest.get("settings") == settings else []
+        self._previous = set(self.previous_hashes)
+        # Chunk hashes of this run by index, and how many came from the previous version
+        self.current_hashes = {}
+        self.reused = 0
+
+    @classmethod
+    def open(cls, revisions_dir: str, key: str, settings: dict,
+             ttl_seconds: Optional[float] = DEFAULT_REVISION_TTL) -> "DocumentRevision":
+        """Open the revision record of the document identified by key, converted with settings."""
+        if ttl_seconds is not None:
+            prune_stale_jobs(revisions_dir, ttl_seconds)
+        return cls(os.path.join(revisions_dir, job_id(key, settings)), key, settings)
+
+    def _segment_path(self, digest: str) -> Path:
+        return self.segments_dir / f"{digest}.pcm"
+
+    def diff(self, chunks: list) -> dict:
+        """Compare chunk texts with the previous version's chunks."""
+        return diff_chunk_hashes(self.previous_hashes, [chunk_hash(chunk) for chunk in chunks])
+
+    def load_segment(self, index: int, text: str) -> Optional[bytes]:
+        """Return stored audio for chunk index's text, or None if it has to be synthesized."""
+        digest = chunk_hash(text)
+        with self._lock:
+            self.current_hashes[index] = digest
+        try:
+            with open(self._segment_path(digest), "rb") as f:
+                audio_bytes = f.read()
+        except OSError:
+            return None
+        if digest in self._previous:
+            with self._lock:
+                self.reused += 1
+        return audio_bytes
+
+    def store_segment(self, index: int, text: str, audio_bytes: bytes):
+        """Store the audio of chunk index for the next revision."""
+        digest = chunk_hash(text)
+        with self._lock:
+            self.current_hashes[index] = digest
+        path = self._segment_path(digest)
+        if not path.exists():
+            _write_atomic(path, bytes(audio_bytes))
+
+    def commit(self, total_chunks: int):
+        """Make this run's chunks the previous version and delete the segments it no longer uses.
+        
+        Chunks of this run without a recorded hash are left out of the version, so
+        the next revision synthesizes them again.
+        """
+        with self._lock:
+            hashes = [self.current_hashes[index] for index in range(total_chunks) if index in self.current_hashes]
+            manifest = {"key": self.key, "settings": self.settings, "chunks": hashes, "updated": time.time()}
+        _write_atomic(self.manifest_path, json.dumps(manifest, indent=1).encode("utf-8"))
+        keep = {f"{digest}.pcm" for digest in hashes}
+        for path in self.segments_dir.iterdir():
+            if path.name not in keep:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+        self.previous_hashes = hashes
+        self._previous = set(hashes)
+
+
+def prune_stale_jobs(jobs_dir: str, ttl_seconds: float = DEFAULT_JOB_TTL):
+    """Delete job directories whose manifest hasn't been updated within ttl_seconds."""
+    try:
+        entries = list(os.scandir(jobs_dir))
+    except OSError:
+        return
+    now = time.time()
+    for entry in entries:
+        if not entry.is_dir():
+            continue
+        try:
+            updated = os.stat(os.path.join(entry.path, MANIFEST_FILENAME)).st_mtime
+        except OSError:
+            updated = entry.stat().st_mtime
+        if now - updated > ttl_seconds:
+            shutil.rmtree(entry.path, ignore_errors=True)
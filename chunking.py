@@ -0,0 +1,224 @@
+"""
+Sentence-aware incremental text chunking for OpenAI TTS.
+
+TextChunker takes a document piece by piece (pages or MinerU shards as they
+are extracted) and hands out chunks as soon as their boundaries are known,
+so synthesis can start while extraction is still running. Each piece is
+scanned once for sentence endings (Latin `.!?` followed by a space, CJK
+`。！？` anywhere), and whole sentences are packed into chunks as close to
+the TTS limit as they fit. The last chunks of a document are balanced so it
+doesn't end on a short fragment. Feeding a text in pieces gives the same
+chunks as feeding it whole.
+
+ContentDefinedChunker cuts at sentence endings chosen by the text around
+them instead of by their offset, so an edit only changes the chunks near it:
+the chunks of a revised document line up with the previous version's again
+after the edited passage, and their audio can be reused.
+"""
+
+import bisect
+import math
+import re
+import zlib
+from typing import List
+
+import text_cleaning
+
+# OpenAI TTS accepts up to 4096 characters per request
+DEFAULT_MAX_CHUNK_LENGTH = 4000
+
+# Sentence endings in normalized text: Latin terminators need a following space
+# (or the end of the piece) so decimals and dotted names aren't split; CJK
+# terminators end a sentence wherever they appear. Closing quotes and
+# brackets stay with their sentence.
+_SENTENCE_END = re.compile(r'''[.!?]+['")]*(?= |$)|[。！？]+['")]*''')
+
+# Clause marks a sentence longer than a whole chunk can be cut after
+_CLAUSE_MARKS = (',', ';', ':', '，', '、', '；', '：')
+
+# Chunking modes: pack sentences up to the limit, or cut at content-defined sentence endings
+CHUNKING_PACKED = "packed"
+CHUNKING_CONTENT_DEFINED = "content-defined"
+CHUNKING_MODES = (CHUNKING_PACKED, CHUNKING_CONTENT_DEFINED)
+
+# Content-defined chunks are at least this long (unless the document is shorter)
+CDC_MIN_CHUNK_LENGTH = 1500
+# Characters before a sentence ending that decide whether it is a cut point
+CDC_WINDOW = 64
+# A sentence ending past the minimum length is a cut point with probability 1/CDC_CUT_DIVISOR,
+# which gives chunks of about 2,500 characters for typical prose
+CDC_CUT_DIVISOR = 8
+
+
+class TextChunker:
+    """Pack text fed piece by piece into TTS chunks of whole sentences, at most max_length characters each."""
+
+    def __init__(self, max_length: int = DEFAULT_MAX_CHUNK_LENGTH):
+        self.max_length = max_length
+        self._buffer = ""
+        # Offsets in _buffer just past each sentence ending, ascending
+        self._boundaries = []
+        self._has_text = False
+
+    def feed(self, text: str) -> List[str]:
+        """Add the next piece of text and return the chunks it completes."""
+        text = text_cleaning.normalize_for_tts(text)
+        if not text:
+            return []
+        # Pieces are joined with a space, as if the whole text had been normalized at once
+        if self._has_text:
+            self._buffer += " "
+        offset = len(self._buffer)
+        self._buffer += text
+        self._has_text = True
+        self._boundaries.extend(offset + match.end() for match in _SENTENCE_END.finditer(text))
+        return self._drain(final=False)
+
+    def flush(self) -> List[str]:
+        """Return the remaining chunks once all text has been fed, and reset the chunker."""
+        chunks = self._drain(final=True)
+        self._buffer = ""
+        self._boundaries = []
+        self._has_text = False
+        return chunks
+
+    def _drain(self, final: bool) -> List[str]:
+        buffer = self._buffer
+        boundaries = self._boundaries
+        chunks = []
+        start = 0
+
+        # While streaming, keep two chunks' worth of text back: the end of the
+        # document may be among it, and the last chunks are balanced at flush
+        while len(buffer) - start > 2 * self.max_length:
+            end = self._chunk_end(start, self.max_length)
+            self._append_chunk(chunks, start, end)
+            start = end
+
+        if final:
+            while len(buffer) - start > 0:
+                # Even out the remaining chunks instead of ending on a short one
+                remaining = len(buffer) - start
+                target = math.ceil(remaining / math.ceil(remaining / self.max_length))
+                end = self._chunk_end(start, target)
+                self._append_chunk(chunks, start, end)
+                start = end
+
+        # Drop consumed text and rebase the boundary index
+        consumed = bisect.bisect_right(boundaries, start)
+        self._buffer = buffer[start:]
+        self._boundaries = [boundary - start for boundary in boundaries[consumed:]]
+        return chunks
+
+    def _chunk_end(self, start: int, target: int) -> int:
+        """Return the end offset of a chunk starting at start, aiming for target characters."""
+        if len(self._buffer) - start <= target:
+            return len(self._buffer)
+        limit = start + self.max_length
+
+        boundaries = self._boundaries
+        # Last sentence ending that fits within target, and the first one after it
+        index = bisect.bisect_right(boundaries, start + target)
+        before = boundaries[index - 1] if index > 0 and boundaries[index - 1] > start else None
+        after = boundaries[index] if index < len(boundaries) and boundaries[index] <= limit else None
+        if after is not None and (before is None or after - (start + target) < (start + target) - before):
+            return after
+        if before is not None:
+            return before
+        return self._split_long_sentence(start, min(limit, len(self._buffer)))
+
+    def _split_long_sentence(self, start: int, limit: int) -> int:
+        """Cut a sentence that doesn't fit in one chunk at a clause mark, a space or, failing both, the limit."""
+        buffer = self._buffer
+        halfway = start + (limit - start) // 2
+        clause_end = max(buffer.rfind(mark, start, limit) for mark in _CLAUSE_MARKS)
+        if clause_end > halfway:
+            return clause_end + 1
+        last_space = buffer.rfind(' ', start, limit)
+        if last_space > start:
+            return last_space
+        if clause_end >= start:
+            return clause_end + 1
+        return limit
+
+    def _append_chunk(self, chunks: List[str], start: int, end: int):
+        chunk = self._buffer[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+
+
+class ContentDefinedChunker(TextChunker):
+    """Cut text fed piece by piece into TTS chunks at content-defined sentence endings.
+    
+    A sentence ending is a cut point when the hash of the CDC_WINDOW characters
+    before it falls in a fixed 1/CDC_CUT_DIVISOR slice, so whether a boundary is
+    cut depends only on the text near it. Chunks shorter than min_length aren't
+    cut; a chunk that reaches max_length without a cut point ends at its last
+    sentence ending, as packed chunks do. Chunks are handed out as soon as their
+    cut point is seen, and the last one isn't balanced.
+    """
+
+    def __init__(self, max_length: int = DEFAULT_MAX_CHUNK_LENGTH, min_length: int = CDC_MIN_CHUNK_LENGTH):
+        super().__init__(max_length)
+        self.min_length = min(min_length, max_length)
+
+    def _drain(self, final: bool) -> List[str]:
+        buffer = self._buffer
+        boundaries = self._boundaries
+        chunks = []
+        start = 0
+
+        while len(buffer) - start > 0:
+            end = self._next_cut(start, final)
+            if end is None:
+                break
+            self._append_chunk(chunks, start, end)
+            start = end
+
+        # Drop consumed text and rebase the boundary index
+        consumed = bisect.bisect_right(boundaries, start)
+        self._buffer = buffer[start:]
+        self._boundaries = [boundary - start for boundary in boundaries[consumed:]]
+        return chunks
+
+    def _next_cut(self, start: int, final: bool):
+        """Return the end of the chunk starting at start, or None until more text is known."""
+        buffer = self._buffer
+        boundaries = self._boundaries
+        limit = start + self.max_length
+        index = bisect.bisect_left(boundaries, start + self.min_length)
+        while index < len(boundaries) and boundaries[index] <= limit:
+            boundary = boundaries[index]
+            if self._is_cut_point(boundary):
+                return boundary
+            index += 1
+
+        if len(buffer) - start <= self.max_length:
+            # The rest may still reach a cut point once more text arrives
+            return len(buffer) if final else None
+        # No cut point within the limit: end at the last sentence that fits
+        index = bisect.bisect_right(boundaries, limit)
+        if index > 0 and boundaries[index - 1] > start:
+            return boundaries[index - 1]
+        return self._split_long_sentence(start, limit)
+
+    def _is_cut_point(self, boundary: int) -> bool:
+        window = self._buffer[max(0, boundary - CDC_WINDOW):boundary]
+        return zlib.crc32(window.encode("utf-8")) % CDC_CUT_DIVISOR == 0
+
+
+def new_chunker(mode: str = CHUNKING_PACKED, max_length: int = DEFAULT_MAX_CHUNK_LENGTH) -> TextChunker:
+    """Return a chunker for a chunking mode."""
+    if mode == CHUNKING_CONTENT_DEFINED:
+        return ContentDefinedChunker(max_length)
+    if mode != CHUNKING_PACKED:
+        raise ValueError(f"Unknown chunking mode {mode!r}, expected one of {', '.join(CHUNKING_MODES)}")
+    return TextChunker(max_length)
+
+
+def split_text_into_chunks(text: str, max_length: int = DEFAULT_MAX_CHUNK_LENGTH,
+                           mode: str = CHUNKING_PACKED) -> List[str]:
+    """Split a whole text into TTS chunks."""
+    chunker = new_chunker(mode, max_length)
+    chunks = chunker.feed(text) + chunker.flush()
+    return chunks or [text_cleaning.normalize_for_tts(text)]
@@ -0,0 +1,177 @@
+"""
+Circuit breaker for calls to a remote service such as MinerU.
+
+After a run of consecutive failures, the breaker opens and calls are refused
+at once, so callers go straight to their fallback instead of waiting on a
+service that is down or hung. A call that timed out waiting for an answer
+counts as more than one failure. While it is open, a background
+health probe checks the service; once the probe succeeds the breaker lets one
+trial call through (half-open) and closes again if that call succeeds.
+
+Breaker state, trips and refused calls are exported through the metrics module.
+"""
+
+import threading
+import time
+from typing import Callable, Optional
+
+import metrics
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+# Values of the circuit_state gauge
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Consecutive failures that open the breaker
+DEFAULT_FAILURE_THRESHOLD = 3
+# Failures a timed-out call counts as
+DEFAULT_TIMEOUT_WEIGHT = 2
+# Seconds between health probes while open
+DEFAULT_PROBE_INTERVAL = 5.0
+# Without a probe, seconds the breaker stays open before it allows a trial call
+DEFAULT_RESET_TIMEOUT = 30.0
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because its circuit breaker is open."""
+
+    def __init__(self, name: str):
+        super().__init__(f"{name} is unavailable (circuit breaker open)")
+        self.name = name
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a background health probe."""
+
+    def __init__(self, name: str, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 probe: Optional[Callable[[], bool]] = None,
+                 probe_interval: float = DEFAULT_PROBE_INTERVAL,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+                 timeout_weight: int = DEFAULT_TIMEOUT_WEIGHT):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.timeout_weight = max(1, int(timeout_weight))
+        # Returns True when the service looks healthy; called from a background thread while open
+        self.probe = probe
+        self.probe_interval = probe_interval
+        self.reset_timeout = reset_timeout
+        self.trips = 0
+        self.rejections = 0
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._probe_thread = None
+        self._lock = threading.Lock()
+        self._publish_state()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def is_open(self) -> bool:
+        """True while calls are being refused (a trial call due without a probe counts as not open)."""
+        with self._lock:
+            if self._state != OPEN:
+                return False
+            return self.probe is not None or time.monotonic() - self._opened_at < self.reset_timeout
+
+    def allow_request(self) -> bool:
+        """Return whether a call may go ahead; every allowed call must be reported back (record_success, record_failure or release)."""
+        with self._lock:
+            if self._state == OPEN and self.probe is None and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._set_state(HALF_OPEN)
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                # Only one trial call at a time while the service is recovering
+                self._trial_in_flight = True
+                return True
+            self.rejections += 1
+        metrics.count("circuit_rejections_total", circuit=self.name)
+        return False
+
+    def record_success(self):
+        """Report a call that reached the service and got an answer."""
+        with self._lock:
+            self._failures = 0
+            if self._state == HALF_OPEN:
+                self._trial_in_flight = False
+                self._set_state(CLOSED)
+                print(f"✅ {self.name} is answering again, circuit closed")
+
+    def record_failure(self, weight: int = 1):
+        """Report a call that failed; weight is the number of failures it counts as."""
+        with self._lock:
+            self._failures += weight
+            if self._state == HALF_OPEN:
+                self._trial_in_flight = False
+                self._open("failed its trial call")
+            elif self._state == CLOSED and self._failures >= self.failure_threshold:
+                self._open(f"failed {self._failures} times in a row")
+
+    def record_timeout(self):
+        """Report a call that timed out waiting for an answer; it counts as timeout_weight failures.
+        
+        Each timed-out call has already cost its caller the full timeout, so fewer of
+        them open the breaker, but one slow request on its own doesn't: the breaker is
+        shared by every caller, and a long parse can legitimately run into its timeout.
+        """
+        self.record_failure(self.timeout_weight)
+
+    def release(self):
+        """Report an allowed call that never reached the service; it counts neither way."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trial_in_flight = False
+
+    def snapshot(self) -> dict:
+        """Return the breaker's state and counts."""
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "opened_seconds_ago": time.monotonic() - self._opened_at if self._state != CLOSED else None,
+                "trips": self.trips,
+                "rejections": self.rejections,
+            }
+
+    def _open(self, reason: str):
+        # Caller holds the lock
+        self._set_state(OPEN)
+        self._opened_at = time.monotonic()
+        self.trips += 1
+        metrics.count("circuit_trips_total", circuit=self.name)
+        print(f"🔌 {self.name} {reason}, circuit open: using the fallback until it recovers")
+        if self.probe is not None and self._probe_thread is None:
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="circuit-probe", daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        """Probe the service until it answers, then let a trial call through."""
+        while True:
+            time.sleep(self.probe_interval)
+            try:
+                healthy = bool(self.probe())
+            except Exception:
+                healthy = False
+            with self._lock:
+                if self._state != OPEN:
+                    self._probe_thread = None
+                    return
+                if healthy:
+                    self._set_state(HALF_OPEN)
+                    self._probe_thread = None
+                    print(f"🔍 {self.name} health probe succeeded, trying one request")
+                    return
+
+    def _set_state(self, state: str):
+        self._state = state
+        self._publish_state()
+
+    def _publish_state(self):
+        metrics.set_gauge("circuit_state", STATE_VALUES[self._state], circuit=self.name)
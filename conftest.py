@@ -0,0 +1,49 @@
+"""
+Fakes shared by the tests.
+"""
+
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+
+
+class FakeSpeechResponse:
+    """Streaming speech response holding raw PCM."""
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def iter_bytes(self, chunk_size: int = 4096):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+
+class FakeOpenAIClient:
+    """Stands in for openai.OpenAI: answers speech requests with silence and records their input.
+
+    Requests whose input contains fail_marker raise instead, as a failed request would.
+    """
+
+    def __init__(self, fail_marker=None):
+        self.fail_marker = fail_marker
+        self.spoken = []
+        self._lock = threading.Lock()
+        streaming = SimpleNamespace(create=self._create)
+        self.audio = SimpleNamespace(speech=SimpleNamespace(with_streaming_response=streaming, create=self._create))
+
+    def with_options(self, **options):
+        return self
+
+    def _create(self, model, voice, input, response_format="mp3", **kwargs):
+        if self.fail_marker and self.fail_marker in input:
+            raise RuntimeError("synthesis failed")
+        with self._lock:
+            self.spoken.append(input)
+        return FakeSpeechResponse(np.zeros(240, dtype="<i2").tobytes())
@@ -0,0 +1,1740 @@
+"""
+PDF to Audio conversion core: extraction, cleaning, chunking, synthesis and assembly.
+
+Importable without the web UI, so batch jobs, scripts and process-pool workers
+load only what they use: gradio is never imported here, and openai, httpx and
+PyMuPDF are imported on first use.
+"""
+
+import numpy as np
+import tempfile
+import os
+import copy
+import json
+import threading
+import time
+from typing import Optional, Tuple
+from contextlib import contextmanager
+import requests
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import text_cleaning
+from audio_writer import IncrementalAudioWriter
+from audio_encoding import (OUTPUT_FORMATS, DEFAULT_OUTPUT_FORMAT, DEFAULT_BITRATES_KBPS,
+                            available_output_formats, encode_in_background,
+                            output_path_for, StreamingEncoder)
+from pdf_extraction import (PARALLEL_FALLBACK_MIN_PAGES, PARALLEL_FALLBACK_MIN_PAGES_PER_TASK, ROUTE_LOCAL,
+                            classify_pdf, extract_page_range_layout_text, extract_page_range_text,
+                            get_extraction_process_pool, read_outline)
+from mineru_client import MinerUClient, MinerUError, DEFAULT_SHARD_PAGES
+from circuit_breaker import CircuitOpenError
+from rate_limit import TTSRateLimiter, DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_CHARACTERS_PER_MINUTE
+from chunking import (DEFAULT_MAX_CHUNK_LENGTH, CHUNKING_PACKED, CHUNKING_CONTENT_DEFINED, CHUNKING_MODES,
+                      new_chunker, split_text_into_chunks)
+from chapters import (DEFAULT_CHAPTER_LEVEL, SectionChunker, chapter_filename, outline_sections,
+                      split_markdown_sections, write_chapter_index)
+from pipeline import BackgroundIterator
+from checkpoint import ConversionJob, DocumentRevision, chunk_hash, job_id
+from tts_engines import TTSEngine, OpenAITTSEngine, EspeakTTSEngine, TTS_ENGINES, DEFAULT_TTS_ENGINE
+import metrics
+from cache import (DiskCache, ExtractionCache, DEFAULT_CACHE_DIR, DEFAULT_TTS_CACHE_BYTES,
+                   DEFAULT_EXTRACTION_CACHE_BYTES, DEFAULT_EXTRACTION_CACHE_TTL,
+                   file_sha256, tts_cache_key)
+
+# Number of OpenAI TTS requests kept in flight while synthesizing a document
+DEFAULT_TTS_CONCURRENCY = 4
+
+# OpenAI-compatible API to send TTS requests to (e.g. a local stand-in); None means api.openai.com
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") or None
+
+# OpenAI TTS settings used for document synthesis
+TTS_MODEL = "tts-1-hd"
+TTS_RESPONSE_FORMAT = "pcm"
+
+# OpenAI "pcm" responses are raw 24 kHz, 16-bit signed little-endian mono samples
+TTS_SAMPLE_RATE = 24000
+TTS_PCM_DTYPE = "<i2"
+TTS_STREAM_BLOCK_BYTES = 64 * 1024
+
+# Chunks that extraction may run ahead of synthesis before it waits
+PIPELINE_BUFFERED_CHUNKS = 16
+
+# Conversions extracting text at once, and TTS requests in flight, across all sessions of a converter
+DEFAULT_MAX_CONCURRENT_EXTRACTIONS = 4
+DEFAULT_MAX_CONCURRENT_TTS_REQUESTS = 32
+
+# Connections kept open to the OpenAI API, shared by every session's client
+OPENAI_MAX_CONNECTIONS = 64
+# SDK retries of the API key check; synthesis requests are only retried by the rate limiter
+OPENAI_VALIDATION_RETRIES = 2
+
+# Extraction paths, recorded in extraction cache keys
+EXTRACTION_METHOD_MINERU = "mineru"
+EXTRACTION_METHOD_PYMUPDF = "pymupdf"
+EXTRACTION_METHOD_LAYOUT = "pymupdf-layout"
+# Extraction cache entries holding a document's section pieces (JSON) for chapter output
+EXTRACTION_METHOD_SECTIONS = "sections"
+
+# Born-digital documents are read locally in windows of this many pages; header/footer
+# detection counts repeated lines within a window
+LAYOUT_WINDOW_PAGES = 16
+
+_openai_http_client = None
+_openai_http_client_lock = threading.Lock()
+
+
+def get_openai_http_client() -> "httpx.Client":
+    """Return the process-wide keep-alive HTTP client shared by all OpenAI clients."""
+    import httpx
+    
+    global _openai_http_client
+    with _openai_http_client_lock:
+        if _openai_http_client is None:
+            limits = httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                                  max_keepalive_connections=OPENAI_MAX_CONNECTIONS)
+            _openai_http_client = httpx.Client(limits=limits)
+        return _openai_http_client
+
+
+class PDFToAudioConverter:
+    def __init__(self, tts_concurrency: int = DEFAULT_TTS_CONCURRENCY,
+                 cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                 tts_cache_bytes: int = DEFAULT_TTS_CACHE_BYTES,
+                 extraction_cache_bytes: int = DEFAULT_EXTRACTION_CACHE_BYTES,
+                 extraction_cache_ttl: Optional[float] = DEFAULT_EXTRACTION_CACHE_TTL,
+                 fallback_workers: Optional[int] = None,
+                 mineru_urls: Optional[list] = None,
+                 mineru_shard_pages: int = DEFAULT_SHARD_PAGES,
+                 tts_requests_per_minute: Optional[float] = DEFAULT_REQUESTS_PER_MINUTE,
+                 tts_characters_per_minute: Optional[float] = DEFAULT_CHARACTERS_PER_MINUTE,
+                 jobs_dir: Optional[str] = None,
+                 output_format: str = DEFAULT_OUTPUT_FORMAT,
+                 output_bitrate_kbps: Optional[float] = None,
+                 traces_dir: Optional[str] = None,
+                 openai_base_url: Optional[str] = OPENAI_BASE_URL,
+                 max_concurrent_extractions: int = DEFAULT_MAX_CONCURRENT_EXTRACTIONS,
+                 max_concurrent_tts_requests: int = DEFAULT_MAX_CONCURRENT_TTS_REQUESTS,
+                 born_digital_fast_path: bool = True,
+                 chunking: str = CHUNKING_PACKED,
+                 revisions_dir: Optional[str] = None,
+                 chapter_level: int = DEFAULT_CHAPTER_LEVEL,
+                 tts_engine: str = DEFAULT_TTS_ENGINE,
+                 local_tts_workers: Optional[int] = None):
+        """Initialize the PDF to Audio converter with OpenAI TTS (or a local engine, see tts_engines)."""
+        self.client = None
+        self.api_key = None
+        self.openai_base_url = openai_base_url
+        self.tts_concurrency = max(1, int(tts_concurrency))
+        # Processes used by the PyMuPDF fallback on large documents (defaults to one per core)
+        self.fallback_workers = max(1, int(fallback_workers or os.cpu_count() or 1))
+        # All TTS requests go through the rate budgets; concurrency adapts down on throttling
+        self.tts_requests_per_minute = tts_requests_per_minute
+        self.tts_characters_per_minute = tts_characters_per_minute
+        # One limiter per API key, shared by every session using that key (OpenAI's limits are per key)
+        self.rate_limiters = {}
+        self.rate_limiters_lock = threading.Lock()
+        self.rate_limiter = self.rate_limiter_for(None)
+        
+        # Shared by every session (see new_session), so many users can't overload extraction or the TTS API
+        self.extraction_slots = threading.BoundedSemaphore(max(1, int(max_concurrent_extractions)))
+        self.tts_request_slots = threading.BoundedSemaphore(max(1, int(max_concurrent_tts_requests)))
+        
+        # Documents longer than mineru_shard_pages are parsed in concurrent page windows
+        self.mineru = MinerUClient(mineru_urls, shard_pages=mineru_shard_pages)
+        # PDFs with a clean text layer skip MinerU and are read locally (see classify_document)
+        self.born_digital_fast_path = born_digital_fast_path
+        
+        # Synthesized chunks and extracted text are cached on disk; pass cache_dir=None to disable
+        self.tts_cache = None
+        self.extraction_cache = None
+        if cache_dir:
+            try:
+                self.tts_cache = DiskCache(os.path.join(cache_dir, "tts"), tts_cache_bytes,
+                                           suffix=f".{TTS_RESPONSE_FORMAT}")
+                self.extraction_cache = ExtractionCache(os.path.join(cache_dir, "extraction"),
+                                                        extraction_cache_bytes, extraction_cache_ttl)
+            except OSError as e:
+                print(f"⚠️ Caching disabled, could not open {cache_dir}: {e}")
+        
+        # Conversions are checkpointed per chunk so a failed or interrupted run can resume
+        self.jobs_dir = jobs_dir or (os.path.join(cache_dir, "jobs") if cache_dir else None)
+        # Jobs and document revisions being run right now, by any session; each is only written by one run at a time
+        self.active_jobs = set()
+        self.active_revisions = set()
+        self.active_jobs_lock = threading.Lock()
+        # Chunk boundaries: packed to the TTS limit, or content-defined so revised documents keep most chunks
+        if chunking not in CHUNKING_MODES:
+            raise ValueError(f"Unknown chunking mode {chunking!r}, expected one of {', '.join(CHUNKING_MODES)}")
+        self.chunking = chunking
+        # Audio of the last version of each document converted with a revision key, for reuse by the next one
+        self.revisions_dir = revisions_dir or (os.path.join(cache_dir, "revisions") if cache_dir else None)
+        # Outline entries and markdown headings this deep or shallower start a new file in chapter output
+        self.chapter_level = max(1, int(chapter_level))
+        # Engines chunks can be synthesized with; each conversion picks one by name (tts_engine if it doesn't)
+        self.engines = {engine.name: engine for engine in (
+            OpenAITTSEngine(TTS_MODEL),
+            # Processes running local synthesis (defaults to one per core)
+            EspeakTTSEngine(TTS_SAMPLE_RATE, workers=local_tts_workers),
+        )}
+        self.default_engine = self.get_engine(tts_engine)
+        # Per-stage timings of each conversion are written here as JSON
+        self.traces_dir = traces_dir or (os.path.join(cache_dir, "traces") if cache_dir else None)
+        
+        # Finished audio is encoded to this format (in a worker process) unless a call asks for another
+        self.output_format = self.check_output_format(output_format or DEFAULT_OUTPUT_FORMAT)
+        self.output_bitrate_kbps = output_bitrate_kbps
+        print("PDF to Audio Converter initialized. Please provide your OpenAI API key.")
+        
+    def set_api_key(self, api_key: str) -> str:
+        """Set the OpenAI API key and initialize the client."""
+        try:
+            if not api_key or not api_key.strip():
+                return "❌ Please provide a valid OpenAI API key."
+            
+            import openai
+            
+            self.api_key = api_key.strip()
+            # The rate limiter retries throttled and failed requests; SDK retries would hide them
+            # from it (no backoff, wrong stats) and multiply the attempts per chunk
+            self.client = openai.OpenAI(api_key=self.api_key, base_url=self.openai_base_url,
+                                        http_client=get_openai_http_client(), max_retries=0)
+            
+            # Test the API key with a simple request
+            try:
+                # Test with a very short text; this one request isn't scheduled by the rate limiter,
+                # so the SDK retries it
+                response = self.client.with_options(max_retries=OPENAI_VALIDATION_RETRIES).audio.speech.create(
+                    model="tts-1",
+                    voice="alloy",
+                    input="Test"
+                )
+                self.rate_limiter = self.rate_limiter_for(self.api_key)
+                return "✅ OpenAI API key validated successfully! Ready to convert PDFs to audio."
+            except Exception as e:
+                self.client = None
+                self.api_key = None
+                return f"❌ Invalid API key or API error: {str(e)}"
+                
+        except Exception as e:
+            return f"❌ Error setting API key: {str(e)}"
+    
+    def rate_limiter_for(self, api_key: Optional[str]) -> TTSRateLimiter:
+        """Return the TTS rate limiter shared by every session using api_key, creating it on first use."""
+        # Keyed by a digest so the shared table doesn't hold the keys themselves
+        key = chunk_hash(api_key) if api_key else None
+        with self.rate_limiters_lock:
+            limiter = self.rate_limiters.get(key)
+            if limiter is None:
+                limiter = self.rate_limiters[key] = TTSRateLimiter(
+                    self.tts_requests_per_minute, self.tts_characters_per_minute,
+                    max_concurrency=self.tts_concurrency)
+            return limiter
+    
+    def get_engine(self, engine=None) -> TTSEngine:
+        """Return the TTS engine named engine (an engine is returned as is), or the default if None."""
+        if isinstance(engine, TTSEngine):
+            return engine
+        if engine is None:
+            return self.default_engine
+        if engine not in self.engines:
+            raise ValueError(f"Unknown TTS engine {engine!r}, expected one of {', '.join(TTS_ENGINES)}")
+        return self.engines[engine]
+    
+    def engine_error(self, engine: TTSEngine) -> Optional[str]:
+        """Return why a conversion can't synthesize with engine right now, or None if it can."""
+        if engine.needs_api_key and not self.client:
+            return "❌ Please set your OpenAI API key first."
+        if not engine.available():
+            return f"❌ {engine.unavailable_reason()}."
+        return None
+    
+    def new_session(self) -> "PDFToAudioConverter":
+        """Return a converter for one user of a shared server.
+        
+        The session gets its own API key and OpenAI client, so users never see each
+        other's keys. Its TTS rate budget is the one of its key, shared with every other
+        session using the same key. Caches, the MinerU client, job checkpoints, the
+        HTTP connection pools and the extraction/TTS concurrency limits stay shared.
+        """
+        session = copy.copy(self)
+        session.client = None
+        session.api_key = None
+        session.rate_limiter = self.rate_limiter_for(None)
+        return session
+    
+    def extract_text_from_pdf_mineru(self, pdf_file) -> str:
+        """Extract text content from uploaded PDF file using MinerU API."""
+        if pdf_file is None:
+            return "No PDF file provided."
+        
+        data = self.mineru.form_data()
+        
+        # Skip parsing entirely if this PDF was already parsed with the same settings
+        cached_text = self.get_cached_extraction(pdf_file, EXTRACTION_METHOD_MINERU, data)
+        if cached_text is not None:
+            return cached_text
+        
+        if self.mineru_unavailable():
+            return self.extract_text_from_pdf_fallback(pdf_file)
+        
+        page_count = self.get_page_count(pdf_file)
+        if page_count and page_count > self.mineru.shard_pages:
+            cleaned_text = ' '.join(self.iter_text_from_pdf_mineru_sharded(pdf_file, page_count))
+            if not cleaned_text.strip():
+                print("⚠️ MinerU returned empty text, falling back to basic extraction")
+                return self.extract_text_from_pdf_fallback(pdf_file)
+            return cleaned_text
+        
+        cleaned_text = self.parse_pdf_with_mineru(pdf_file)
+        if cleaned_text is None:
+            return self.extract_text_from_pdf_fallback(pdf_file)
+        return cleaned_text
+
+    def mineru_unavailable(self) -> bool:
+        """True while every MinerU endpoint's circuit breaker is open, so the document goes straight to basic extraction."""
+        if self.mineru.available():
+            return False
+        print("⚡ MinerU is unavailable (circuit breaker open), using basic extraction until it recovers")
+        metrics.count("extraction_fallbacks_total", scope="document", reason="circuit_open")
+        return True
+
+    def parse_pdf_with_mineru(self, pdf_file) -> Optional[str]:
+        """Parse a whole PDF in one MinerU request. Returns the cleaned text, or None if basic extraction should be used."""
+        try:
+            print("🔄 Using MinerU API for advanced PDF parsing...")
+            
+            # Make request to MinerU API
+            data = self.mineru.form_data()
+            result = self.mineru.parse(pdf_file)
+            
+            if isinstance(result, dict):
+                # Extract text from MinerU response - handle nested structure
+                cleaned_text = self.extract_text_from_mineru_response(result)
+                
+                if not cleaned_text or not cleaned_text.strip():
+                    print("⚠️ MinerU returned empty text, falling back to basic extraction")
+                    metrics.count("extraction_fallbacks_total", scope="document", reason="empty")
+                    return None
+                
+                print(f"✅ MinerU PDF extraction completed successfully! Extracted {len(cleaned_text)} characters with advanced parsing.")
+                metrics.count("extractions_total", method=EXTRACTION_METHOD_MINERU, cached="no")
+                self.store_cached_extraction(pdf_file, EXTRACTION_METHOD_MINERU, data, cleaned_text.strip())
+                return cleaned_text.strip()
+            
+            # If response is not JSON, treat as plain text
+            cleaned_text = result
+            if cleaned_text and cleaned_text.strip():
+                print(f"✅ MinerU PDF extraction completed! Extracted {len(cleaned_text)} characters.")
+                metrics.count("extractions_total", method=EXTRACTION_METHOD_MINERU, cached="no")
+                self.store_cached_extraction(pdf_file, EXTRACTION_METHOD_MINERU, data, cleaned_text.strip())
+                return cleaned_text.strip()
+            else:
+                print("⚠️ MinerU returned empty response, falling back to basic extraction")
+                metrics.count("extraction_fallbacks_total", scope="document", reason="empty")
+                return None
+                    
+        except CircuitOpenError as e:
+            # Every endpoint failed just now, on this or another request; don't wait on it
+            print(f"⚡ {e}, falling back to basic extraction")
+            metrics.count("extraction_fallbacks_total", scope="document", reason="circuit_open")
+            return None
+        except MinerUError as e:
+            # Fallback to basic extraction if MinerU fails
+            print(f"❌ {e}")
+        except requests.exceptions.Timeout:
+            print("⚠️ MinerU API timeout, falling back to basic extraction")
+        except requests.exceptions.RequestException as e:
+            print(f"⚠️ MinerU API connection error: {str(e)}, falling back to basic extraction")
+        except Exception as e:
+            print(f"⚠️ MinerU processing error: {str(e)}, falling back to basic extraction")
+        metrics.count("extraction_fallbacks_total", scope="document", reason="error")
+        return None
+
+    def iter_text_from_pdf_mineru_sharded(self, pdf_file, page_count: int):
+        """Parse a long PDF in concurrent MinerU page windows and yield their text in page order.
+        
+        Windows that MinerU fails on are extracted with PyMuPDF instead. The document
+        is cached once every window has been parsed by MinerU.
+        """
+        shard_count = len(self.mineru.shard_ranges(page_count))
+        print(f"🔄 Using MinerU API for advanced PDF parsing ({page_count} pages in {shard_count} shards of {self.mineru.shard_pages})...")
+        
+        shard_texts = []
+        failed_shards = 0
+        for start, end, result in self.mineru.iter_shards(pdf_file, page_count):
+            shard_text = ""
+            if isinstance(result, dict):
+                shard_text = self.extract_text_from_mineru_response(result)
+            elif isinstance(result, str):
+                shard_text = result
+            
+            if not shard_text.strip():
+                # Only this window falls back, the rest of the document keeps MinerU quality
+                failed_shards += 1
+                shard_text = self.extract_failed_shard(pdf_file, start, end, result)
+            
+            if shard_text.strip():
+                shard_texts.append(shard_text.strip())
+                yield shard_text.strip()
+        
+        cleaned_text = ' '.join(shard_texts)
+        metrics.count("extractions_total", method=EXTRACTION_METHOD_MINERU, cached="no")
+        if failed_shards:
+            print(f"⚠️ MinerU PDF extraction completed with {failed_shards}/{shard_count} shards from basic extraction. Extracted {len(cleaned_text)} characters.")
+        else:
+            print(f"✅ MinerU PDF extraction completed successfully! Extracted {len(cleaned_text)} characters from {shard_count} shards.")
+            # Only fully parsed documents are cached, so failed windows get another MinerU attempt next time
+            self.store_cached_extraction(pdf_file, EXTRACTION_METHOD_MINERU, self.mineru.form_data(), cleaned_text)
+
+    def extract_failed_shard(self, pdf_file, start: int, end: int, result) -> str:
+        """Extract pages start-end (inclusive) with PyMuPDF after MinerU failed on them or returned no text."""
+        if isinstance(result, Exception):
+            print(f"⚠️ MinerU failed for pages {start + 1}-{end + 1} ({result}), using basic extraction for them")
+        if isinstance(result, CircuitOpenError):
+            reason = "circuit_open"
+        else:
+            reason = "error" if isinstance(result, Exception) else "empty"
+        metrics.count("extraction_fallbacks_total", scope="shard", reason=reason)
+        with metrics.stage("pymupdf_extract", start_page=start, end_page=end) as span:
+            page_texts = extract_page_range_text(pdf_file, start, end + 1)
+            span["characters"] = sum(len(page_text) for page_text in page_texts)
+        return self.basic_text_cleaning("\n".join(page_texts))
+
+    def get_page_count(self, pdf_file) -> Optional[int]:
+        """Return the number of pages in a PDF, or None if it can't be read locally."""
+        try:
+            import fitz  # PyMuPDF
+            
+            with fitz.open(pdf_file) as doc:
+                return len(doc)
+        except Exception as e:
+            print(f"⚠️ Could not read page count: {e}")
+            return None
+
+    def extract_text_from_mineru_response(self, result: dict) -> str:
+        """Extract and clean text from MinerU API response structure."""
+        try:
+            # Handle the nested structure: {'backend': ..., 'version': ..., 'results': {...}}
+            if 'results' in result and isinstance(result['results'], dict):
+                all_content = []
+                
+                # Iterate through all documents in results
+                for doc_title, doc_data in result['results'].items():
+                    if isinstance(doc_data, dict) and 'md_content' in doc_data:
+                        markdown_content = doc_data['md_content']
+                        if markdown_content:
+                            # Clean the markdown content for TTS
+                            cleaned_content = self.clean_mineru_markdown_text(markdown_content)
+                            if cleaned_content.strip():
+                                all_content.append(cleaned_content)
+                
+                return ' '.join(all_content)
+            
+            # Fallback: try direct md_content access
+            elif 'md_content' in result:
+                return self.clean_mineru_markdown_text(result['md_content'])
+            
+            # Fallback: try text field
+            elif 'text' in result:
+                return result['text']
+            
+            # Last resort: convert entire result to string
+            else:
+                return str(result)
+                
+        except Exception as e:
+            print(f"Error extracting text from MinerU response: {e}")
+            return ""
+
+    def extract_text_from_pdf_fallback(self, pdf_file) -> str:
+        """Fallback PDF extraction method using basic text extraction."""
+        try:
+            cleaned_text = ' '.join(self.iter_text_from_pdf_fallback(pdf_file))
+            
+            if not cleaned_text:
+                return "No text found in the PDF file."
+            
+            return cleaned_text
+            
+        except ImportError:
+            return "PDF extraction failed. Please install PyMuPDF: pip install PyMuPDF"
+        except Exception as e:
+            return f"Error extracting text from PDF: {str(e)}"
+
+    def iter_text_from_pdf_fallback(self, pdf_file):
+        """Extract text with PyMuPDF, yielding each page's cleaned text in page order as it is read."""
+        cached_text = self.get_cached_extraction(pdf_file, EXTRACTION_METHOD_PYMUPDF, {})
+        if cached_text is not None:
+            yield cached_text
+            return
+        
+        print("🔄 Using fallback PDF extraction method...")
+        
+        # Simple text extraction without PyPDF2 dependency
+        import fitz  # PyMuPDF - more reliable than PyPDF2
+        
+        with fitz.open(pdf_file) as doc:
+            page_count = len(doc)
+        
+        # Small documents are faster to read here than to hand to a process pool
+        if self.fallback_workers > 1 and page_count >= PARALLEL_FALLBACK_MIN_PAGES:
+            pages_text = self.iter_pages_parallel(pdf_file, page_count)
+        else:
+            pages_text = self.iter_pages_serial(pdf_file)
+        
+        # Basic text cleaning; cleaning page by page gives the same text as cleaning the joined pages
+        cleaned_pages = []
+        for page_text in metrics.iter_timed("pymupdf_extract", pages_text, pages=page_count):
+            cleaned_page = self.basic_text_cleaning(page_text)
+            if cleaned_page:
+                cleaned_pages.append(cleaned_page)
+                yield cleaned_page
+        
+        if cleaned_pages:
+            cleaned_text = ' '.join(cleaned_pages)
+            print(f"✅ Fallback PDF extraction completed! Extracted {len(cleaned_text)} characters from {len(cleaned_pages)} pages.")
+            metrics.count("extractions_total", method=EXTRACTION_METHOD_PYMUPDF, cached="no")
+            self.store_cached_extraction(pdf_file, EXTRACTION_METHOD_PYMUPDF, {}, cleaned_text)
+
+    def iter_pages_serial(self, pdf_file):
+        """Yield page texts one page at a time."""
+        import fitz  # PyMuPDF
+        
+        with fitz.open(pdf_file) as doc:
+            for page_num in range(len(doc)):
+                yield doc.load_page(page_num).get_text()
+
+    def iter_pages_parallel(self, pdf_file, page_count: int):
+        """Extract page texts across a process pool, yielding them in page order as ranges finish."""
+        # Several page ranges per worker so one dense range doesn't leave the others idle
+        pages_per_task = max(PARALLEL_FALLBACK_MIN_PAGES_PER_TASK,
+                             -(-page_count // (self.fallback_workers * 4)))
+        ranges = [(start, min(start + pages_per_task, page_count))
+                  for start in range(0, page_count, pages_per_task)]
+        print(f"⚡ Extracting {page_count} pages in {len(ranges)} ranges across {self.fallback_workers} processes...")
+        
+        executor = get_extraction_process_pool(self.fallback_workers)
+        for range_text in executor.map(extract_page_range_text, [pdf_file] * len(ranges),
+                                       [start for start, _ in ranges], [end for _, end in ranges]):
+            yield from range_text
+
+    def clean_markdown_text(self, markdown_text: str) -> str:
+        """Convert markdown text to clean plain text suitable for TTS."""
+        with metrics.stage("clean_markdown", characters=len(markdown_text)):
+            return text_cleaning.clean_markdown_text(markdown_text)
+
+    def clean_mineru_markdown_text(self, markdown_text: str) -> str:
+        """Specialized cleaning for MinerU markdown content with enhanced TTS optimization."""
+        with metrics.stage("clean_mineru_markdown", characters=len(markdown_text)):
+            return text_cleaning.clean_mineru_markdown_text(markdown_text)
+
+    def convert_math_to_text(self, math_expr: str) -> str:
+        """Convert LaTeX math expressions to readable text for TTS."""
+        with metrics.stage("convert_math", characters=len(math_expr)):
+            return text_cleaning.convert_math_to_text(math_expr)
+
+    def basic_text_cleaning(self, text: str) -> str:
+        """Basic text cleaning for fallback extraction."""
+        with metrics.stage("basic_cleaning", characters=len(text)):
+            return text_cleaning.basic_text_cleaning(text)
+
+    def get_cached_extraction(self, pdf_file, method: str, params: dict) -> Optional[str]:
+        """Return previously extracted text for this PDF, method and settings, if cached."""
+        if not self.extraction_cache:
+            return None
+        try:
+            cached_text = self.extraction_cache.get(file_sha256(pdf_file), method, params)
+        except OSError as e:
+            print(f"⚠️ Extraction cache lookup failed: {e}")
+            return None
+        if cached_text:
+            print(f"💾 Using cached {method} extraction ({len(cached_text)} characters)")
+            metrics.count("extractions_total", method=method, cached="yes")
+            return cached_text
+        return None
+
+    def store_cached_extraction(self, pdf_file, method: str, params: dict, text: str):
+        """Cache the cleaned text extracted from a PDF."""
+        if not self.extraction_cache or not text:
+            return
+        try:
+            self.extraction_cache.put(file_sha256(pdf_file), method, params, text)
+        except OSError as e:
+            print(f"⚠️ Could not cache extracted text: {e}")
+
+    def extract_text_from_pdf(self, pdf_file) -> str:
+        """Main PDF extraction method - born-digital PDFs are read locally, others go to MinerU with a fallback."""
+        with self.extraction_slot():
+            if pdf_file is not None:
+                local_text = ' '.join(self.iter_text_from_pdf_local(pdf_file))
+                if local_text:
+                    return local_text
+            return self.extract_text_from_pdf_mineru(pdf_file)
+    
+    @contextmanager
+    def extraction_slot(self):
+        """Wait for one of the converter's extraction slots and hold it for the block."""
+        with metrics.stage("extraction_wait"):
+            self.extraction_slots.acquire()
+        try:
+            yield
+        finally:
+            self.extraction_slots.release()
+    
+    def iter_text_from_pdf(self, pdf_file):
+        """Yield cleaned PDF text in document order as it is extracted.
+        
+        Born-digital PDFs are read from their text layer; the rest go to MinerU, with
+        PyMuPDF if needed. Long documents come out one page window, MinerU shard or
+        PyMuPDF page at a time, so later stages can start before the whole document
+        has been parsed.
+        """
+        cached_text = self.get_cached_extraction(pdf_file, EXTRACTION_METHOD_MINERU, self.mineru.form_data())
+        if cached_text is not None:
+            yield cached_text
+            return
+        
+        local_text_found = False
+        for text_piece in self.iter_text_from_pdf_local(pdf_file):
+            local_text_found = True
+            yield text_piece
+        if local_text_found:
+            return
+        
+        if self.mineru_unavailable():
+            yield from self.iter_text_from_pdf_fallback(pdf_file)
+            return
+        
+        page_count = self.get_page_count(pdf_file)
+        if page_count and page_count > self.mineru.shard_pages:
+            yield from self.iter_text_from_pdf_mineru_sharded(pdf_file, page_count)
+            return
+        
+        cleaned_text = self.parse_pdf_with_mineru(pdf_file)
+        if cleaned_text is None:
+            yield from self.iter_text_from_pdf_fallback(pdf_file)
+        else:
+            yield cleaned_text
+    
+    def classify_document(self, pdf_file) -> Optional[dict]:
+        """Sample a PDF's pages to decide whether its text layer is good enough to skip MinerU."""
+        try:
+            with metrics.stage("classify") as span:
+                classification = classify_pdf(pdf_file)
+                span["route"] = classification["route"]
+        except Exception as e:
+            print(f"⚠️ Could not classify PDF, sending it to MinerU: {e}")
+            return None
+        metrics.count("extraction_routes_total", route=classification["route"])
+        return classification
+    
+    def iter_text_from_pdf_local(self, pdf_file):
+        """Yield the cleaned text of a born-digital PDF, read locally one page window at a time.
+        
+        Yields nothing if the fast path is disabled or the document needs MinerU
+        (scanned or image-heavy pages, formulas, tables).
+        """
+        if not self.born_digital_fast_path:
+            return
+        
+        cached_text = self.get_cached_extraction(pdf_file, EXTRACTION_METHOD_LAYOUT, {})
+        if cached_text is not None:
+            yield cached_text
+            return
+        
+        classification = self.classify_document(pdf_file)
+        if classification is None:
+            return
+        if classification["route"] != ROUTE_LOCAL:
+            print(f"🔍 PDF needs advanced parsing ({', '.join(classification['reasons'])})")
+            return
+        
+        page_count = classification["pages"]
+        print(f"⚡ Born-digital PDF ({classification['text_characters_per_page']:.0f} characters per page), "
+              f"reading its text layer locally instead of MinerU...")
+        
+        # Even windows, so the last one isn't too short for repeated-line detection
+        window_count = max(1, -(-page_count // LAYOUT_WINDOW_PAGES))
+        window_pages = -(-page_count // window_count)
+        windows = [(start, min(start + window_pages, page_count)) for start in range(0, page_count, window_pages)]
+        if self.fallback_workers > 1 and page_count >= PARALLEL_FALLBACK_MIN_PAGES:
+            executor = get_extraction_process_pool(self.fallback_workers)
+            windows_text = executor.map(extract_page_range_layout_text, [pdf_file] * len(windows),
+                                        [start for start, _ in windows], [end for _, end in windows])
+        else:
+            windows_text = (extract_page_range_layout_text(pdf_file, start, end) for start, end in windows)
+        
+        cleaned_windows = []
+        for pages_text in metrics.iter_timed("layout_extract", windows_text, pages=page_count):
+            # Positional header/footer removal already ran; this drops repeated lines and page numbers
+            cleaned_window = self.basic_text_cleaning(self.clean_pdf_text(pages_text))
+            if cleaned_window:
+                cleaned_windows.append(cleaned_window)
+                yield cleaned_window
+        
+        if cleaned_windows:
+            cleaned_text = ' '.join(cleaned_windows)
+            print(f"✅ Local PDF extraction completed! Extracted {len(cleaned_text)} characters from {page_count} pages.")
+            metrics.count("extractions_total", method=EXTRACTION_METHOD_LAYOUT, cached="no")
+            self.store_cached_extraction(pdf_file, EXTRACTION_METHOD_LAYOUT, {}, cleaned_text)
+    
+    def extract_sections_from_pdf(self, pdf_file) -> list:
+        """Return a PDF's cleaned text as a list of section pieces (heading, level, text) for chapter output."""
+        with self.extraction_slot():
+            return list(self.iter_sections_from_pdf(pdf_file))
+    
+    def iter_sections_from_pdf(self, pdf_file):
+        """Yield a PDF's cleaned text as section pieces (heading, level, text) in document order.
+        
+        Sections follow the PDF outline when it has one; each section's pages are read
+        locally if the document is born-digital, and parsed by MinerU otherwise. Without
+        an outline the document goes to MinerU, whose markdown headings mark the
+        sections, or comes out as one untitled section if MinerU is unavailable.
+        """
+        params = dict(self.mineru.form_data(), chapter_level=self.chapter_level,
+                      born_digital_fast_path=self.born_digital_fast_path)
+        cached_sections = self.get_cached_extraction(pdf_file, EXTRACTION_METHOD_SECTIONS, params)
+        if cached_sections is not None:
+            for heading, level, text in json.loads(cached_sections):
+                yield heading, level, text
+            return
+        
+        try:
+            document = read_outline(pdf_file)
+        except Exception as e:
+            print(f"⚠️ Could not read the PDF outline: {e}")
+            document = {"pages": self.get_page_count(pdf_file) or 0, "outline": []}
+        sections = outline_sections(document["outline"], document["pages"], self.chapter_level)
+        
+        pieces = []
+        if sections:
+            print(f"📑 Splitting into {len(sections)} sections from the PDF outline")
+            source = self.iter_outline_sections(pdf_file, sections, document["pages"])
+        elif document["pages"] and not self.mineru_unavailable():
+            print("📑 No PDF outline, splitting into sections at MinerU's headings")
+            source = self.iter_mineru_sections(pdf_file, document["pages"])
+        else:
+            print("⚠️ No PDF outline or MinerU headings to split at, converting the document as one section")
+            source = ((None, None, text_piece) for text_piece in self.iter_text_from_pdf(pdf_file))
+        
+        # Only sections from the preferred route for every page are cached, like whole-document extraction
+        complete = False
+        try:
+            while True:
+                piece = next(source)
+                pieces.append(piece)
+                yield piece
+        except StopIteration as stop:
+            complete = bool(stop.value)
+        
+        if complete and any(text for _, _, text in pieces):
+            metrics.count("extractions_total", method=EXTRACTION_METHOD_SECTIONS, cached="no")
+            self.store_cached_extraction(pdf_file, EXTRACTION_METHOD_SECTIONS, params, json.dumps(pieces))
+    
+    def iter_outline_sections(self, pdf_file, sections: list, page_count: int):
+        """Yield the section pieces of outline sections, reading each in page windows.
+        
+        Returns True if every window was read by the route the document needs (locally
+        for born-digital PDFs, MinerU otherwise), False if any was read by PyMuPDF instead.
+        """
+        classification = self.classify_document(pdf_file) if self.born_digital_fast_path else None
+        local = classification is not None and classification["route"] == ROUTE_LOCAL
+        use_mineru = not local and not self.mineru_unavailable()
+        
+        # Windows never span two sections, so each one belongs to exactly one
+        window_pages = LAYOUT_WINDOW_PAGES if local else self.mineru.shard_pages
+        windows = [(index, window_start, min(window_start + window_pages, end))
+                   for index, (_, _, start, end) in enumerate(sections)
+                   for window_start in range(start, end, window_pages)]
+        
+        if local:
+            print("⚡ Born-digital PDF, reading each section's text layer locally instead of MinerU...")
+            if self.fallback_workers > 1 and page_count >= PARALLEL_FALLBACK_MIN_PAGES:
+                executor = get_extraction_process_pool(self.fallback_workers)
+                windows_text = executor.map(extract_page_range_layout_text, [pdf_file] * len(windows),
+                                            [start for _, start, _ in windows], [end for _, _, end in windows])
+            else:
+                windows_text = (extract_page_range_layout_text(pdf_file, start, end) for _, start, end in windows)
+            texts = ((self.basic_text_cleaning(self.clean_pdf_text(pages_text)), True)
+                     for pages_text in metrics.iter_timed("layout_extract", windows_text, pages=page_count))
+        elif use_mineru:
+            print(f"🔄 Using MinerU API for advanced PDF parsing ({len(windows)} page windows)...")
+            texts = self.iter_mineru_window_texts(pdf_file, [(start, end - 1) for _, start, end in windows])
+        else:
+            windows_text = (extract_page_range_text(pdf_file, start, end) for _, start, end in windows)
+            texts = ((self.basic_text_cleaning("\n".join(pages_text)), False)
+                     for pages_text in metrics.iter_timed("pymupdf_extract", windows_text, pages=page_count))
+        
+        complete = True
+        for (index, start, _), (text, from_route) in zip(windows, texts):
+            complete = complete and from_route
+            heading, level, section_start, _ = sections[index]
+            yield (heading, level, text) if start == section_start else (None, None, text)
+        return complete
+    
+    def iter_mineru_window_texts(self, pdf_file, ranges: list):
+        """Parse page ranges (end inclusive) with MinerU concurrently and yield (text, parsed by MinerU) in order."""
+        for start, end, result in self.mineru.iter_ranges(pdf_file, ranges):
+            text = ""
+            if isinstance(result, dict):
+                text = self.extract_text_from_mineru_response(result)
+            elif isinstance(result, str):
+                text = result
+            if text.strip():
+                yield text.strip(), True
+            else:
+                yield self.extract_failed_shard(pdf_file, start, end, result), False
+    
+    def iter_mineru_sections(self, pdf_file, page_count: int):
+        """Parse a PDF with MinerU in shards and yield section pieces split at its markdown headings.
+        
+        Returns True if MinerU parsed every shard, False if any fell back to PyMuPDF.
+        """
+        complete = True
+        for start, end, result in self.mineru.iter_shards(pdf_file, page_count):
+            pieces = self.sections_from_mineru_response(result) if not isinstance(result, Exception) else []
+            if not any(text.strip() for _, _, text in pieces):
+                # The shard's text continues the current section; its headings are lost
+                complete = False
+                pieces = [(None, None, self.extract_failed_shard(pdf_file, start, end, result))]
+            yield from pieces
+        return complete
+    
+    def sections_from_mineru_response(self, result) -> list:
+        """Split the markdown of a MinerU response at its headings and clean each section."""
+        if isinstance(result, dict) and isinstance(result.get('results'), dict):
+            markdown_text = '\n\n'.join(doc_data['md_content'] for doc_data in result['results'].values()
+                                        if isinstance(doc_data, dict) and doc_data.get('md_content'))
+        elif isinstance(result, dict) and 'md_content' in result:
+            markdown_text = result['md_content'] or ""
+        elif isinstance(result, dict):
+            return [(None, None, self.extract_text_from_mineru_response(result))]
+        else:
+            markdown_text = result or ""
+        
+        pieces = []
+        for heading, level, section_markdown in split_markdown_sections(markdown_text, self.chapter_level):
+            text = self.clean_mineru_markdown_text(section_markdown)
+            if text:
+                pieces.append((heading, level, text))
+        return pieces
+    
+    def clean_pdf_text(self, pages_text: list) -> str:
+        """Clean PDF text by removing headers, footers, and improving readability."""
+        with metrics.stage("clean_pdf_text", characters=sum(len(page) for page in pages_text)):
+            return text_cleaning.clean_pdf_text(pages_text)
+    
+    def split_text_into_chunks(self, text: str, max_length: int = DEFAULT_MAX_CHUNK_LENGTH,
+                               mode: Optional[str] = None) -> list:
+        """Split long text into manageable chunks for OpenAI TTS processing."""
+        with metrics.stage("chunking", characters=len(text)) as span:
+            chunks = split_text_into_chunks(text, max_length, mode or self.chunking)
+            span["chunks"] = len(chunks)
+        metrics.count("chunks_total", len(chunks))
+        return chunks
+    
+    def iter_text_chunks(self, text_pieces, max_length: int = DEFAULT_MAX_CHUNK_LENGTH, mode: Optional[str] = None):
+        """Chunk text pieces as they arrive, yielding each chunk as soon as its boundaries are known."""
+        chunker = new_chunker(mode or self.chunking, max_length)
+        # Only the chunker's own time is recorded, not the extraction feeding it
+        started = time.perf_counter()
+        busy = 0.0
+        characters = 0
+        
+        def timed(method, *args):
+            nonlocal busy
+            start = time.perf_counter()
+            chunks = method(*args)
+            busy += time.perf_counter() - start
+            metrics.count("chunks_total", len(chunks))
+            return chunks
+        
+        for text_piece in text_pieces:
+            characters += len(text_piece)
+            yield from timed(chunker.feed, text_piece)
+        yield from timed(chunker.flush)
+        metrics.record_stage("chunking", busy, start=started, characters=characters)
+
+    def iter_section_chunks(self, section_pieces, section_chunker: SectionChunker, chunk_sections: list):
+        """Chunk section pieces as they arrive, yielding each chunk after appending its section index to chunk_sections."""
+        started = time.perf_counter()
+        busy = 0.0
+        characters = 0
+        
+        def timed(method, *args):
+            nonlocal busy
+            start = time.perf_counter()
+            tagged_chunks = method(*args)
+            busy += time.perf_counter() - start
+            metrics.count("chunks_total", len(tagged_chunks))
+            # Recorded before the chunk is handed on, so its section is known by the time it is synthesized
+            chunk_sections.extend(index for index, _ in tagged_chunks)
+            return [chunk for _, chunk in tagged_chunks]
+        
+        for heading, level, text in section_pieces:
+            characters += len(text)
+            yield from timed(section_chunker.feed, heading, level, text)
+        yield from timed(section_chunker.flush)
+        metrics.record_stage("chunking", busy, start=started, characters=characters)
+
+    def clean_text_for_tts(self, text: str) -> str:
+        """Clean and prepare text for text-to-speech conversion."""
+        # Chunks produced by split_text_into_chunks are already clean, so this is a scan, not a copy
+        return text_cleaning.normalize_for_tts(text)
+    
+    def text_to_speech_chunk(self, text_chunk: str, voice: str = "alloy",
+                             engine: Optional[TTSEngine] = None) -> Optional[np.ndarray]:
+        """Convert a single text chunk to speech (OpenAI TTS unless engine says otherwise) and return its 16-bit PCM samples."""
+        try:
+            if not text_chunk or not text_chunk.strip():
+                return None
+            
+            engine = self.get_engine(engine)
+            if engine.needs_api_key and not self.client:
+                print("OpenAI client not initialized. Please set API key first.")
+                return None
+            
+            audio_bytes = self.synthesize_chunk_audio(text_chunk, voice, engine)
+            
+            # View the bytes as samples without copying them
+            return np.frombuffer(audio_bytes, dtype=TTS_PCM_DTYPE, count=len(audio_bytes) // 2)
+            
+        except Exception as e:
+            print(f"Error generating audio for chunk: {str(e)}")
+            return None
+
+    def synthesize_chunk_audio(self, text_chunk: str, voice: str = "alloy",
+                               engine: Optional[TTSEngine] = None) -> bytes:
+        """Return the raw PCM for a text chunk, from the cache or the TTS engine. Raises on failure."""
+        engine = self.get_engine(engine)
+        # Clean text
+        clean_text = self.clean_text_for_tts(text_chunk)
+        
+        # OpenAI TTS can handle up to 4096 characters
+        if len(clean_text) > 4000:
+            clean_text = clean_text[:4000]
+            # Try to end at a word boundary
+            last_space = clean_text.rfind(' ')
+            if last_space > 3800:
+                clean_text = clean_text[:last_space]
+        
+        with metrics.stage("tts_chunk", characters=len(clean_text), engine=engine.name) as span:
+            # Reuse audio synthesized earlier for identical text and settings
+            cache_key = tts_cache_key(engine.model, voice, TTS_RESPONSE_FORMAT, clean_text)
+            audio_bytes = self.tts_cache.get(cache_key) if self.tts_cache else None
+            span["cache"] = "miss" if audio_bytes is None else "hit"
+            metrics.count("tts_requests_total", cache=span["cache"], engine=engine.name)
+            
+            if audio_bytes is None:
+                try:
+                    audio_bytes = engine.synthesize(self, clean_text, voice)
+                except Exception as e:
+                    metrics.count("tts_errors_total", error=e.__class__.__name__, engine=engine.name)
+                    raise
+                if self.tts_cache:
+                    self.tts_cache.put(cache_key, audio_bytes)
+            span["bytes"] = len(audio_bytes)
+        return audio_bytes
+
+    def synthesize_job_chunk(self, job: Optional[ConversionJob], index: int, text_chunk: str,
+                             voice: str = "alloy", revision: Optional[DocumentRevision] = None,
+                             engine: Optional[TTSEngine] = None) -> Optional[np.ndarray]:
+        """Synthesize one chunk of a checkpointed job and/or document revision.
+        
+        The chunk's segment is reused if an earlier run of the job finished it, or
+        if the document's previous revision had a chunk with the same text.
+        """
+        try:
+            if job is not None and job.register_chunk(index, text_chunk):
+                audio_bytes = job.load_segment(index)
+            else:
+                audio_bytes = revision.load_segment(index, text_chunk) if revision is not None else None
+                if audio_bytes is None:
+                    audio_bytes = self.synthesize_chunk_audio(text_chunk, voice, engine)
+                if job is not None:
+                    job.complete_chunk(index, audio_bytes)
+            if revision is not None:
+                revision.store_segment(index, text_chunk, audio_bytes)
+        except Exception as e:
+            print(f"Error generating audio for chunk: {str(e)}")
+            if job is not None:
+                try:
+                    job.fail_chunk(index, str(e))
+                except (OSError, KeyError) as record_error:
+                    print(f"⚠️ Could not record failed chunk in the job manifest: {record_error}")
+            return None
+        return np.frombuffer(audio_bytes, dtype=TTS_PCM_DTYPE, count=len(audio_bytes) // 2)
+
+    def synthesis_settings(self, voice: str, chunking: str, chapter_level: Optional[int] = None,
+                           engine: Optional[TTSEngine] = None) -> dict:
+        """Return the settings that decide a conversion's chunks and their audio."""
+        settings = {"model": self.get_engine(engine).model, "voice": voice, "format": TTS_RESPONSE_FORMAT,
+                    "max_chunk_length": DEFAULT_MAX_CHUNK_LENGTH}
+        # Only recorded when not the default, so jobs checkpointed before chunking modes existed still resume
+        if chunking != CHUNKING_PACKED:
+            settings["chunking"] = chunking
+        # Chapter output ends a chunk at every section boundary
+        if chapter_level is not None:
+            settings["chapter_level"] = chapter_level
+        return settings
+    
+    def chunking_for(self, revision_key: Optional[str]) -> str:
+        """Return the chunking mode of a conversion; revisions need content-defined boundaries to line up."""
+        return CHUNKING_CONTENT_DEFINED if revision_key else self.chunking
+    
+    def open_job(self, source_digest: str, voice: str, chunking: Optional[str] = None,
+                 chapter_level: Optional[int] = None, engine: Optional[TTSEngine] = None) -> Optional[ConversionJob]:
+        """Open the checkpointed job for a source, voice and engine, or None if checkpointing is off."""
+        if not self.jobs_dir:
+            return None
+        settings = self.synthesis_settings(voice, chunking or self.chunking, chapter_level, engine)
+        with self.active_jobs_lock:
+            if job_id(source_digest, settings) in self.active_jobs:
+                # Another session is converting the same document with the same voice
+                print("⚠️ This document is already being converted in another session; not checkpointing this run")
+                return None
+            try:
+                job = ConversionJob.open(self.jobs_dir, source_digest, settings)
+            except OSError as e:
+                print(f"⚠️ Checkpointing disabled for this conversion: {e}")
+                return None
+            self.active_jobs.add(job.job_dir.name)
+            return job
+
+    def open_revision(self, revision_key: Optional[str], voice: str,
+                      engine: Optional[TTSEngine] = None) -> Optional[DocumentRevision]:
+        """Open the revision record of the document named revision_key, or None if revisions aren't tracked."""
+        if not revision_key or not self.revisions_dir:
+            return None
+        settings = self.synthesis_settings(voice, CHUNKING_CONTENT_DEFINED, engine=engine)
+        with self.active_jobs_lock:
+            if job_id(revision_key, settings) in self.active_revisions:
+                # Two runs committing the same revision would delete each other's segments
+                print(f"⚠️ {revision_key} is already being converted in another session; not tracking this revision")
+                return None
+            try:
+                revision = DocumentRevision.open(self.revisions_dir, revision_key, settings)
+            except OSError as e:
+                print(f"⚠️ Revision tracking disabled for this conversion: {e}")
+                return None
+            self.active_revisions.add(revision.revision_dir.name)
+        if revision.previous_hashes:
+            print(f"♻️ Found the previous version of {revision_key} ({len(revision.previous_hashes)} chunks); "
+                  f"only changed chunks will be synthesized")
+        return revision
+    
+    def open_job_and_revision(self, revision_key: Optional[str], source_digest: str, voice: str,
+                              chunking: Optional[str] = None, chapter_level: Optional[int] = None,
+                              engine: Optional[TTSEngine] = None):
+        """Open a conversion's revision record and checkpointed job; if opening the job fails, the revision is released."""
+        revision = self.open_revision(revision_key, voice, engine)
+        try:
+            return revision, self.open_job(source_digest, voice, chunking, chapter_level, engine)
+        except BaseException:
+            self.release_revision(revision)
+            raise
+
+    def release_job(self, job: Optional[ConversionJob]):
+        """Let other runs open a job again once this run is done with it."""
+        if job is not None:
+            with self.active_jobs_lock:
+                self.active_jobs.discard(job.job_dir.name)
+    
+    def release_revision(self, revision: Optional[DocumentRevision]):
+        """Let other runs open a document revision again once this run is done with it."""
+        if revision is not None:
+            with self.active_jobs_lock:
+                self.active_revisions.discard(revision.revision_dir.name)
+
+    def start_trace(self, job: Optional[ConversionJob], **attributes) -> metrics.JobTrace:
+        """Start the stage trace of a conversion, named after its job if it has one."""
+        return metrics.JobTrace(job.job_dir.name if job is not None else None, **attributes)
+
+    def finish_trace(self, trace: metrics.JobTrace):
+        """Report where a conversion's time went and write its trace."""
+        print(f"⏱️ Stage times: {trace.summary()}")
+        if self.traces_dir:
+            trace_path = trace.write(self.traces_dir)
+            if trace_path:
+                print(f"⏱️ Trace written to {trace_path}")
+
+    def request_speech(self, text: str, voice: str) -> bytearray:
+        """Make one OpenAI TTS request and return the raw PCM bytes."""
+        # Stream raw PCM straight into memory: no temp file and no MP3 decode
+        audio_bytes = bytearray()
+        # Bounds the requests in flight across all sessions sharing this converter
+        with metrics.stage("tts_wait"):
+            self.tts_request_slots.acquire()
+        try:
+            with metrics.stage("tts_request", characters=len(text)) as span:
+                with self.client.audio.speech.with_streaming_response.create(
+                    model=TTS_MODEL,  # Use high-definition model for better quality
+                    voice=voice,
+                    input=text,
+                    response_format=TTS_RESPONSE_FORMAT
+                ) as response:
+                    for block in response.iter_bytes(TTS_STREAM_BLOCK_BYTES):
+                        audio_bytes += block
+                span["bytes"] = len(audio_bytes)
+        finally:
+            self.tts_request_slots.release()
+        return audio_bytes
+
+    def synthesize_chunks(self, text_chunks, voice: str = "alloy", progress=None, job: Optional[ConversionJob] = None,
+                          trace: Optional[metrics.JobTrace] = None, revision: Optional[DocumentRevision] = None,
+                          engine: Optional[TTSEngine] = None):
+        """Synthesize text chunks concurrently and yield (index, PCM samples) in chunk order.
+        
+        text_chunks may be a list or any iterable, such as chunks still being extracted;
+        chunks are pulled from it only as synthesis slots free up. With a job, each
+        chunk is checkpointed and chunks finished by an earlier run are reused; with a
+        revision, chunks unchanged since the document's previous version are reused.
+        Stages run by the TTS workers are recorded in trace. Chunks go to engine
+        (the converter's default if None), as many at once as it can take.
+        """
+        engine = self.get_engine(engine)
+        # The total isn't known up front when chunks are still being extracted
+        total = len(text_chunks) if hasattr(text_chunks, '__len__') else None
+        if total == 0:
+            return
+        
+        # Results are consumed in order, so keep a bounded window of submitted
+        # chunks: workers stay busy while a slow chunk at the head is awaited,
+        # but at most window finished chunks wait for it in memory.
+        concurrency = engine.concurrency(self)
+        window = concurrency * 2
+        chunk_iter = iter(enumerate(text_chunks))
+        pending = deque()
+        
+        def submit(executor, index, chunk):
+            if job is not None or revision is not None:
+                return executor.submit(metrics.run_in_trace, trace, self.synthesize_job_chunk, job, index, chunk, voice,
+                                       revision, engine)
+            return executor.submit(metrics.run_in_trace, trace, self.text_to_speech_chunk, chunk, voice, engine)
+        
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="tts") as executor:
+            try:
+                for index, chunk in chunk_iter:
+                    pending.append((index, submit(executor, index, chunk)))
+                    if len(pending) >= window:
+                        break
+                
+                while pending:
+                    index, future = pending.popleft()
+                    samples = future.result()
+                    
+                    next_item = next(chunk_iter, None)
+                    if next_item is not None:
+                        pending.append((next_item[0], submit(executor, *next_item)))
+                    
+                    chunk_label = f"{index+1}/{total}" if total else f"{index+1}"
+                    print(f"Processed chunk {chunk_label}")
+                    if progress is not None:
+                        if total:
+                            progress((index + 1) / total, desc=f"Synthesized chunk {chunk_label}")
+                        else:
+                            progress((index + 1, None), desc=f"Synthesized chunk {chunk_label}", unit="chunks")
+                    
+                    yield index, samples
+            finally:
+                # Don't start chunks nobody will consume (e.g. the caller stopped early)
+                for _, future in pending:
+                    future.cancel()
+
+    def text_to_speech_stream(self, text: str, voice: str = "alloy", progress=None,
+                              output_format: Optional[str] = None, bitrate_kbps: Optional[float] = None,
+                              revision_key: Optional[str] = None, engine: Optional[str] = None):
+        """Convert text to speech, yielding (chunk audio, final audio file, status) as chunks complete.
+        
+        Chunk audio is a (sample rate, samples) tuple, yielded in order as soon as the
+        chunk is synthesized so it can be played while later chunks are still in flight.
+        The last item carries the full audio file. With a revision_key (e.g. the
+        document's name), chunks unchanged since the last conversion under that key
+        reuse its audio. engine names the TTS engine (the converter's default if None).
+        """
+        try:
+            if not text or not text.strip():
+                yield None, None, "No text provided for conversion."
+                return
+            
+            engine = self.get_engine(engine)
+            engine_error = self.engine_error(engine)
+            if engine_error:
+                yield None, None, engine_error
+                return
+            
+            # Split text into chunks for the TTS engine (OpenAI TTS can handle up to 4096 characters)
+            chunking = self.chunking_for(revision_key)
+            text_chunks = self.split_text_into_chunks(text, max_length=4000, mode=chunking)
+            print(f"Processing {len(text_chunks)} text chunks with {engine.label} ({engine.concurrency(self)} at once)...")
+            
+            revision, job = self.open_job_and_revision(revision_key, chunk_hash(text), voice, chunking, engine=engine)
+            trace = self.start_trace(job, source="text", voice=voice, engine=engine.name, characters=len(text))
+            try:
+                if revision is not None and revision.previous_hashes:
+                    # The whole chunk list is known here, so the diff can be reported up front
+                    diff = revision.diff(text_chunks)
+                    print(f"♻️ Revision diff: {diff['unchanged']} chunks unchanged, {diff['changed']} new or changed, "
+                          f"{diff['removed']} removed")
+                yield from self.synthesize_to_file_stream(text_chunks, voice, progress=progress, job=job,
+                                                          output_format=output_format, bitrate_kbps=bitrate_kbps,
+                                                          trace=trace, revision=revision, engine=engine)
+            finally:
+                self.release_job(job)
+                self.release_revision(revision)
+                self.finish_trace(trace)
+            
+        except Exception as e:
+            error_msg = f"Error generating audio: {str(e)}"
+            print(error_msg)
+            yield None, None, error_msg
+
+    def synthesize_to_file_stream(self, text_chunks, voice: str = "alloy", progress=None,
+                                  job: Optional[ConversionJob] = None, output_format: Optional[str] = None,
+                                  bitrate_kbps: Optional[float] = None, trace: Optional[metrics.JobTrace] = None,
+                                  revision: Optional[DocumentRevision] = None, engine: Optional[TTSEngine] = None):
+        """Synthesize chunks into one audio file, yielding (chunk audio, final audio file, status) as chunks complete.
+        
+        With a job, the final file is only produced once every chunk is in the job's manifest as done.
+        With a revision, the completed chunks become the document's previous version.
+        The audio is encoded to output_format (the converter's default if None) while
+        it is assembled. Stage timings are recorded in trace, if given.
+        """
+        engine = self.get_engine(engine)
+        output_format = self.check_output_format(output_format)
+        # Each chunk is appended to the output as soon as it arrives, so only a
+        # few chunks are ever held in memory
+        total = len(text_chunks) if hasattr(text_chunks, '__len__') else None
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
+        temp_file.close()
+        # Compressed output is encoded in a worker process as chunks arrive, so the
+        # finished conversion doesn't wait for the whole book to be encoded
+        encoder = self.open_stream_encoder(temp_file.name, output_format, bitrate_kbps)
+        writer = IncrementalAudioWriter(temp_file.name, tee=encoder.append if encoder is not None else None)
+        failed_chunk = None
+        chunk_count = 0
+        finished = False
+        
+        try:
+            for index, samples in self.synthesize_chunks(text_chunks, voice, progress=progress, job=job, trace=trace,
+                                                         revision=revision, engine=engine):
+                chunk_count = index + 1
+                if samples is None:
+                    # Never produce an audiobook with a hole in it
+                    failed_chunk = index
+                    break
+                if len(samples) == 0:
+                    continue
+                with metrics.stage("audio_assembly", trace=trace, bytes=samples.nbytes):
+                    writer.append_samples(samples, TTS_SAMPLE_RATE)
+                chunk_label = f"{index+1}/{total}" if total else f"{index+1}"
+                yield (TTS_SAMPLE_RATE, samples), None, f"🔊 Playing while converting... chunk {chunk_label} ready"
+            finished = True
+        finally:
+            output_file = writer.close()
+            if not finished:
+                # Stopped early or failed: don't leave a partial file behind
+                os.unlink(temp_file.name)
+                if encoder is not None:
+                    encoder.abort()
+        
+        if job is not None and failed_chunk is None and output_file is not None:
+            job.set_total_chunks(chunk_count)
+            failed_chunk = job.first_missing_chunk()
+        
+        if failed_chunk is not None or output_file is None:
+            os.unlink(temp_file.name)
+            if encoder is not None:
+                encoder.abort()
+            if failed_chunk is not None:
+                yield None, None, self.failed_chunk_status(job, failed_chunk, total)
+            else:
+                yield None, None, "Failed to generate audio for any text chunks."
+            return
+        
+        duration = writer.duration
+        output_file = metrics.run_in_trace(trace, self.encode_output, output_file, output_format, bitrate_kbps,
+                                           encoder)
+        self.finish_synthesis(job, revision, chunk_count, output_file, engine)
+        print(f"🎵 Audio generation completed successfully! Generated {duration:.1f} seconds of audio from {chunk_count} text chunks.")
+        yield None, output_file, f"🎉 Audio generated successfully using {engine.label}! Duration: {duration:.1f} seconds ({chunk_count} chunks processed)"
+
+    def failed_chunk_status(self, job: Optional[ConversionJob], failed_chunk: int, total: Optional[int]) -> str:
+        """Mark a conversion stopped by a failed chunk as failed and return its status message."""
+        chunk_label = f"{failed_chunk+1}/{total}" if total else f"{failed_chunk+1}"
+        if job is not None:
+            job.mark_failed()
+            job_stats = job.stats()
+            print(f"📋 Job {job.job_dir.name} saved with {job_stats['done']} chunks done; rerun to resume")
+            return (f"❌ Failed to generate audio for chunk {chunk_label} after retries. "
+                    f"{job_stats['done']} finished chunks are saved; convert again to resume from the missing ones.")
+        return f"❌ Failed to generate audio for chunk {chunk_label} after retries. Please try again."
+
+    def finish_synthesis(self, job: Optional[ConversionJob], revision: Optional[DocumentRevision],
+                         chunk_count: int, output_file: str, engine: Optional[TTSEngine] = None):
+        """Complete the job and revision of a successful conversion and report its cache and request counts."""
+        if job is not None:
+            if job.resumed:
+                print(f"📋 Job {job.job_dir.name}: reused {job.resumed}/{chunk_count} chunks from an earlier run")
+            job.mark_completed(output_file)
+        if revision is not None:
+            if revision.previous_hashes:
+                print(f"♻️ Revision: reused audio for {revision.reused}/{chunk_count} chunks from the previous version")
+                metrics.count("revision_chunks_reused_total", revision.reused)
+            try:
+                revision.commit(chunk_count)
+            except OSError as e:
+                print(f"⚠️ Could not save this revision's audio for the next one: {e}")
+        if self.tts_cache:
+            cache_stats = self.tts_cache.stats()
+            print(f"💾 TTS cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['bytes'] / 1e6:.1f} MB used")
+        if not self.get_engine(engine).needs_api_key:
+            # Local engines don't go through the API rate budgets
+            return
+        limiter_stats = self.rate_limiter.stats()
+        print(f"🚦 TTS requests: {limiter_stats['requests']} sent, {limiter_stats['retries']} retried, {limiter_stats['throttled']} throttled")
+
+    def synthesize_to_chapters_stream(self, text_chunks, chunk_sections: list, sections: list, voice: str,
+                                      output_dir: str, title: str, progress=None,
+                                      job: Optional[ConversionJob] = None, output_format: Optional[str] = None,
+                                      bitrate_kbps: Optional[float] = None, trace: Optional[metrics.JobTrace] = None,
+                                      revision: Optional[DocumentRevision] = None, engine: Optional[TTSEngine] = None):
+        """Synthesize chunks into one audio file per section, yielding (chunk audio, output files, status) as chunks complete.
+        
+        chunk_sections holds each chunk's section index and sections the sections found
+        by a SectionChunker; both fill in as text_chunks is consumed. Each section's file
+        is encoded to output_format in the background while the next one is synthesized.
+        The last item lists the playlist, the chapter table and the chapter files in
+        output_dir; if a chunk fails, the chapter files written so far are removed.
+        """
+        engine = self.get_engine(engine)
+        output_format = self.check_output_format(output_format)
+        os.makedirs(output_dir, exist_ok=True)
+        chapters = []
+        encodings = []
+        chapter_files = []
+        writer = None
+        section_index = None
+        failed_chunk = None
+        chunk_count = 0
+        finished = False
+        # One section is encoded while the next is synthesized
+        encoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chapter-encode")
+        
+        def finish_section():
+            output_file = writer.close()
+            if output_file is None:
+                # A section whose text gave no audio gets no file
+                return
+            section = sections[section_index]
+            chapter_title = section["title"] or title
+            # Named once the section is complete, since a short opening section takes the title of the one it runs into
+            chapter_file = os.path.join(output_dir, chapter_filename(len(chapters) + 1, chapter_title, ".wav"))
+            os.replace(output_file, chapter_file)
+            chapters.append({"title": chapter_title, "level": section["level"] or 1, "samples": writer.frames_written,
+                             "characters": section["characters"], "chunks": section["chunks"]})
+            encodings.append(encoder.submit(metrics.run_in_trace, trace, self.encode_output, chapter_file,
+                                            output_format, bitrate_kbps))
+        
+        try:
+            for index, samples in self.synthesize_chunks(text_chunks, voice, progress=progress, job=job, trace=trace,
+                                                         revision=revision, engine=engine):
+                chunk_count = index + 1
+                if samples is None:
+                    # Never produce an audiobook with a hole in it
+                    failed_chunk = index
+                    break
+                if chunk_sections[index] != section_index:
+                    if writer is not None:
+                        finish_section()
+                    section_index = chunk_sections[index]
+                    writer = IncrementalAudioWriter(os.path.join(output_dir, chapter_filename(len(chapters) + 1, None, ".wav")))
+                if len(samples) == 0:
+                    continue
+                with metrics.stage("audio_assembly", trace=trace, bytes=samples.nbytes):
+                    writer.append_samples(samples, TTS_SAMPLE_RATE)
+                yield (TTS_SAMPLE_RATE, samples), None, (f"🔊 Playing while converting... section {len(chapters) + 1}, "
+                                                         f"chunk {index + 1} ready")
+            if writer is not None and failed_chunk is None:
+                finish_section()
+                writer = None
+            if job is not None and failed_chunk is None and chunk_count:
+                job.set_total_chunks(chunk_count)
+                failed_chunk = job.first_missing_chunk()
+            finished = True
+        finally:
+            if writer is not None:
+                writer.close()
+            encoder.shutdown(wait=True)
+            chapter_files = [future.result() for future in encodings]
+            if not finished or failed_chunk is not None:
+                # Stopped early or failed: don't leave a partial set of chapters behind
+                for path in chapter_files + ([writer.output_path] if writer is not None else []):
+                    if os.path.exists(path):
+                        os.unlink(path)
+        
+        if failed_chunk is not None:
+            yield None, None, self.failed_chunk_status(job, failed_chunk, None)
+            return
+        
+        if not chapters:
+            yield None, None, "Failed to generate audio for any text chunks."
+            return
+        
+        for chapter, chapter_file in zip(chapters, chapter_files):
+            chapter["file"] = os.path.basename(chapter_file)
+        playlist_path, index_path = write_chapter_index(output_dir, title, chapters, TTS_SAMPLE_RATE)
+        metrics.count("chapters_total", len(chapters))
+        self.finish_synthesis(job, revision, chunk_count, index_path, engine)
+        duration = sum(chapter["samples"] for chapter in chapters) / TTS_SAMPLE_RATE
+        print(f"📑 Wrote {len(chapters)} chapter files with {os.path.basename(playlist_path)} and "
+              f"{os.path.basename(index_path)} to {output_dir}")
+        print(f"🎵 Audio generation completed successfully! Generated {duration:.1f} seconds of audio from {chunk_count} text chunks.")
+        yield None, [playlist_path, index_path] + chapter_files, (
+            f"🎉 Audio generated successfully using {engine.label}! {len(chapters)} chapters, "
+            f"duration: {duration:.1f} seconds ({chunk_count} chunks processed)")
+
+    def check_output_format(self, output_format: Optional[str]) -> str:
+        """Return output_format if this system can write it, otherwise WAV."""
+        if not output_format:
+            return self.output_format
+        if output_format not in available_output_formats():
+            print(f"⚠️ Output format {output_format} is not supported by the installed libsndfile, using WAV")
+            return "wav"
+        return output_format
+
+    def output_bitrate(self, output_format: str, bitrate_kbps: Optional[float] = None) -> Optional[float]:
+        """Return the bitrate to encode output_format at: the call's, the converter's, or the format's default."""
+        return bitrate_kbps or self.output_bitrate_kbps or DEFAULT_BITRATES_KBPS.get(output_format)
+
+    def open_stream_encoder(self, wav_file: str, output_format: str,
+                            bitrate_kbps: Optional[float] = None) -> Optional[StreamingEncoder]:
+        """Start encoding the audio assembled into wav_file as it arrives, or return None for WAV output.
+        
+        If the encoder can't be started, None is returned too and encode_output
+        encodes the finished WAV instead.
+        """
+        if output_format == "wav":
+            return None
+        try:
+            return StreamingEncoder(output_path_for(wav_file, output_format), output_format, TTS_SAMPLE_RATE,
+                                    self.output_bitrate(output_format, bitrate_kbps))
+        except Exception as e:
+            print(f"⚠️ Could not start the {OUTPUT_FORMATS[output_format]['label']} encoder ({e}), "
+                  f"encoding after synthesis instead")
+            return None
+
+    def encode_output(self, wav_file: str, output_format: str, bitrate_kbps: Optional[float] = None,
+                      encoder: Optional[StreamingEncoder] = None) -> str:
+        """Encode a finished WAV to output_format in a worker process. Returns the file to deliver.
+        
+        With the encoder that has been streaming the WAV's audio, only waits for it to finish.
+        """
+        if output_format == "wav":
+            return wav_file
+        
+        label = OUTPUT_FORMATS[output_format]["label"]
+        bitrate_kbps = self.output_bitrate(output_format, bitrate_kbps)
+        print(f"🗜️ {'Finishing' if encoder is not None else 'Encoding'} {label}"
+              f"{f' at {bitrate_kbps:g} kbps' if output_format in DEFAULT_BITRATES_KBPS else ''}...")
+        try:
+            # The encoder runs in its own process; this thread only waits for it
+            with metrics.stage("encode", format=output_format, bytes=os.path.getsize(wav_file),
+                               streamed=encoder is not None):
+                if encoder is not None:
+                    # Encoded while it was synthesized: only the last blocks are left
+                    encoded_file = encoder.close()
+                else:
+                    encoded_file = encode_in_background(wav_file, output_format, bitrate_kbps).result()
+        except Exception as e:
+            print(f"⚠️ {label} encoding failed ({e}), delivering WAV instead")
+            return wav_file
+        
+        wav_size = os.path.getsize(wav_file)
+        encoded_size = os.path.getsize(encoded_file)
+        os.unlink(wav_file)
+        print(f"🗜️ {label}: {encoded_size / 1e6:.1f} MB ({wav_size / max(encoded_size, 1):.1f}x smaller than WAV)")
+        return encoded_file
+
+    def text_to_speech(self, text: str, voice: str = "alloy", progress=None,
+                       output_format: Optional[str] = None,
+                       bitrate_kbps: Optional[float] = None,
+                       revision_key: Optional[str] = None,
+                       engine: Optional[str] = None) -> Tuple[Optional[str], str]:
+        """Convert text to speech using OpenAI TTS (or engine) with chunking for long texts."""
+        audio_file, status_message = None, "Failed to generate audio."
+        for _, audio_file, status_message in self.text_to_speech_stream(text, voice, progress=progress,
+                                                                        output_format=output_format,
+                                                                        bitrate_kbps=bitrate_kbps,
+                                                                        revision_key=revision_key,
+                                                                        engine=engine):
+            pass
+        return audio_file, status_message
+    
+    def process_pdf_to_audio_stream(self, pdf_file, voice, progress=None, output_format: Optional[str] = None,
+                                    bitrate_kbps: Optional[float] = None, revision_key: Optional[str] = None,
+                                    engine: Optional[str] = None):
+        """Process a PDF, yielding (chunk audio, final audio file, extracted text, status) as audio becomes available.
+        
+        Extraction, cleaning and chunking run on a background thread while chunks
+        are synthesized, so audio starts arriving after the first pages are parsed
+        and the total time approaches the slower of the two stages. With a
+        revision_key, chunks unchanged since the last PDF converted under that key
+        (an earlier revision of the document) reuse its audio. engine names the TTS
+        engine (the converter's default if None).
+        """
+        try:
+            engine = self.get_engine(engine)
+            engine_error = self.engine_error(engine)
+            if engine_error:
+                yield None, None, "", engine_error
+                return
+            
+            if pdf_file is None:
+                yield None, None, "No PDF file provided.", "No PDF file provided."
+                return
+            
+            if progress is not None:
+                progress(0, desc="Extracting text from PDF...")
+            
+            text_pieces = []
+            extraction_errors = []
+            
+            def extract_text():
+                try:
+                    # Waits here (on the extraction thread) while other conversions hold every extraction slot
+                    with self.extraction_slot():
+                        for text_piece in self.iter_text_from_pdf(pdf_file):
+                            text_pieces.append(text_piece)
+                            yield text_piece
+                except ImportError:
+                    extraction_errors.append("PDF extraction failed. Please install PyMuPDF: pip install PyMuPDF")
+                    raise
+                except Exception as e:
+                    extraction_errors.append(f"Error extracting text from PDF: {str(e)}")
+                    raise
+            
+            chunking = self.chunking_for(revision_key)
+            revision, job = self.open_job_and_revision(revision_key, file_sha256(pdf_file), voice, chunking,
+                                                       engine=engine)
+            trace = self.start_trace(job, source=os.path.basename(str(pdf_file)), voice=voice, engine=engine.name)
+            
+            # The bounded buffer holds extraction back when synthesis falls behind;
+            # stages on the extraction thread report to this conversion's trace
+            text_chunks = BackgroundIterator(
+                metrics.iter_in_trace(trace, self.iter_text_chunks(extract_text(), mode=chunking)),
+                PIPELINE_BUFFERED_CHUNKS, name="extraction")
+            print(f"Streaming PDF text into {engine.label} ({engine.concurrency(self)} chunks at once)...")
+            
+            try:
+                yield None, None, "", "🎙️ Extracting text and synthesizing audio as pages arrive..."
+                for chunk_audio, audio_file, status_message in self.synthesize_to_file_stream(
+                        text_chunks, voice, progress=progress, job=job,
+                        output_format=output_format, bitrate_kbps=bitrate_kbps, trace=trace, revision=revision,
+                        engine=engine):
+                    if chunk_audio is not None:
+                        yield chunk_audio, None, "", status_message
+                        continue
+                    
+                    extracted_text = ' '.join(text_pieces)
+                    if not extracted_text:
+                        yield None, None, "No text found in the PDF file.", "No text found in the PDF file."
+                    else:
+                        if audio_file:
+                            print("🎊 PDF to Audio conversion process completed successfully!")
+                            print("=" * 60)
+                        yield None, audio_file, extracted_text, status_message
+            except Exception:
+                if not extraction_errors:
+                    raise
+                # Audio for part of a document isn't a result; the chunks done so far stay checkpointed
+                yield None, None, ' '.join(text_pieces), extraction_errors[0]
+            finally:
+                text_chunks.close()
+                self.release_job(job)
+                self.release_revision(revision)
+                self.finish_trace(trace)
+            
+        except Exception as e:
+            error_msg = f"Error processing PDF: {str(e)}"
+            yield None, None, "", error_msg
+
+    def process_pdf_to_audio(self, pdf_file, voice, progress=None, output_format: Optional[str] = None,
+                             bitrate_kbps: Optional[float] = None,
+                             revision_key: Optional[str] = None,
+                             engine: Optional[str] = None) -> Tuple[Optional[str], str, str]:
+        """Main function to process PDF file and convert to audio."""
+        audio_file, extracted_text, status_message = None, "", "Error processing PDF."
+        for _, audio_file, extracted_text, status_message in self.process_pdf_to_audio_stream(
+                pdf_file, voice, progress=progress, output_format=output_format, bitrate_kbps=bitrate_kbps,
+                revision_key=revision_key, engine=engine):
+            pass
+        return audio_file, extracted_text, status_message
+
+    def document_title(self, pdf_file) -> str:
+        """Return a PDF's title from its metadata, or its file name without the extension."""
+        try:
+            title = read_outline(pdf_file)["title"].strip()
+        except Exception:
+            title = ""
+        return title or os.path.splitext(os.path.basename(str(pdf_file)))[0]
+
+    def sections_to_speech_stream(self, section_pieces: list, voice: str = "alloy", output_dir: Optional[str] = None,
+                                  title: str = "Audiobook", progress=None, output_format: Optional[str] = None,
+                                  bitrate_kbps: Optional[float] = None, revision_key: Optional[str] = None,
+                                  engine: Optional[str] = None):
+        """Convert section pieces to one audio file per section, yielding (chunk audio, output files, status) as chunks complete.
+        
+        section_pieces are (heading, level, text) tuples, e.g. from extract_sections_from_pdf
+        in a batch worker. The files, an M3U playlist and a JSON chapter table go to
+        output_dir (a new temporary directory if None) and are listed in the last item.
+        """
+        try:
+            if not any(text and text.strip() for _, _, text in section_pieces):
+                yield None, None, "No text provided for conversion."
+                return
+            
+            engine = self.get_engine(engine)
+            engine_error = self.engine_error(engine)
+            if engine_error:
+                yield None, None, engine_error
+                return
+            
+            chunking = self.chunking_for(revision_key)
+            section_chunker = SectionChunker(lambda: new_chunker(chunking))
+            chunk_sections = []
+            text_chunks = list(self.iter_section_chunks(section_pieces, section_chunker, chunk_sections))
+            print(f"Processing {len(text_chunks)} text chunks in {len(section_chunker.sections)} sections with "
+                  f"{engine.label} ({engine.concurrency(self)} at once)...")
+            
+            revision, job = self.open_job_and_revision(revision_key, chunk_hash(json.dumps(section_pieces)), voice,
+                                                       chunking, self.chapter_level, engine)
+            trace = self.start_trace(job, source=title, voice=voice, engine=engine.name,
+                                     characters=sum(len(text) for _, _, text in section_pieces))
+            try:
+                yield from self.synthesize_to_chapters_stream(
+                    text_chunks, chunk_sections, section_chunker.sections, voice,
+                    output_dir or tempfile.mkdtemp(prefix="pdf2audio-chapters-"), title, progress=progress, job=job,
+                    output_format=output_format, bitrate_kbps=bitrate_kbps, trace=trace, revision=revision,
+                    engine=engine)
+            finally:
+                self.release_job(job)
+                self.release_revision(revision)
+                self.finish_trace(trace)
+            
+        except Exception as e:
+            error_msg = f"Error generating audio: {str(e)}"
+            print(error_msg)
+            yield None, None, error_msg
+
+    def sections_to_speech(self, section_pieces: list, voice: str = "alloy", output_dir: Optional[str] = None,
+                           title: str = "Audiobook", progress=None, output_format: Optional[str] = None,
+                           bitrate_kbps: Optional[float] = None,
+                           revision_key: Optional[str] = None,
+                           engine: Optional[str] = None) -> Tuple[Optional[list], str]:
+        """Convert section pieces to chapter audio files. Returns (output files, status)."""
+        output_files, status_message = None, "Failed to generate audio."
+        for _, output_files, status_message in self.sections_to_speech_stream(
+                section_pieces, voice, output_dir=output_dir, title=title, progress=progress,
+                output_format=output_format, bitrate_kbps=bitrate_kbps, revision_key=revision_key, engine=engine):
+            pass
+        return output_files, status_message
+
+    def process_pdf_to_chapters_stream(self, pdf_file, voice, output_dir: Optional[str] = None, progress=None,
+                                       output_format: Optional[str] = None, bitrate_kbps: Optional[float] = None,
+                                       revision_key: Optional[str] = None, engine: Optional[str] = None):
+        """Process a PDF into one audio file per section, yielding (chunk audio, output files, extracted text, status).
+        
+        Sections come from the PDF outline or MinerU's headings (see iter_sections_from_pdf)
+        and stream through chunking and synthesis like process_pdf_to_audio_stream. The
+        chapter files, an M3U playlist and a JSON chapter table with each chapter's sample
+        offset and duration go to output_dir (a new temporary directory if None).
+        """
+        try:
+            engine = self.get_engine(engine)
+            engine_error = self.engine_error(engine)
+            if engine_error:
+                yield None, None, "", engine_error
+                return
+            
+            if pdf_file is None:
+                yield None, None, "No PDF file provided.", "No PDF file provided."
+                return
+            
+            if progress is not None:
+                progress(0, desc="Extracting text from PDF...")
+            
+            text_pieces = []
+            extraction_errors = []
+            
+            def extract_sections():
+                try:
+                    with self.extraction_slot():
+                        for heading, level, text in self.iter_sections_from_pdf(pdf_file):
+                            text_pieces.append(text)
+                            yield heading, level, text
+                except ImportError:
+                    extraction_errors.append("PDF extraction failed. Please install PyMuPDF: pip install PyMuPDF")
+                    raise
+                except Exception as e:
+                    extraction_errors.append(f"Error extracting text from PDF: {str(e)}")
+                    raise
+            
+            chunking = self.chunking_for(revision_key)
+            section_chunker = SectionChunker(lambda: new_chunker(chunking))
+            chunk_sections = []
+            revision, job = self.open_job_and_revision(revision_key, file_sha256(pdf_file), voice, chunking,
+                                                       self.chapter_level, engine)
+            trace = self.start_trace(job, source=os.path.basename(str(pdf_file)), voice=voice, engine=engine.name)
+            
+            text_chunks = BackgroundIterator(
+                metrics.iter_in_trace(trace, self.iter_section_chunks(extract_sections(), section_chunker,
+                                                                      chunk_sections)),
+                PIPELINE_BUFFERED_CHUNKS, name="extraction")
+            print(f"Streaming PDF sections into {engine.label} ({engine.concurrency(self)} chunks at once)...")
+            
+            try:
+                yield None, None, "", "🎙️ Extracting sections and synthesizing audio as pages arrive..."
+                for chunk_audio, output_files, status_message in self.synthesize_to_chapters_stream(
+                        text_chunks, chunk_sections, section_chunker.sections, voice,
+                        output_dir or tempfile.mkdtemp(prefix="pdf2audio-chapters-"), self.document_title(pdf_file),
+                        progress=progress, job=job, output_format=output_format, bitrate_kbps=bitrate_kbps,
+                        trace=trace, revision=revision, engine=engine):
+                    if chunk_audio is not None:
+                        yield chunk_audio, None, "", status_message
+                        continue
+                    
+                    extracted_text = ' '.join(text_pieces)
+                    if not extracted_text:
+                        yield None, None, "No text found in the PDF file.", "No text found in the PDF file."
+                    else:
+                        if output_files:
+                            print("🎊 PDF to Audio conversion process completed successfully!")
+                            print("=" * 60)
+                        yield None, output_files, extracted_text, status_message
+            except Exception:
+                if not extraction_errors:
+                    raise
+                yield None, None, ' '.join(text_pieces), extraction_errors[0]
+            finally:
+                text_chunks.close()
+                self.release_job(job)
+                self.release_revision(revision)
+                self.finish_trace(trace)
+            
+        except Exception as e:
+            error_msg = f"Error processing PDF: {str(e)}"
+            yield None, None, "", error_msg
+
+    def process_pdf_to_chapters(self, pdf_file, voice, output_dir: Optional[str] = None, progress=None,
+                                output_format: Optional[str] = None, bitrate_kbps: Optional[float] = None,
+                                revision_key: Optional[str] = None,
+                                engine: Optional[str] = None) -> Tuple[Optional[list], str, str]:
+        """Process a PDF into chapter audio files. Returns (output files, extracted text, status)."""
+        output_files, extracted_text, status_message = None, "", "Error processing PDF."
+        for _, output_files, extracted_text, status_message in self.process_pdf_to_chapters_stream(
+                pdf_file, voice, output_dir=output_dir, progress=progress, output_format=output_format,
+                bitrate_kbps=bitrate_kbps, revision_key=revision_key, engine=engine):
+            pass
+        return output_files, extracted_text, status_message
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test with local MinerU and OpenAI TTS stand-ins.
+
+Starts two local HTTP servers: a fake MinerU /file_parse that answers with
+synthetic `results -> md_content` markdown for the requested pages, and a
+fake OpenAI-compatible /v1/audio/speech that returns valid audio whose length
+is proportional to its input. Both have configurable latency and failure
+rates. N simulated users then convert PDFs concurrently through the
+converter's PDF pipeline, and the run reports throughput and p50/p95/p99 job
+latency. No API credits or GPU are needed.
+
+Usage:
+    python loadtest.py --users 8 --jobs-per-user 3 --pages 40
+    python loadtest.py --serve-only   # just run the stand-ins, e.g. for the web app
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+import numpy as np
+import soundfile as sf
+
+from benchmark import generate_mineru_markdown, generate_synthetic_pdf
+from rate_limit import DEFAULT_REQUESTS_PER_MINUTE
+
+# Markdown the fake MinerU returns per parsed page
+MARKDOWN_BYTES_PER_PAGE = 3000
+
+# Audio the fake TTS returns per input character, close to OpenAI TTS speaking rate
+SPEECH_SECONDS_PER_CHARACTER = 1 / 15
+SPEECH_SAMPLE_RATE = 24000
+
+# response_format values the fake TTS can encode, as libsndfile (format, subtype)
+SPEECH_FORMATS = {
+    "mp3": ("MP3", "MPEG_LAYER_III"),
+    "opus": ("OGG", "OPUS"),
+    "flac": ("FLAC", "PCM_16"),
+    "wav": ("WAV", "PCM_16"),
+}
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Return the linearly interpolated percentile (fraction in 0..1) of values, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def simulated_delay(base_seconds: float, jitter: float = 0.25) -> float:
+    """Return base_seconds with up to ±jitter relative noise."""
+    return max(0.0, base_seconds * random.uniform(1 - jitter, 1 + jitter))
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real servers
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status: int, body: bytes, content_type: str, headers: Optional[dict] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, payload: dict, headers: Optional[dict] = None):
+        self.send_body(status, json.dumps(payload).encode("utf-8"), "application/json", headers)
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+
+class FakeMinerUHandler(_StandInHandler):
+    """POST /file_parse: synthetic MinerU markdown for the requested page range of the uploaded PDF."""
+
+    def do_GET(self):
+        # Health probes: like FastAPI, a GET on /file_parse is 405, and 503 while the stand-in is failing
+        if random.random() < self.server.config["failure_rate"]:
+            self.send_json(503, {"detail": "Service Unavailable"})
+        else:
+            self.send_json(405, {"detail": "Method Not Allowed"})
+
+    def do_POST(self):
+        config = self.server.config
+        if self.path.split("?")[0] != "/file_parse":
+            self.send_json(404, {"detail": "Not Found"})
+            return
+
+        fields, pdf_bytes = self.parse_form(self.read_body())
+        page_count = self.page_count(pdf_bytes)
+        start_page = int(fields.get("start_page_id", 0))
+        end_page = min(int(fields.get("end_page_id", 99999)), page_count - 1)
+        pages = max(1, end_page - start_page + 1)
+
+        # Parsing time grows with the pages in the request, as on a real MinerU server
+        time.sleep(simulated_delay(config["latency"] + config["latency_per_page"] * pages))
+        if random.random() < config["failure_rate"]:
+            self.send_json(503, {"detail": "Service Unavailable"})
+            return
+
+        markdown = generate_mineru_markdown(pages * MARKDOWN_BYTES_PER_PAGE, seed=start_page)
+        self.send_json(200, {
+            "backend": "pipeline",
+            "version": "loadtest",
+            "results": {"document": {"md_content": f"# Pages {start_page + 1}-{end_page + 1}\n\n{markdown}"}},
+        })
+
+    def parse_form(self, body: bytes):
+        """Return the multipart form fields and the uploaded file's bytes."""
+        header = f"Content-Type: {self.headers.get('Content-Type', '')}\r\n\r\n".encode("latin-1")
+        message = BytesParser(policy=policy.default).parsebytes(header + body)
+        fields = {}
+        file_bytes = b""
+        for part in message.iter_parts():
+            payload = part.get_payload(decode=True) or b""
+            if part.get_filename():
+                file_bytes = payload
+            else:
+                fields[part.get_param("name", header="content-disposition")] = payload.decode("utf-8", "replace")
+        return fields, file_bytes
+
+    def page_count(self, pdf_bytes: bytes) -> int:
+        try:
+            import fitz  # PyMuPDF
+
+            with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+                return max(1, len(doc))
+        except Exception:
+            return 1
+
+
+class FakeSpeechHandler(_StandInHandler):
+    """POST /v1/audio/speech: a tone as long as reading the input aloud would take, in the requested format."""
+
+    def do_POST(self):
+        config = self.server.config
+        if self.path.split("?")[0].rstrip("/") != "/v1/audio/speech":
+            self.send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            return
+        try:
+            request = json.loads(self.read_body())
+            text = request["input"]
+        except (ValueError, KeyError):
+            self.send_json(400, {"error": {"message": "Invalid request body", "type": "invalid_request_error"}})
+            return
+        response_format = request.get("response_format", "mp3")
+        if response_format != "pcm" and response_format not in SPEECH_FORMATS:
+            self.send_json(400, {"error": {"message": f"Unsupported response_format {response_format}",
+                                           "type": "invalid_request_error"}})
+            return
+
+        time.sleep(simulated_delay(config["latency"] + config["latency_per_character"] * len(text)))
+        if random.random() < config["failure_rate"]:
+            # Mostly throttling, like a real account at its limit
+            if random.random() < 0.8:
+                self.send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                               headers={"Retry-After": "0.5"})
+            else:
+                self.send_json(500, {"error": {"message": "Internal server error", "type": "server_error"}})
+            return
+
+        samples = self.speech_samples(len(text))
+        if response_format == "pcm":
+            self.send_body(200, samples.astype("<i2").tobytes(), "audio/pcm")
+            return
+        container, subtype = SPEECH_FORMATS[response_format]
+        buffer = io.BytesIO()
+        sf.write(buffer, samples, SPEECH_SAMPLE_RATE, format=container, subtype=subtype)
+        self.send_body(200, buffer.getvalue(), f"audio/{response_format}")
+
+    def speech_samples(self, characters: int) -> np.ndarray:
+        frames = max(1, int(characters * SPEECH_SECONDS_PER_CHARACTER * SPEECH_SAMPLE_RATE))
+        return (np.sin(np.arange(frames) * (2 * np.pi * 220 / SPEECH_SAMPLE_RATE)) * 8000).astype(np.int16)
+
+
+def start_stand_in(handler_class, port: int = 0, host: str = "127.0.0.1", **config) -> ThreadingHTTPServer:
+    """Serve handler_class on a background thread with the given latency/failure config. Port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), handler_class)
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, name=handler_class.__name__, daemon=True).start()
+    return server
+
+
+def start_fake_mineru(port: int = 0, latency: float = 0.5, latency_per_page: float = 0.05,
+                      failure_rate: float = 0.0) -> ThreadingHTTPServer:
+    """Start the MinerU stand-in; its endpoint is http://127.0.0.1:<port>/file_parse."""
+    return start_stand_in(FakeMinerUHandler, port, latency=latency, latency_per_page=latency_per_page,
+                          failure_rate=failure_rate)
+
+
+def start_fake_openai(port: int = 0, latency: float = 0.3, latency_per_character: float = 0.0002,
+                      failure_rate: float = 0.0) -> ThreadingHTTPServer:
+    """Start the OpenAI TTS stand-in; its base URL is http://127.0.0.1:<port>/v1."""
+    return start_stand_in(FakeSpeechHandler, port, latency=latency, latency_per_character=latency_per_character,
+                          failure_rate=failure_rate)
+
+
+def run_user(converter, user: int, pdfs: List[str], jobs: int, voice: str, results: list, lock: threading.Lock):
+    """Convert jobs PDFs one after another as one user would, recording each job's outcome.
+
+    Like a web app user, the user gets their own session of the shared converter
+    (own API key and client) and enters the key before converting. Every user enters
+    the same key, so they share its TTS rate budget.
+    """
+    session = converter.new_session()
+    key_status = session.set_api_key("sk-loadtest")
+    for job in range(jobs):
+        pdf_file = pdfs[(user + job) % len(pdfs)]
+        start = time.perf_counter()
+        first_audio = None
+        audio_file, status_message = None, "no result"
+        try:
+            if not session.client:
+                # The key was rejected, so every job fails as it would in the app
+                status_message = key_status
+            else:
+                for chunk_audio, audio_file, _, status_message in session.process_pdf_to_audio_stream(pdf_file, voice):
+                    if chunk_audio is not None and first_audio is None:
+                        first_audio = time.perf_counter() - start
+        except Exception as e:
+            status_message = f"{e.__class__.__name__}: {e}"
+        seconds = time.perf_counter() - start
+
+        audio_seconds = 0.0
+        if audio_file:
+            try:
+                audio_seconds = sf.info(audio_file).duration
+                os.unlink(audio_file)
+            except (OSError, RuntimeError):
+                pass
+        record = {"user": user, "job": job, "pdf": os.path.basename(pdf_file), "ok": bool(audio_file),
+                  "seconds": seconds, "first_audio_seconds": first_audio, "audio_seconds": audio_seconds,
+                  "status": status_message}
+        with lock:
+            results.append(record)
+        print(f"{'✅' if audio_file else '❌'} user {user} job {job + 1}/{jobs}: {seconds:.1f}s ({record['pdf']})")
+
+
+def run_load_test(converter, pdfs: List[str], users: int, jobs_per_user: int, voice: str = "alloy") -> dict:
+    """Run users concurrent users through converter and return the latency and throughput report."""
+    results = []
+    lock = threading.Lock()
+    threads = [threading.Thread(target=run_user, args=(converter, user, pdfs, jobs_per_user, voice, results, lock),
+                                name=f"user-{user}")
+               for user in range(users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - start
+
+    succeeded = [record for record in results if record["ok"]]
+    latencies = [record["seconds"] for record in succeeded]
+    first_audio = [record["first_audio_seconds"] for record in succeeded if record["first_audio_seconds"] is not None]
+    audio_seconds = sum(record["audio_seconds"] for record in succeeded)
+    return {
+        "users": users,
+        "jobs": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "wall_seconds": wall_seconds,
+        "jobs_per_minute": len(succeeded) / wall_seconds * 60,
+        "audio_minutes_per_minute": audio_seconds / wall_seconds,
+        "latency_seconds": {name: percentile(latencies, fraction)
+                            for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+        "first_audio_seconds": {name: percentile(first_audio, fraction)
+                                for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+        "mineru_circuits": converter.mineru.circuit_states(),
+        "jobs_detail": sorted(results, key=lambda record: (record["user"], record["job"])),
+    }
+
+
+def format_seconds(value: Optional[float]) -> str:
+    return "n/a" if value is None else f"{value:.2f}s"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the load test from the command line."""
+    parser = argparse.ArgumentParser(description="Load-test PDF to Audio against local MinerU and OpenAI TTS stand-ins.")
+    parser.add_argument("pdfs", nargs="*", help="PDFs to convert (default: generated synthetic PDFs)")
+    parser.add_argument("--users", type=int, default=4, help="Concurrent simulated users")
+    parser.add_argument("--jobs-per-user", type=int, default=2, help="PDFs each user converts, one after another")
+    parser.add_argument("--pages", type=int, default=30, help="Pages per generated PDF")
+    parser.add_argument("--documents", type=int, default=3, help="Distinct PDFs to generate")
+    parser.add_argument("--mineru-latency", type=float, default=0.5, help="Fake MinerU base latency per request (s)")
+    parser.add_argument("--mineru-latency-per-page", type=float, default=0.05, help="Fake MinerU latency per page (s)")
+    parser.add_argument("--mineru-failure-rate", type=float, default=0.0, help="Fraction of MinerU requests answered with 503")
+    parser.add_argument("--tts-latency", type=float, default=0.3, help="Fake TTS base latency per request (s)")
+    parser.add_argument("--tts-latency-per-character", type=float, default=0.0002, help="Fake TTS latency per character (s)")
+    parser.add_argument("--tts-failure-rate", type=float, default=0.0,
+                        help="Fraction of TTS requests answered with 429 (mostly) or 500")
+    parser.add_argument("--tts-concurrency", type=int, default=None, help="TTS requests in flight per conversion")
+    parser.add_argument("--requests-per-minute", type=float, default=DEFAULT_REQUESTS_PER_MINUTE,
+                        help="Converter TTS request budget; 0 for unlimited")
+    parser.add_argument("--cache", action="store_true", help="Keep the extraction and audio caches on (off by default, "
+                                                            "so every job does the full work)")
+    parser.add_argument("--born-digital-fast-path", action="store_true",
+                        help="Read born-digital PDFs locally instead of sending them to the MinerU stand-in")
+    parser.add_argument("--mineru-port", type=int, default=0, help="Port for the MinerU stand-in (default: any free port)")
+    parser.add_argument("--openai-port", type=int, default=0, help="Port for the OpenAI stand-in (default: any free port)")
+    parser.add_argument("--serve-only", action="store_true",
+                        help="Only run the stand-in servers until interrupted, e.g. to point the web app at them")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    mineru = start_fake_mineru(args.mineru_port, args.mineru_latency, args.mineru_latency_per_page,
+                               args.mineru_failure_rate)
+    speech = start_fake_openai(args.openai_port, args.tts_latency, args.tts_latency_per_character,
+                               args.tts_failure_rate)
+    mineru_url = f"http://127.0.0.1:{mineru.server_port}/file_parse"
+    openai_url = f"http://127.0.0.1:{speech.server_port}/v1"
+    print(f"🧪 MinerU stand-in: {mineru_url}")
+    print(f"🧪 OpenAI stand-in: {openai_url}")
+
+    if args.serve_only:
+        print(f"Point the app at them with MINERU_API_URL={mineru_url} OPENAI_BASE_URL={openai_url} "
+              "(any API key is accepted). Press Ctrl+C to stop.")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    # The stand-ins alone don't need the converter
+    from converter import PDFToAudioConverter
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdfs = list(args.pdfs)
+        if not pdfs:
+            for index in range(max(1, args.documents)):
+                pdf_path = os.path.join(temp_dir, f"synthetic-{index + 1}.pdf")
+                generate_synthetic_pdf(pdf_path, args.pages, seed=index)
+                pdfs.append(pdf_path)
+            print(f"📄 Generated {len(pdfs)} synthetic PDFs of {args.pages} pages")
+
+        # One shared converter; each user converts through their own session of it, as in the web app
+        # Synthetic PDFs are born-digital, so they only reach the MinerU stand-in with the fast path off
+        converter_kwargs = {"mineru_urls": [mineru_url], "openai_base_url": openai_url,
+                            "tts_requests_per_minute": args.requests_per_minute or None,
+                            "born_digital_fast_path": args.born_digital_fast_path}
+        if not args.cache:
+            converter_kwargs["cache_dir"] = None
+        if args.tts_concurrency:
+            converter_kwargs["tts_concurrency"] = args.tts_concurrency
+        converter = PDFToAudioConverter(**converter_kwargs)
+
+        print(f"🚀 {args.users} users x {args.jobs_per_user} jobs...")
+        report = run_load_test(converter, pdfs, args.users, args.jobs_per_user)
+
+    mineru.shutdown()
+    speech.shutdown()
+
+    print("=" * 60)
+    print(f"📊 {report['succeeded']}/{report['jobs']} jobs succeeded in {report['wall_seconds']:.1f}s: "
+          f"{report['jobs_per_minute']:.1f} jobs/min, {report['audio_minutes_per_minute']:.1f} minutes of audio per minute")
+    latency = report["latency_seconds"]
+    first_audio = report["first_audio_seconds"]
+    print(f"⏱️ Job latency       p50 {format_seconds(latency['p50'])}  p95 {format_seconds(latency['p95'])}  "
+          f"p99 {format_seconds(latency['p99'])}")
+    print(f"⏱️ First audio after p50 {format_seconds(first_audio['p50'])}  p95 {format_seconds(first_audio['p95'])}  "
+          f"p99 {format_seconds(first_audio['p99'])}")
+    for circuit in report["mineru_circuits"]:
+        print(f"🔌 MinerU circuit {circuit['state']}: tripped {circuit['trips']} times, "
+              f"{circuit['rejections']} requests sent straight to the fallback")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report written to {args.output}")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,375 @@
+"""
+Per-stage timing and throughput metrics for PDF to Audio conversions.
+
+Stages (MinerU requests, PyMuPDF extraction, cleaning, chunking, TTS requests,
+audio assembly, encoding) are timed into process-wide latency histograms and
+character/byte counters, served in the Prometheus text format from a local
+/metrics endpoint. Each conversion can also collect a JobTrace: every stage
+span plus counters for that job alone, written out as JSON when it finishes.
+
+The trace a stage reports to is either passed explicitly or taken from the
+current thread's context; run_in_trace and iter_in_trace carry it into
+worker threads.
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+# Latency buckets in seconds, from a cleaning pass to a long MinerU parse
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+METRIC_PREFIX = "pdf2audio_"
+
+# Port for the /metrics endpoint started by the app, if set
+METRICS_PORT = os.environ.get("PDF2AUDIO_METRICS_PORT")
+
+# Job traces kept on disk; older ones are deleted as new jobs finish
+MAX_TRACE_FILES = 200
+
+_current_trace = contextvars.ContextVar("pdf2audio_trace", default=None)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _format_labels(label_key: tuple, extra: Optional[tuple] = None) -> str:
+    pairs = list(label_key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in pairs) + "}"
+
+
+def _escape_label_value(value) -> str:
+    # Backslash first, so the escapes added for quotes and newlines aren't escaped again
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and histograms keyed by metric name and labels."""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str):
+        """Set the HELP text shown for a metric."""
+        self._help[name] = help_text
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        """Add amount to a counter."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels):
+        """Set a gauge to value."""
+        key = _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        """Record a value in a histogram."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def counter_value(self, name: str, **labels) -> float:
+        """Return a counter's current value."""
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def gauge_value(self, name: str, **labels) -> Optional[float]:
+        """Return a gauge's current value, or None if it was never set."""
+        with self._lock:
+            return self._gauges.get(name, {}).get(_label_key(labels))
+
+    def render_prometheus(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full_name = METRIC_PREFIX + name
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{full_name}{_format_labels(key)} {_format_value(value)}")
+            for name, series in sorted(self._gauges.items()):
+                full_name = METRIC_PREFIX + name
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} gauge")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{full_name}{_format_labels(key)} {_format_value(value)}")
+            for name, series in sorted(self._histograms.items()):
+                full_name = METRIC_PREFIX + name
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} histogram")
+                for key, histogram in sorted(series.items()):
+                    for bound, bucket_count in zip(self.buckets, histogram["buckets"]):
+                        lines.append(f"{full_name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {bucket_count}")
+                    lines.append(f"{full_name}_bucket{_format_labels(key, ('le', '+Inf'))} {histogram['count']}")
+                    lines.append(f"{full_name}_sum{_format_labels(key)} {_format_value(histogram['sum'])}")
+                    lines.append(f"{full_name}_count{_format_labels(key)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe("stage_seconds", "Time spent in each conversion stage")
+REGISTRY.describe("stage_characters_total", "Characters processed by each stage")
+REGISTRY.describe("stage_bytes_total", "Bytes processed by each stage")
+REGISTRY.describe("chunks_total", "TTS chunks produced")
+REGISTRY.describe("extractions_total", "PDF extractions by the method that produced the text")
+REGISTRY.describe("extraction_fallbacks_total", "Extractions (or MinerU shards) that fell back to PyMuPDF, by reason")
+REGISTRY.describe("extraction_routes_total", "PDFs classified as born-digital (local) or needing MinerU")
+REGISTRY.describe("revision_chunks_reused_total", "Chunks whose audio was reused from the previous revision of a document")
+REGISTRY.describe("chapters_total", "Chapter audio files written by chapter-split conversions")
+REGISTRY.describe("circuit_state", "Circuit breaker state per endpoint (0 closed, 1 half-open, 2 open)")
+REGISTRY.describe("circuit_trips_total", "Times a circuit breaker opened")
+REGISTRY.describe("circuit_rejections_total", "Calls refused because their circuit breaker was open")
+REGISTRY.describe("tts_requests_total", "TTS chunk lookups by cache result and engine")
+REGISTRY.describe("tts_errors_total", "TTS requests that failed, by error type and engine")
+REGISTRY.describe("tts_retries_total", "TTS requests retried after a transient failure or throttling")
+
+
+class JobTrace:
+    """Spans and counters recorded for one conversion."""
+
+    def __init__(self, job_id: Optional[str] = None, **attributes):
+        self.job_id = job_id or uuid.uuid4().hex[:12]
+        self.attributes = attributes
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, stage: str, start: float, seconds: float, attributes: dict):
+        """Record a stage that started at start (perf_counter time) and took seconds."""
+        span = {"stage": stage, "start": round(start - self._start, 6), "seconds": round(seconds, 6)}
+        span.update(attributes)
+        with self._lock:
+            self.spans.append(span)
+
+    def count(self, name: str, amount: float = 1):
+        """Add amount to one of this job's counters."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def stage_totals(self) -> dict:
+        """Return span count, total and maximum seconds per stage."""
+        totals = {}
+        with self._lock:
+            for span in self.spans:
+                total = totals.setdefault(span["stage"], {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+                total["count"] += 1
+                total["seconds"] += span["seconds"]
+                total["max_seconds"] = max(total["max_seconds"], span["seconds"])
+        return totals
+
+    def to_dict(self) -> dict:
+        """Return the trace as JSON-serializable data."""
+        stages = self.stage_totals()
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "attributes": self.attributes,
+                "started_at": self.started_at,
+                "duration_seconds": time.perf_counter() - self._start,
+                "stages": stages,
+                "counters": dict(self.counters),
+                "spans": list(self.spans),
+            }
+
+    def summary(self) -> str:
+        """Return a one-line summary of where the time went."""
+        stages = self.stage_totals()
+        if not stages:
+            return "no stages recorded"
+        ordered = sorted(stages.items(), key=lambda item: item[1]["seconds"], reverse=True)
+        parts = [f"{stage} {total['seconds']:.1f}s/{total['count']}" for stage, total in ordered]
+        return ", ".join(parts)
+
+    def write(self, directory: str, keep: int = MAX_TRACE_FILES) -> Optional[str]:
+        """Write the trace to directory/<job id>.json, keeping the newest keep traces. Returns the path, or None on failure."""
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{self.job_id}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, indent=1, ensure_ascii=False)
+            prune_traces(directory, keep)
+            return path
+        except OSError as e:
+            print(f"⚠️ Could not write job trace: {e}")
+            return None
+
+
+def prune_traces(directory: str, keep: int = MAX_TRACE_FILES):
+    """Delete all but the newest keep trace files in directory."""
+    try:
+        traces = [entry for entry in os.scandir(directory) if entry.name.endswith(".json")]
+    except OSError:
+        return
+    if len(traces) <= keep:
+        return
+
+    def modified(entry):
+        try:
+            return entry.stat().st_mtime
+        except OSError:
+            return 0
+
+    traces.sort(key=modified, reverse=True)
+    for entry in traces[keep:]:
+        try:
+            os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+def current_trace() -> Optional[JobTrace]:
+    """Return the trace stages in this thread report to, if any."""
+    return _current_trace.get()
+
+
+def run_in_trace(trace: Optional[JobTrace], func, *args, **kwargs):
+    """Call func with trace as the current trace (e.g. as a thread pool task)."""
+    token = _current_trace.set(trace)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _current_trace.reset(token)
+
+
+def iter_in_trace(trace: Optional[JobTrace], iterable):
+    """Iterate over iterable with trace as the current trace, for iterators consumed on one thread."""
+    token = _current_trace.set(trace)
+    try:
+        yield from iterable
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def stage(name: str, trace: Optional[JobTrace] = None, **attributes):
+    """Time a stage into the latency histogram and the job trace.
+
+    Yields a dict of span attributes; set "characters" or "bytes" in it to count
+    the work done, and any other key to annotate the trace span.
+    """
+    span = dict(attributes)
+    start = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        span["error"] = e.__class__.__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        record_stage(name, seconds, trace=trace, start=start, **span)
+
+
+def record_stage(name: str, seconds: float, trace: Optional[JobTrace] = None, start: Optional[float] = None,
+                 **attributes):
+    """Record a stage that was timed by the caller."""
+    REGISTRY.observe("stage_seconds", seconds, stage=name)
+    characters = attributes.get("characters")
+    if characters:
+        REGISTRY.inc("stage_characters_total", characters, stage=name)
+    nbytes = attributes.get("bytes")
+    if nbytes:
+        REGISTRY.inc("stage_bytes_total", nbytes, stage=name)
+
+    trace = trace or _current_trace.get()
+    if trace is not None:
+        trace.add_span(name, start if start is not None else time.perf_counter() - seconds, seconds, attributes)
+
+
+def iter_timed(name: str, iterable, trace: Optional[JobTrace] = None, **attributes):
+    """Yield from iterable, recording the time spent producing items (not consuming them) as one stage."""
+    iterator = iter(iterable)
+    first_start = time.perf_counter()
+    busy = 0.0
+    items = 0
+    characters = 0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                busy += time.perf_counter() - start
+            items += 1
+            if isinstance(item, str):
+                characters += len(item)
+            yield item
+    finally:
+        record_stage(name, busy, trace=trace, start=first_start, items=items, characters=characters, **attributes)
+
+
+def count(name: str, amount: float = 1, trace: Optional[JobTrace] = None, **labels):
+    """Increment a counter, and the matching counter of the current job trace."""
+    REGISTRY.inc(name, amount, **labels)
+    trace = trace or _current_trace.get()
+    if trace is not None:
+        suffix = ",".join(f"{key}={value}" for key, value in sorted(labels.items()))
+        trace.count(f"{name}{{{suffix}}}" if suffix else name, amount)
+
+
+def set_gauge(name: str, value: float, **labels):
+    """Set a process-wide gauge, such as a circuit breaker's state."""
+    REGISTRY.set(name, value, **labels)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would drown the conversion logs
+        pass
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics on a background thread and return the server."""
+    server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    print(f"📈 Metrics available at http://{host}:{server.server_port}/metrics")
+    return server
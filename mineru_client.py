@@ -0,0 +1,259 @@
+"""
+HTTP client for the MinerU /file_parse API.
+
+All requests share one keep-alive connection pool. Large documents can be
+parsed in fixed-size page windows ("shards") that run concurrently across one
+or more MinerU endpoints and are returned in page order. Each endpoint has a
+circuit breaker: after repeated failures (a timed-out request counts double)
+it is skipped, and requests fail fast with CircuitOpenError, until a health
+probe sees it answering again.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+# MinerU endpoints; set MINERU_API_URL to a comma-separated list to spread shards over several servers
+MINERU_API_URLS = [
+    url.strip()
+    for url in os.environ.get("MINERU_API_URL", "http://localhost:8000/file_parse").split(",")
+    if url.strip()
+]
+
+MINERU_PARSE_OPTIONS = {
+    'return_middle_json': 'false',
+    'return_model_output': 'false',
+    'return_md': 'true',
+    'return_images': 'false',
+    'end_page_id': '99999',
+    'parse_method': 'auto',
+    'start_page_id': '0',
+    'lang_list': 'ch',
+    'output_dir': '',
+    'server_url': 'string',
+    'return_content_list': 'false',
+    'backend': 'pipeline',
+    'table_enable': 'true',
+    'formula_enable': 'true',
+}
+
+# Pages per shard; documents this size or smaller are sent in one request
+DEFAULT_SHARD_PAGES = 20
+# Shards in flight per endpoint
+DEFAULT_SHARDS_PER_ENDPOINT = 2
+
+# (connect, read) timeouts in seconds. MinerU only answers once parsing is
+# done, so the read timeout bounds the parse time of a request.
+MINERU_TIMEOUT = (10, 900)
+MINERU_SHARD_TIMEOUT = (10, 300)
+
+# Retries after the first attempt, with exponential backoff between them. A whole-document
+# parse that runs into its read timeout is not retried, since another 900 s wait on a
+# hung server would only hold the conversion longer; shards retry every failure
+DEFAULT_RETRIES = 2
+RETRY_BACKOFF_SECONDS = 1.0
+
+# Consecutive failed attempts (connection errors, 5xx) that open an endpoint's circuit breaker;
+# a read timeout counts as two, so one slow parse alone doesn't send everyone to the fallback
+MINERU_FAILURE_THRESHOLD = 3
+# Health probes of an open endpoint: seconds between probes, and (connect, read) timeouts
+MINERU_PROBE_INTERVAL = 5.0
+MINERU_PROBE_TIMEOUT = (2, 5)
+
+# Keep-alive connections kept per MinerU host. Requests beyond this still go
+# ahead, on a new connection that is closed once its answer is read
+MINERU_POOL_CONNECTIONS = 32
+
+_session = None
+_session_lock = threading.Lock()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class MinerUError(Exception):
+    """Raised when MinerU answers with an error status."""
+
+    def __init__(self, status_code: int, message: str = ""):
+        super().__init__(f"MinerU API error: {status_code} {message}".strip())
+        self.status_code = status_code
+
+
+def get_http_session() -> requests.Session:
+    """Return the process-wide keep-alive session used for MinerU requests."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=MINERU_POOL_CONNECTIONS)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({'accept': 'application/json'})
+            _session = session
+        return _session
+
+
+def probe_endpoint(url: str) -> bool:
+    """Return True if a MinerU server answers at url.
+    
+    Any HTTP answer other than a gateway or unavailable error counts (a GET on
+    /file_parse is usually 405), since it shows the server is up and responsive.
+    """
+    try:
+        response = get_http_session().get(url, timeout=MINERU_PROBE_TIMEOUT)
+    except requests.exceptions.RequestException:
+        return False
+    return response.status_code not in (502, 503, 504)
+
+
+def get_circuit_breaker(url: str) -> CircuitBreaker:
+    """Return the process-wide circuit breaker for a MinerU endpoint, shared by every client."""
+    with _breakers_lock:
+        breaker = _breakers.get(url)
+        if breaker is None:
+            breaker = _breakers[url] = CircuitBreaker(url, failure_threshold=MINERU_FAILURE_THRESHOLD,
+                                                      probe=lambda: probe_endpoint(url),
+                                                      probe_interval=MINERU_PROBE_INTERVAL)
+        return breaker
+
+
+class MinerUClient:
+    """Client for one or more MinerU endpoints with timeouts, retries and page sharding."""
+
+    def __init__(self, urls: Optional[List[str]] = None, shard_pages: int = DEFAULT_SHARD_PAGES,
+                 max_concurrent_shards: Optional[int] = None, retries: int = DEFAULT_RETRIES):
+        self.urls = list(urls or MINERU_API_URLS)
+        self.shard_pages = max(1, int(shard_pages))
+        self.max_concurrent_shards = max_concurrent_shards or DEFAULT_SHARDS_PER_ENDPOINT * len(self.urls)
+        self.retries = max(0, int(retries))
+        self.session = get_http_session()
+        self.breakers = [get_circuit_breaker(url) for url in self.urls]
+
+    def available(self) -> bool:
+        """False while every endpoint's circuit breaker is open, so callers can skip MinerU entirely."""
+        return any(not breaker.is_open() for breaker in self.breakers)
+
+    def circuit_states(self) -> list:
+        """Return the circuit breaker state and counts of each endpoint."""
+        return [breaker.snapshot() for breaker in self.breakers]
+
+    def acquire_endpoint(self, index: int):
+        """Return (url, breaker) for the first endpoint from index on whose breaker allows a request."""
+        for offset in range(len(self.urls)):
+            position = (index + offset) % len(self.urls)
+            if self.breakers[position].allow_request():
+                return self.urls[position], self.breakers[position]
+        raise CircuitOpenError("MinerU")
+
+    def form_data(self, start_page: int = 0, end_page: Optional[int] = None) -> dict:
+        """Return the parse settings for a page range (end_page is inclusive, None means the last page)."""
+        data = dict(MINERU_PARSE_OPTIONS)
+        data['start_page_id'] = str(start_page)
+        if end_page is not None:
+            data['end_page_id'] = str(end_page)
+        return data
+
+    def parse(self, pdf_file, start_page: int = 0, end_page: Optional[int] = None,
+              timeout=MINERU_TIMEOUT, endpoint_index: int = 0,
+              retry_read_timeouts: bool = False) -> Union[dict, str]:
+        """Parse a page range of a PDF, retrying transient failures on the next endpoint.
+
+        Connection errors and 5xx answers are retried; read timeouts only with
+        retry_read_timeouts (used for shards, whose timeout is short). Returns the
+        decoded JSON response, or the raw body if it isn't JSON. Raises
+        CircuitOpenError without sending anything once every endpoint's breaker is open.
+        """
+        data = self.form_data(start_page, end_page)
+        last_error = None
+
+        with metrics.stage("mineru_request", start_page=start_page, end_page=end_page) as span:
+            for attempt in range(self.retries + 1):
+                span["attempts"] = attempt + 1
+                if attempt:
+                    time.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+                try:
+                    url, breaker = self.acquire_endpoint(endpoint_index + attempt)
+                except CircuitOpenError:
+                    span["circuit_open"] = True
+                    raise
+                try:
+                    with open(pdf_file, 'rb') as f:
+                        files = {
+                            'files': (os.path.basename(pdf_file), f, 'application/pdf'),
+                        }
+                        response = self.session.post(url, data=data, files=files, timeout=timeout)
+                except requests.exceptions.ReadTimeout as e:
+                    # A server that accepted the request but doesn't answer may be hung
+                    breaker.record_timeout()
+                    last_error = e
+                    print(f"⚠️ MinerU request for pages {start_page}-{end_page} timed out, attempt {attempt + 1}/{self.retries + 1}")
+                    if not retry_read_timeouts:
+                        raise
+                    continue
+                except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                    breaker.record_failure()
+                    last_error = e
+                    print(f"⚠️ MinerU request for pages {start_page}-{end_page} failed ({e.__class__.__name__}), attempt {attempt + 1}/{self.retries + 1}")
+                    continue
+                except requests.exceptions.RequestException:
+                    breaker.record_failure()
+                    raise
+                except BaseException:
+                    # Never reached the server (e.g. the PDF couldn't be read), but the breaker must hear back
+                    breaker.release()
+                    raise
+
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                    last_error = MinerUError(response.status_code)
+                    print(f"⚠️ MinerU returned {response.status_code} for pages {start_page}-{end_page}, attempt {attempt + 1}/{self.retries + 1}")
+                    continue
+                breaker.record_success()
+                if response.status_code != 200:
+                    # Client errors won't succeed on retry
+                    raise MinerUError(response.status_code)
+
+                span["bytes"] = len(response.content)
+                try:
+                    return response.json()
+                except ValueError:
+                    return response.text
+
+            raise last_error
+
+    def shard_ranges(self, page_count: int) -> list:
+        """Split a document into (start_page, end_page) windows, end inclusive."""
+        return [(start, min(start + self.shard_pages, page_count) - 1)
+                for start in range(0, page_count, self.shard_pages)]
+
+    def iter_shards(self, pdf_file, page_count: int):
+        """Parse shards concurrently and yield (start_page, end_page, result or exception) in page order."""
+        return self.iter_ranges(pdf_file, self.shard_ranges(page_count))
+
+    def iter_ranges(self, pdf_file, ranges: list):
+        """Parse (start_page, end_page) ranges, end inclusive, concurrently and yield (start_page, end_page, result or exception) in order."""
+        trace = metrics.current_trace()
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrent_shards, len(ranges)),
+                                thread_name_prefix="mineru") as executor:
+            futures = [
+                # Shard requests report to the trace of the job that started them
+                executor.submit(metrics.run_in_trace, trace, self.parse, pdf_file, start, end,
+                                MINERU_SHARD_TIMEOUT, index, True)
+                for index, (start, end) in enumerate(ranges)
+            ]
+            try:
+                for (start, end), future in zip(ranges, futures):
+                    try:
+                        yield start, end, future.result()
+                    except Exception as e:
+                        yield start, end, e
+            finally:
+                for future in futures:
+                    future.cancel()
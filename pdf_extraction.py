@@ -0,0 +1,236 @@
+"""
+PyMuPDF extraction helpers: page extraction that runs in worker processes, the
+born-digital check that decides whether a PDF needs MinerU at all, and the
+outline that chapter output is split by.
+
+This module is imported by spawned pool workers, so it must stay free of heavy
+imports such as gradio or openai.
+"""
+
+import multiprocessing
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Documents with fewer pages are extracted serially, since pool startup would dominate
+PARALLEL_FALLBACK_MIN_PAGES = 64
+PARALLEL_FALLBACK_MIN_PAGES_PER_TASK = 8
+
+# Born-digital classification: pages sampled, and the limits a document must stay within
+# for its text layer to be read locally instead of being sent to MinerU
+CLASSIFY_SAMPLE_PAGES = 8
+MIN_TEXT_CHARACTERS_PER_PAGE = 200
+SCANNED_PAGE_MAX_CHARACTERS = 20
+MAX_SCANNED_PAGE_RATIO = 0.1
+MAX_IMAGE_COVERAGE = 0.3
+MAX_MATH_CHARACTER_RATIO = 0.01
+MAX_TABLE_PAGE_RATIO = 0.25
+
+# Layout extraction: share of the page height treated as header/footer margin
+LAYOUT_MARGIN_RATIO = 0.08
+# Margin blocks with more lines than this are body text that starts or ends near the edge
+LAYOUT_MARGIN_MAX_LINES = 2
+# Blocks wider than this share of the page span both columns
+LAYOUT_FULL_WIDTH_RATIO = 0.6
+
+ROUTE_LOCAL = "local"
+ROUTE_MINERU = "mineru"
+
+# Fonts that typeset formulas (TeX math and symbol fonts) and characters that only appear in them
+_MATH_FONT = re.compile(r'cmmi|cmsy|cmex|msbm|msam|math|stix|euler|rsfs', re.IGNORECASE)
+_MATH_CHARACTER = re.compile('[\u0391-\u03c9\u2200-\u22ff\u27c0-\u27ef\u2a00-\u2aff\U0001d400-\U0001d7ff]')
+_DIGIT = re.compile(r'\d')
+
+# Process pools by worker count, so converters configured with different sizes each get theirs
+_extraction_pools = {}
+_extraction_pool_lock = threading.Lock()
+
+
+def get_extraction_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Return the shared process pool used for CPU-bound extraction, with max_workers workers, creating it on first use."""
+    with _extraction_pool_lock:
+        pool = _extraction_pools.get(max_workers)
+        if pool is None:
+            # Spawned workers don't inherit the web server's threads and locks
+            pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+            _extraction_pools[max_workers] = pool
+        return pool
+
+
+def extract_page_range_text(pdf_file: str, start: int, end: int) -> list:
+    """Extract the text of pages [start, end) of a PDF; runs in a worker process."""
+    import fitz  # PyMuPDF
+
+    with fitz.open(pdf_file) as doc:
+        return [doc.load_page(page_num).get_text() for page_num in range(start, end)]
+
+
+def read_outline(pdf_file: str) -> dict:
+    """Return a PDF's page count, title (from its metadata, may be empty) and outline entries (level, title, 1-based page)."""
+    import fitz  # PyMuPDF
+
+    with fitz.open(pdf_file) as doc:
+        return {
+            "pages": len(doc),
+            "title": (doc.metadata or {}).get("title") or "",
+            "outline": [(level, title, page) for level, title, page in doc.get_toc(simple=True)],
+        }
+
+
+def sample_page_numbers(page_count: int, samples: int = CLASSIFY_SAMPLE_PAGES) -> list:
+    """Return up to `samples` page numbers spread evenly across a document."""
+    if page_count <= samples:
+        return list(range(page_count))
+    step = page_count / samples
+    return sorted({int(step * i + step / 2) for i in range(samples)})
+
+
+def classify_pdf(pdf_file: str, samples: int = CLASSIFY_SAMPLE_PAGES) -> dict:
+    """Decide from a few sampled pages whether a PDF's text layer can be read locally.
+    
+    Measures text-layer density, image coverage, formula and table likelihood, and
+    returns them with the route: ROUTE_LOCAL for clean born-digital text, or
+    ROUTE_MINERU with the reasons the document needs MinerU's layout models.
+    """
+    import fitz  # PyMuPDF
+
+    with fitz.open(pdf_file) as doc:
+        page_count = len(doc)
+        page_numbers = sample_page_numbers(page_count, samples)
+        text_characters = 0
+        scanned_pages = 0
+        image_coverage = 0.0
+        math_characters = 0
+        table_pages = 0
+        for page_num in page_numbers:
+            page = doc.load_page(page_num)
+            page_area = abs(page.rect) or 1.0
+            text_blocks = [block for block in page.get_text("dict")["blocks"] if block.get("type") == 0]
+            
+            page_characters = 0
+            for block in text_blocks:
+                for line in block["lines"]:
+                    for span in line["spans"]:
+                        span_text = span["text"].strip()
+                        page_characters += len(span_text)
+                        if _MATH_FONT.search(span["font"]):
+                            math_characters += len(span_text)
+                        else:
+                            math_characters += len(_MATH_CHARACTER.findall(span_text))
+            text_characters += page_characters
+            if page_characters <= SCANNED_PAGE_MAX_CHARACTERS:
+                scanned_pages += 1
+            
+            covered = sum(abs(fitz.Rect(image["bbox"]) & page.rect) for image in page.get_image_info())
+            image_coverage += min(1.0, covered / page_area)
+            
+            if _looks_tabular(page, text_blocks):
+                table_pages += 1
+    
+    sampled = max(1, len(page_numbers))
+    stats = {
+        "pages": page_count,
+        "sampled_pages": len(page_numbers),
+        "text_characters_per_page": text_characters / sampled,
+        "scanned_page_ratio": scanned_pages / sampled,
+        "image_coverage": image_coverage / sampled,
+        "math_character_ratio": math_characters / max(1, text_characters),
+        "table_page_ratio": table_pages / sampled,
+    }
+    
+    reasons = []
+    if stats["text_characters_per_page"] < MIN_TEXT_CHARACTERS_PER_PAGE:
+        reasons.append("sparse text layer")
+    if stats["scanned_page_ratio"] > MAX_SCANNED_PAGE_RATIO:
+        reasons.append("scanned pages")
+    if stats["image_coverage"] > MAX_IMAGE_COVERAGE:
+        reasons.append("image-heavy")
+    if stats["math_character_ratio"] > MAX_MATH_CHARACTER_RATIO:
+        reasons.append("formulas")
+    if stats["table_page_ratio"] > MAX_TABLE_PAGE_RATIO:
+        reasons.append("tables")
+    
+    stats["route"] = ROUTE_MINERU if reasons else ROUTE_LOCAL
+    stats["reasons"] = reasons
+    return stats
+
+
+def _looks_tabular(page, text_blocks: list) -> bool:
+    """Whether a page likely holds a table: a grid of ruling lines, or a block of short numeric lines."""
+    rules = 0
+    for drawing in page.get_drawings():
+        for item in drawing["items"]:
+            if item[0] == "l" and (abs(item[1].x - item[2].x) < 1 or abs(item[1].y - item[2].y) < 1):
+                rules += 1
+            elif item[0] == "re" and min(item[1].width, item[1].height) < 2:
+                rules += 1
+    if rules >= 8:
+        return True
+    
+    for block in text_blocks:
+        lines = ["".join(span["text"] for span in line["spans"]).strip() for line in block["lines"]]
+        lines = [line for line in lines if line]
+        if len(lines) < 4:
+            continue
+        short_numeric = sum(1 for line in lines
+                            if len(line) < 20 and len(_DIGIT.findall(line)) > len(line) * 0.3)
+        if short_numeric >= len(lines) * 0.6:
+            return True
+    return False
+
+
+def extract_page_range_layout_text(pdf_file: str, start: int, end: int) -> list:
+    """Extract pages [start, end) of a PDF from their text blocks, in reading order; runs in a worker process.
+    
+    Short blocks in the top and bottom margins (running heads, page numbers) are
+    dropped by position, and two-column pages are read one column at a time.
+    """
+    import fitz  # PyMuPDF
+
+    pages_text = []
+    with fitz.open(pdf_file) as doc:
+        for page_num in range(start, end):
+            page = doc.load_page(page_num)
+            width, height = page.rect.width, page.rect.height
+            top, bottom = height * LAYOUT_MARGIN_RATIO, height * (1 - LAYOUT_MARGIN_RATIO)
+            
+            blocks = []
+            for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks"):
+                # Image blocks carry no text
+                if block_type != 0 or not text.strip():
+                    continue
+                in_margin = y1 <= top or y0 >= bottom
+                if in_margin and text.strip().count("\n") < LAYOUT_MARGIN_MAX_LINES:
+                    continue
+                blocks.append((x0, y0, x1, text))
+            
+            pages_text.append("\n".join(text for _, _, _, text in _reading_order(blocks, width)))
+    return pages_text
+
+
+def _reading_order(blocks: list, page_width: float) -> list:
+    """Order (x0, y0, x1, text) blocks for reading: top to bottom, left column before right.
+    
+    Full-width blocks (titles, single-column text) separate the page into bands; the
+    narrow blocks of each band are read left column first, then right column.
+    """
+    ordered = []
+    left, right = [], []
+    
+    def flush_band():
+        ordered.extend(sorted(left, key=lambda block: block[1]))
+        ordered.extend(sorted(right, key=lambda block: block[1]))
+        left.clear()
+        right.clear()
+    
+    for block in sorted(blocks, key=lambda block: (block[1], block[0])):
+        x0, _, x1, _ = block
+        if x1 - x0 > page_width * LAYOUT_FULL_WIDTH_RATIO:
+            flush_band()
+            ordered.append(block)
+        elif x0 < page_width / 2:
+            left.append(block)
+        else:
+            right.append(block)
+    flush_band()
+    return ordered
@@ -0,0 +1,77 @@
+"""
+Background stages for the PDF to Audio streaming pipeline.
+
+A stage runs an iterator (e.g. extraction, cleaning and chunking) on its own
+thread and hands items to the consumer (synthesis) through a bounded queue,
+so both sides work at the same time and a slow consumer holds the producer
+back instead of letting results pile up.
+"""
+
+import queue
+import threading
+from typing import Iterable
+
+# How long a blocked producer waits before checking whether the consumer went away
+_PUT_POLL_SECONDS = 0.1
+
+_DONE = object()
+
+
+class BackgroundIterator:
+    """Iterate over iterable on a background thread, running at most max_buffered items ahead.
+
+    Exceptions raised by the producer are re-raised to the consumer. close()
+    stops the producer at its next item.
+    """
+
+    def __init__(self, iterable: Iterable, max_buffered: int, name: str = "pipeline-stage"):
+        self._queue = queue.Queue(maxsize=max(1, max_buffered))
+        self._stopped = threading.Event()
+        self._finished = False
+        self._thread = threading.Thread(target=self._run, args=(iterable,), name=name, daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        # Block while the buffer is full, but give up once the consumer has closed the stage
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=_PUT_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self, iterable: Iterable):
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not self._put((item, None)):
+                    break
+            else:
+                self._put((_DONE, None))
+        except BaseException as e:
+            self._put((_DONE, e))
+        finally:
+            # Let generators run their cleanup on this thread
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._finished:
+            raise StopIteration
+        item, error = self._queue.get()
+        if item is _DONE:
+            self._finished = True
+            if error is not None:
+                raise error
+            raise StopIteration
+        return item
+
+    def close(self):
+        """Stop the producer and drop anything it had buffered."""
+        self._finished = True
+        self._stopped.set()
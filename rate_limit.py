@@ -0,0 +1,217 @@
+"""
+Client-side rate limiting and retry scheduling for OpenAI TTS requests.
+
+Requests pass through two token buckets (requests per minute and characters
+per minute) and an adaptive concurrency limit that halves on throttling and
+grows back on success. Throttled and transient failures are retried with
+jittered exponential backoff, honoring Retry-After when the server sends it.
+"""
+
+import email.utils
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+import metrics
+
+# Default budgets; set these to your account's limits to run right at them
+DEFAULT_REQUESTS_PER_MINUTE = 100
+DEFAULT_CHARACTERS_PER_MINUTE = None  # Unlimited
+
+DEFAULT_MAX_RETRIES = 6
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+# HTTP statuses worth retrying: timeouts, conflicts, throttling and server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_minute."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        # A full bucket allows a burst of one minute's budget at most
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_second)
+        self.updated = now
+
+    def acquire(self, amount: float = 1) -> float:
+        """Take amount tokens, blocking until they are available. Returns the time waited."""
+        # Requests larger than the bucket wait for a full bucket and leave it in debt
+        needed = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= needed:
+                    self.tokens -= amount
+                    return waited
+                delay = (needed - self.tokens) / self.rate_per_second
+            time.sleep(delay)
+            waited += delay
+
+
+class AdaptiveConcurrencyLimit:
+    """Concurrency limit that halves on throttling and grows by one after a window of successes."""
+
+    def __init__(self, max_limit: int):
+        self.max_limit = max(1, int(max_limit))
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        with self._condition:
+            self._successes += 1
+            if self.limit < self.max_limit and self._successes >= self.limit:
+                self.limit += 1
+                self._successes = 0
+                self._condition.notify_all()
+
+    def on_throttle(self):
+        with self._condition:
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Return the delay requested by a Retry-After header on the error's response, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        # HTTP-date form
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """True for HTTP 429 responses."""
+    return getattr(error, "status_code", None) == 429
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """True for throttling, server errors, timeouts and connection failures."""
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+
+    import openai
+
+    return isinstance(error, (openai.APIConnectionError, ConnectionError, TimeoutError))
+
+
+class TTSRateLimiter:
+    """Schedules TTS requests within request and character budgets, retrying transient failures."""
+
+    def __init__(self, requests_per_minute: Optional[float] = DEFAULT_REQUESTS_PER_MINUTE,
+                 characters_per_minute: Optional[float] = DEFAULT_CHARACTERS_PER_MINUTE,
+                 max_concurrency: int = 4, max_retries: int = DEFAULT_MAX_RETRIES):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.character_bucket = TokenBucket(characters_per_minute) if characters_per_minute else None
+        self.concurrency = AdaptiveConcurrencyLimit(max_concurrency)
+        self.max_retries = max_retries
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def backoff_delay(self, attempt: int, error: Exception) -> float:
+        """Delay before retry number attempt (1-based): Retry-After if given, else jittered exponential backoff."""
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, BACKOFF_MAX_SECONDS)
+        # Full jitter keeps concurrent workers from retrying in lockstep
+        return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+    def call(self, request: Callable, characters: int = 0):
+        """Run request() within the budgets, retrying throttled and transient failures.
+
+        Raises the last error once retries are exhausted or if it isn't retryable.
+        """
+        attempt = 0
+        while True:
+            if self.request_bucket:
+                self.request_bucket.acquire(1)
+            if self.character_bucket and characters:
+                self.character_bucket.acquire(characters)
+
+            self.concurrency.acquire()
+            self._count("requests")
+            try:
+                result = request()
+            except Exception as e:
+                if is_throttling_error(e):
+                    self._count("throttled")
+                    self.concurrency.on_throttle()
+                if attempt >= self.max_retries or not is_retryable_error(e):
+                    self._count("failures")
+                    raise
+                error = e
+            else:
+                self.concurrency.on_success()
+                return result
+            finally:
+                self.concurrency.release()
+
+            attempt += 1
+            self._count("retries")
+            metrics.count("tts_retries_total", reason="throttled" if is_throttling_error(error) else "error")
+            delay = self.backoff_delay(attempt, error)
+            print(f"⏳ TTS request failed ({error.__class__.__name__}), retry {attempt}/{self.max_retries} in {delay:.1f}s "
+                  f"(concurrency limit {self.concurrency.limit})")
+            time.sleep(delay)
+
+    def stats(self) -> dict:
+        """Return request, retry and throttling counters."""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "failures": self.failures,
+                "concurrency_limit": self.concurrency.limit,
+            }
@@ -0,0 +1,84 @@
+"""
+Tests for output encoding: streaming encoders round-trip every available
+format, and their worker processes don't load the web UI.
+"""
+
+import os
+import subprocess
+import sys
+import textwrap
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from audio_encoding import StreamingEncoder, available_output_formats, output_path_for
+
+SAMPLE_RATE = 24000
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def speech_like(seconds: float) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (np.sin(2 * np.pi * 220 * t) * 8000).astype("<i2")
+
+
+@pytest.mark.parametrize("output_format", available_output_formats())
+def test_streaming_encoder_round_trips(tmp_path, output_format):
+    samples = speech_like(1.5)
+    output_path = output_path_for(str(tmp_path / "out.wav"), output_format)
+
+    encoder = StreamingEncoder(output_path, output_format, SAMPLE_RATE)
+    for block in np.array_split(samples, 3):
+        encoder.append(block)
+    assert encoder.close() == output_path
+
+    decoded, sample_rate = sf.read(output_path, dtype="int16")
+    assert sample_rate == SAMPLE_RATE
+    if output_format in ("wav", "flac"):
+        assert np.array_equal(decoded, samples)
+    else:
+        # Lossy codecs pad the stream with a few milliseconds of priming
+        assert abs(len(decoded) - len(samples)) < SAMPLE_RATE * 0.1
+
+
+def test_abort_removes_the_partial_output(tmp_path):
+    output_path = str(tmp_path / "out.flac")
+    encoder = StreamingEncoder(output_path, "flac", SAMPLE_RATE)
+    encoder.append(speech_like(0.5))
+
+    encoder.abort()
+
+    assert not os.path.exists(output_path)
+
+
+def test_conversion_does_not_load_the_ui_in_worker_processes(tmp_path):
+    # A stand-in gradio that records every process importing it
+    marker = tmp_path / "gradio-imported"
+    (tmp_path / "gradio").mkdir()
+    (tmp_path / "gradio" / "__init__.py").write_text(
+        f"open({str(marker)!r}, 'a').write('imported')\n", encoding="utf-8")
+    script = textwrap.dedent(f"""
+        import sys
+        import pdf_to_audio
+        from conftest import FakeOpenAIClient
+
+        # As when the web UI runs: spawned workers re-run pdf_to_audio's top level
+        sys.modules["__main__"] = pdf_to_audio
+
+        converter = pdf_to_audio.PDFToAudioConverter(cache_dir=None, output_format="flac")
+        converter.client = FakeOpenAIClient()
+        for _, audio_file, status in converter.text_to_speech_stream("A short document. " * 50):
+            pass
+        print(audio_file)
+    """)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(tmp_path), ROOT]))
+
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True,
+                            text=True, timeout=120)
+
+    assert result.returncode == 0, result.stderr
+    audio_file = result.stdout.strip().splitlines()[-1]
+    assert audio_file.endswith(".flac")
+    os.unlink(audio_file)
+    assert not marker.exists()
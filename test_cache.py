@@ -0,0 +1,74 @@
+"""
+Tests for the on-disk caches: byte accounting, LRU eviction under the quota
+and extraction entries expiring.
+"""
+
+import os
+import time
+
+from cache import DiskCache, ExtractionCache
+
+
+def key(name: str) -> str:
+    # Entries fan out by the first two characters of their key
+    return name * 8
+
+
+def age(cache: DiskCache, name: str, mtime: float):
+    """Set when an entry was last used."""
+    os.utime(cache._entry_path(key(name)), (mtime, mtime))
+
+
+def test_replacing_an_entry_counts_its_bytes_once(tmp_path):
+    # Roomy enough that no eviction re-measures the directory
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+
+    for _ in range(3):
+        cache.put(key("a"), b"x" * 100)
+
+    assert cache.stats()["bytes"] == 100
+    assert cache.stats()["evictions"] == 0
+    assert cache.get(key("a")) == b"x" * 100
+
+
+def test_size_is_measured_when_the_cache_is_opened(tmp_path):
+    DiskCache(str(tmp_path), max_bytes=1000).put(key("a"), b"x" * 100)
+
+    assert DiskCache(str(tmp_path), max_bytes=1000).stats()["bytes"] == 100
+
+
+def test_least_recently_used_entries_are_evicted_over_the_quota(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=350)
+    for index, name in enumerate("abc"):
+        cache.put(key(name), b"x" * 100)
+        age(cache, name, 1000 + index)
+    # Reading an entry makes it the most recently used
+    assert cache.get(key("a")) is not None
+
+    cache.put(key("d"), b"x" * 100)
+
+    assert cache.get(key("b")) is None
+    assert all(cache.get(key(name)) is not None for name in "acd")
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 300
+
+
+def test_entry_larger_than_the_quota_is_not_stored(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=50)
+
+    cache.put(key("a"), b"x" * 100)
+
+    assert cache.get(key("a")) is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_extraction_entries_expire(tmp_path):
+    cache = ExtractionCache(str(tmp_path), ttl_seconds=60)
+    cache.put("digest", "mineru", {}, "Extracted text")
+    assert cache.get("digest", "mineru", {}) == "Extracted text"
+    assert cache.get("digest", "pymupdf", {}) is None
+
+    cache.ttl_seconds = 0
+    time.sleep(0.01)
+
+    assert cache.get("digest", "mineru", {}) is None
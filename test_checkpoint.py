@@ -0,0 +1,108 @@
+"""
+Tests for checkpointed conversion jobs: a failed chunk is the only one
+synthesized again when the job is rerun.
+"""
+
+import os
+
+import pytest
+
+from checkpoint import CHUNK_DONE, CHUNK_FAILED, ConversionJob
+from conftest import FakeOpenAIClient
+from converter import PDFToAudioConverter
+
+SETTINGS = {"voice": "alloy", "model": "fake-tts"}
+
+
+@pytest.fixture
+def converter(tmp_path):
+    converter = PDFToAudioConverter(tts_concurrency=1, cache_dir=None, jobs_dir=str(tmp_path / "jobs"))
+    converter.client = FakeOpenAIClient()
+    return converter
+
+
+def run(converter, text: str):
+    """Convert text and return (whether it produced a file, final status), deleting the file."""
+    audio_file, status = None, None
+    for _, audio_file, status in converter.text_to_speech_stream(text):
+        pass
+    if audio_file:
+        os.unlink(audio_file)
+    return bool(audio_file), status
+
+
+def test_rerun_reuses_done_chunks_and_retries_the_failed_one(tmp_path):
+    job = ConversionJob.open(str(tmp_path), "source", SETTINGS)
+    for index, text in enumerate(["first", "second", "third"]):
+        job.register_chunk(index, text)
+    job.complete_chunk(0, b"audio-0")
+    job.fail_chunk(1, "rate limited")
+    job.complete_chunk(2, b"audio-2")
+    job.set_total_chunks(3)
+    job.mark_failed()
+
+    assert job.first_missing_chunk() == 1
+    assert job.manifest["chunks"]["1"]["status"] == CHUNK_FAILED
+
+    resumed = ConversionJob.open(str(tmp_path), "source", SETTINGS)
+
+    assert resumed.register_chunk(0, "first")
+    assert not resumed.register_chunk(1, "second")
+    assert resumed.register_chunk(2, "third")
+    assert resumed.load_segment(2) == b"audio-2"
+    assert resumed.stats()["resumed"] == 2
+    resumed.complete_chunk(1, b"audio-1")
+    resumed.set_total_chunks(3)
+    assert resumed.is_complete
+    assert resumed.manifest["chunks"]["1"]["status"] == CHUNK_DONE
+
+
+def test_changed_chunk_text_is_synthesized_again(tmp_path):
+    job = ConversionJob.open(str(tmp_path), "source", SETTINGS)
+    job.register_chunk(0, "first")
+    job.complete_chunk(0, b"audio-0")
+
+    resumed = ConversionJob.open(str(tmp_path), "source", SETTINGS)
+
+    assert not resumed.register_chunk(0, "first, edited")
+
+
+def test_other_settings_start_a_new_job(tmp_path):
+    job = ConversionJob.open(str(tmp_path), "source", SETTINGS)
+    job.register_chunk(0, "first")
+    job.complete_chunk(0, b"audio-0")
+
+    other = ConversionJob.open(str(tmp_path), "source", dict(SETTINGS, voice="echo"))
+
+    assert not other.register_chunk(0, "first")
+
+
+def test_conversion_resumes_after_a_failed_chunk(converter):
+    sentences = [f"Sentence {index} of the test document has a handful of words in it." for index in range(400)]
+    sentences[200] = "This sentence contains the FAILMARK token."
+    text = " ".join(sentences)
+
+    converter.client.fail_marker = "FAILMARK"
+    produced, status = run(converter, text)
+    assert not produced
+    assert "Failed to generate audio for chunk" in status
+    first_run = len(converter.client.spoken)
+    chunk_count = len(converter.split_text_into_chunks(text))
+    assert 0 < first_run < chunk_count
+
+    converter.client = FakeOpenAIClient()
+    produced, status = run(converter, text)
+
+    assert produced
+    # Only the failed chunk, and any the first run never reached, are synthesized again
+    assert len(converter.client.spoken) == chunk_count - first_run
+    assert any("FAILMARK" in chunk for chunk in converter.client.spoken)
+
+
+def test_finished_job_runs_again_from_scratch(converter):
+    text = "A short document. It has two sentences."
+
+    run(converter, text)
+    run(converter, text)
+
+    assert len(converter.client.spoken) == 2
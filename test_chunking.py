@@ -0,0 +1,104 @@
+"""
+Tests for sentence-aware TTS chunking: size limits, and the same chunks whether
+a document is fed whole or piece by piece.
+"""
+
+import random
+
+import pytest
+
+from chunking import (CHUNKING_CONTENT_DEFINED, CHUNKING_MODES, CHUNKING_PACKED, new_chunker,
+                      split_text_into_chunks)
+
+MODES = pytest.mark.parametrize("mode", CHUNKING_MODES)
+
+
+def make_document(sentences: int = 400, seed: int = 0) -> str:
+    """Return prose of varied sentence lengths, with the odd CJK sentence and decimal number."""
+    rng = random.Random(seed)
+    words = ["speech", "audio", "chapter", "reader", "voice", "page", "model", "signal", "the", "of", "and"]
+    parts = []
+    for index in range(sentences):
+        if index % 37 == 0:
+            parts.append("这是一个测试句子。")
+            continue
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randint(3, 40)))
+        if index % 11 == 0:
+            sentence += f" at {rng.randint(1, 99)}.{rng.randint(0, 9)} percent"
+        parts.append(sentence.capitalize() + rng.choice([".", "!", "?", '."']))
+    return " ".join(parts)
+
+
+def feed_in_pieces(mode: str, text: str, max_length: int, seed: int = 0) -> list:
+    """Feed text split at random spaces, as pages or shards would arrive, and return all chunks."""
+    rng = random.Random(seed)
+    words = text.split(" ")
+    chunker = new_chunker(mode, max_length)
+    chunks = []
+    start = 0
+    while start < len(words):
+        end = min(len(words), start + rng.randint(1, 300))
+        chunks += chunker.feed(" ".join(words[start:end]))
+        start = end
+    return chunks + chunker.flush()
+
+
+@MODES
+@pytest.mark.parametrize("max_length", [4000, 500])
+def test_chunks_stay_within_max_length(mode, max_length):
+    chunks = split_text_into_chunks(make_document(), max_length=max_length, mode=mode)
+
+    assert len(chunks) > 1
+    assert all(0 < len(chunk) <= max_length for chunk in chunks)
+
+
+@MODES
+def test_sentence_longer_than_a_chunk_is_split(mode):
+    # No sentence ending at all, so the chunker has to cut within the sentence
+    text = ", ".join(f"clause number {index} of a very long sentence" for index in range(300))
+
+    chunks = split_text_into_chunks(text, max_length=1000, mode=mode)
+
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+@MODES
+def test_chunks_keep_all_text_in_order(mode):
+    text = make_document(seed=3)
+
+    chunks = split_text_into_chunks(text, max_length=1000, mode=mode)
+
+    assert " ".join(chunks).split() == text.split()
+
+
+@MODES
+@pytest.mark.parametrize("seed", range(5))
+def test_pieces_give_the_same_chunks_as_the_whole_text(mode, seed):
+    text = make_document(seed=seed)
+
+    whole = split_text_into_chunks(text, max_length=1000, mode=mode)
+
+    assert feed_in_pieces(mode, text, 1000, seed=seed) == whole
+
+
+def test_short_text_is_one_chunk():
+    assert split_text_into_chunks("Hello there. How are you?") == ["Hello there. How are you?"]
+
+
+def test_packed_chunks_end_on_sentence_boundaries():
+    chunks = split_text_into_chunks(make_document(seed=1), max_length=1000, mode=CHUNKING_PACKED)
+
+    assert all(chunk.endswith((".", "!", "?", '"', "。")) for chunk in chunks)
+
+
+def test_content_defined_chunks_realign_after_an_edit():
+    text = make_document(seed=2)
+    revised = "A sentence added at the start of the revision. " + text
+
+    before = split_text_into_chunks(text, mode=CHUNKING_CONTENT_DEFINED)
+    after = split_text_into_chunks(revised, mode=CHUNKING_CONTENT_DEFINED)
+
+    assert before[0] != after[0]
+    # Only the chunks around the edit change
+    assert len(set(before) & set(after)) >= len(before) - 2
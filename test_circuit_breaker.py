@@ -0,0 +1,134 @@
+"""
+Tests for the circuit breaker's closed -> open -> half-open -> closed transitions.
+"""
+
+import threading
+import time
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+# Without a probe, the breaker allows a trial call this many seconds after opening
+RESET_TIMEOUT = 0.05
+
+
+def wait_for(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.005)
+    return condition()
+
+
+def fail(breaker: CircuitBreaker, times: int):
+    for _ in range(times):
+        assert breaker.allow_request()
+        breaker.record_failure()
+
+
+def test_opens_after_threshold_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=RESET_TIMEOUT)
+
+    fail(breaker, 2)
+    assert breaker.state == CLOSED
+    fail(breaker, 1)
+
+    assert breaker.state == OPEN
+    assert breaker.is_open()
+    assert not breaker.allow_request()
+    assert breaker.snapshot()["trips"] == 1
+    assert breaker.snapshot()["rejections"] == 1
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=RESET_TIMEOUT)
+
+    fail(breaker, 2)
+    assert breaker.allow_request()
+    breaker.record_success()
+    fail(breaker, 2)
+
+    assert breaker.state == CLOSED
+
+
+def test_timeout_counts_as_two_failures():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=RESET_TIMEOUT)
+
+    # One slow call alone doesn't open a breaker every caller shares
+    assert breaker.allow_request()
+    breaker.record_timeout()
+    assert breaker.state == CLOSED
+    fail(breaker, 1)
+
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+
+
+def test_half_open_trial_timeout_opens_again():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=RESET_TIMEOUT)
+    fail(breaker, 3)
+    time.sleep(RESET_TIMEOUT * 2)
+
+    assert breaker.allow_request()
+    breaker.record_timeout()
+
+    assert breaker.state == OPEN
+
+
+def test_half_open_trial_success_closes():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=RESET_TIMEOUT)
+    fail(breaker, 1)
+    time.sleep(RESET_TIMEOUT * 2)
+
+    assert not breaker.is_open()
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    # Only one trial call at a time
+    assert not breaker.allow_request()
+    breaker.record_success()
+
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+    assert breaker.allow_request()
+
+
+def test_half_open_trial_failure_opens_again():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=RESET_TIMEOUT)
+    fail(breaker, 3)
+    time.sleep(RESET_TIMEOUT * 2)
+
+    assert breaker.allow_request()
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+    assert breaker.snapshot()["trips"] == 2
+
+
+def test_released_trial_lets_another_through():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=RESET_TIMEOUT)
+    fail(breaker, 1)
+    time.sleep(RESET_TIMEOUT * 2)
+
+    assert breaker.allow_request()
+    breaker.release()
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_probe_moves_open_breaker_to_half_open():
+    healthy = threading.Event()
+    breaker = CircuitBreaker("test", failure_threshold=1, probe=healthy.is_set, probe_interval=0.01)
+    fail(breaker, 1)
+
+    # With a probe, the breaker stays open until the probe succeeds
+    time.sleep(0.05)
+    assert breaker.state == OPEN
+    assert breaker.is_open()
+    healthy.set()
+
+    assert wait_for(lambda: breaker.state == HALF_OPEN)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED
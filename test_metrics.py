@@ -0,0 +1,48 @@
+"""
+Tests for the Prometheus exposition of the metrics registry.
+"""
+
+from metrics import MetricsRegistry
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.inc("tts_errors_total", error='Bad "quote" \\ path\nsecond line')
+
+    rendered = registry.render_prometheus()
+
+    assert 'pdf2audio_tts_errors_total{error="Bad \\"quote\\" \\\\ path\\nsecond line"} 1' in rendered.splitlines()
+
+
+def test_counters_and_gauges_render_with_help_and_type():
+    registry = MetricsRegistry()
+    registry.describe("chunks_total", "TTS chunks produced")
+    registry.inc("chunks_total", 2, engine="openai")
+    registry.inc("chunks_total", engine="openai")
+    registry.set("circuit_state", 2, circuit="http://mineru")
+
+    lines = registry.render_prometheus().splitlines()
+
+    assert lines == [
+        "# HELP pdf2audio_chunks_total TTS chunks produced",
+        "# TYPE pdf2audio_chunks_total counter",
+        'pdf2audio_chunks_total{engine="openai"} 3',
+        "# TYPE pdf2audio_circuit_state gauge",
+        'pdf2audio_circuit_state{circuit="http://mineru"} 2',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        registry.observe("stage_seconds", value, stage="tts_request")
+
+    lines = registry.render_prometheus().splitlines()
+
+    assert lines[1:] == [
+        'pdf2audio_stage_seconds_bucket{stage="tts_request",le="0.1"} 1',
+        'pdf2audio_stage_seconds_bucket{stage="tts_request",le="1"} 2',
+        'pdf2audio_stage_seconds_bucket{stage="tts_request",le="+Inf"} 3',
+        'pdf2audio_stage_seconds_sum{stage="tts_request"} 5.55',
+        'pdf2audio_stage_seconds_count{stage="tts_request"} 3',
+    ]
@@ -0,0 +1,95 @@
+"""
+Tests for TTS rate budgets: retries and adaptive concurrency of the limiter,
+and sessions of a shared converter drawing on the budget of their API key.
+"""
+
+from types import SimpleNamespace
+
+import openai
+import pytest
+
+from conftest import FakeOpenAIClient
+from converter import PDFToAudioConverter
+from rate_limit import TTSRateLimiter
+
+
+class APIError(Exception):
+    """An API error with a status code, answered with Retry-After: 0 so retries don't wait."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers={"retry-after": "0"})
+
+
+def failing(errors: list):
+    """Return a request that raises each of errors in turn, then returns "audio"."""
+    def request():
+        if errors:
+            raise errors.pop(0)
+        return "audio"
+    return request
+
+
+def test_throttled_requests_are_retried_at_lower_concurrency():
+    limiter = TTSRateLimiter(None, None, max_concurrency=4)
+
+    assert limiter.call(failing([APIError(429), APIError(503)])) == "audio"
+
+    stats = limiter.stats()
+    assert (stats["requests"], stats["retries"], stats["throttled"], stats["failures"]) == (3, 2, 1, 0)
+    assert stats["concurrency_limit"] == 2
+
+
+def test_client_errors_fail_without_retrying():
+    limiter = TTSRateLimiter(None, None)
+
+    with pytest.raises(APIError):
+        limiter.call(failing([APIError(400)]))
+
+    assert limiter.stats()["requests"] == 1
+    assert limiter.stats()["failures"] == 1
+
+
+def test_retries_stop_after_max_retries():
+    limiter = TTSRateLimiter(None, None, max_retries=2)
+
+    with pytest.raises(APIError):
+        limiter.call(failing([APIError(500) for _ in range(5)]))
+
+    assert limiter.stats()["requests"] == 3
+
+
+@pytest.fixture
+def converter(monkeypatch):
+    # Key validation sends one speech request; answer it without the network
+    monkeypatch.setattr(openai, "OpenAI", lambda **kwargs: FakeOpenAIClient())
+    return PDFToAudioConverter(cache_dir=None)
+
+
+def session_with_key(converter, api_key: str):
+    session = converter.new_session()
+    assert session.set_api_key(api_key).startswith("✅")
+    return session
+
+
+def test_sessions_with_the_same_key_share_its_budget(converter):
+    first = session_with_key(converter, "sk-shared")
+    second = session_with_key(converter, "sk-shared")
+
+    assert first.rate_limiter is second.rate_limiter
+    first.rate_limiter.call(lambda: None)
+    assert second.rate_limiter.stats()["requests"] == 1
+
+
+def test_sessions_with_other_keys_have_their_own_budget(converter):
+    first = session_with_key(converter, "sk-first")
+    second = session_with_key(converter, "sk-second")
+
+    assert first.rate_limiter is not second.rate_limiter
+
+
+def test_rate_limiters_are_not_keyed_by_the_raw_key(converter):
+    session_with_key(converter, "sk-secret")
+
+    assert "sk-secret" not in converter.rate_limiters
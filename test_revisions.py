@@ -0,0 +1,150 @@
+"""
+Tests for document revisions: diffing a revised document's chunks against the
+previous version and reusing the audio of the chunks that didn't change.
+"""
+
+import os
+
+import pytest
+
+from checkpoint import DocumentRevision, chunk_hash, diff_chunk_hashes
+from conftest import FakeOpenAIClient
+from converter import PDFToAudioConverter
+
+SETTINGS = {"voice": "alloy", "model": "fake-tts"}
+
+
+def store_version(revisions_dir, chunks: list) -> DocumentRevision:
+    """Convert a version of the document "doc" whose chunks are chunks, and commit it."""
+    revision = DocumentRevision.open(str(revisions_dir), "doc", SETTINGS)
+    for index, text in enumerate(chunks):
+        audio = revision.load_segment(index, text)
+        if audio is None:
+            revision.store_segment(index, text, f"audio of {text}".encode("utf-8"))
+    revision.commit(len(chunks))
+    return revision
+
+
+def segment_files(revision: DocumentRevision) -> set:
+    return {path.name for path in revision.segments_dir.iterdir()}
+
+
+def test_diff_counts_unchanged_changed_and_removed():
+    previous = [chunk_hash(text) for text in ["a", "b", "c", "d"]]
+    current = [chunk_hash(text) for text in ["a", "b2", "c", "e", "f"]]
+
+    assert diff_chunk_hashes(previous, current) == {"unchanged": 2, "changed": 3, "removed": 2}
+
+
+def test_diff_counts_repeated_chunks_once_each():
+    previous = [chunk_hash("same")]
+    current = [chunk_hash("same"), chunk_hash("same")]
+
+    assert diff_chunk_hashes(previous, current) == {"unchanged": 1, "changed": 1, "removed": 0}
+
+
+def test_unchanged_chunks_reuse_the_previous_audio(tmp_path):
+    store_version(tmp_path, ["one", "two", "three"])
+
+    revision = DocumentRevision.open(str(tmp_path), "doc", SETTINGS)
+
+    assert revision.diff(["one", "two, revised", "three"]) == {"unchanged": 2, "changed": 1, "removed": 1}
+    assert revision.load_segment(0, "one") == b"audio of one"
+    assert revision.load_segment(1, "two, revised") is None
+    assert revision.load_segment(2, "three") == b"audio of three"
+    assert revision.reused == 2
+
+
+def test_commit_deletes_segments_the_new_version_doesnt_use(tmp_path):
+    store_version(tmp_path, ["one", "two", "three"])
+
+    revision = store_version(tmp_path, ["one", "two, revised"])
+
+    assert segment_files(revision) == {f"{chunk_hash(text)}.pcm" for text in ["one", "two, revised"]}
+    assert revision.previous_hashes == [chunk_hash("one"), chunk_hash("two, revised")]
+
+
+def test_failed_run_keeps_its_segments_for_the_next_attempt(tmp_path):
+    store_version(tmp_path, ["one"])
+    failed = DocumentRevision.open(str(tmp_path), "doc", SETTINGS)
+    failed.store_segment(1, "new", b"audio of new")
+
+    retry = DocumentRevision.open(str(tmp_path), "doc", SETTINGS)
+
+    assert retry.load_segment(1, "new") == b"audio of new"
+    # Audio left by a failed run isn't from the previous version
+    assert retry.reused == 0
+
+
+def test_commit_skips_chunks_without_a_hash(tmp_path):
+    revision = DocumentRevision.open(str(tmp_path), "doc", SETTINGS)
+    revision.store_segment(0, "one", b"audio of one")
+    revision.store_segment(2, "three", b"audio of three")
+
+    revision.commit(3)
+
+    assert revision.previous_hashes == [chunk_hash("one"), chunk_hash("three")]
+
+
+def test_other_settings_have_their_own_previous_version(tmp_path):
+    store_version(tmp_path, ["one"])
+
+    revision = DocumentRevision.open(str(tmp_path), "doc", dict(SETTINGS, voice="echo"))
+
+    assert revision.previous_hashes == []
+
+
+@pytest.fixture
+def converter(tmp_path):
+    converter = PDFToAudioConverter(cache_dir=None, jobs_dir=str(tmp_path / "jobs"),
+                                    revisions_dir=str(tmp_path / "revisions"))
+    converter.client = FakeOpenAIClient()
+    return converter
+
+
+def convert(converter, text: str) -> bool:
+    audio_file = None
+    for _, audio_file, _ in converter.text_to_speech_stream(text, revision_key="doc"):
+        pass
+    if audio_file:
+        os.unlink(audio_file)
+    return bool(audio_file)
+
+
+def test_revised_document_only_synthesizes_changed_chunks(converter):
+    sentences = [f"Sentence {index} of the document says something about topic {index % 7}." for index in range(600)]
+    assert convert(converter, " ".join(sentences))
+    first_version = list(converter.client.spoken)
+
+    sentences[300] = "This sentence was rewritten for the second edition."
+    converter.client = FakeOpenAIClient()
+    assert convert(converter, " ".join(sentences))
+
+    assert 0 < len(converter.client.spoken) < len(first_version) / 2
+    assert any("second edition" in chunk for chunk in converter.client.spoken)
+
+
+def test_revision_is_tracked_by_one_run_at_a_time(converter):
+    revision = converter.open_revision("doc", "alloy")
+
+    assert revision is not None
+    assert converter.open_revision("doc", "alloy") is None
+    # A session of the same converter shares the guard
+    assert converter.new_session().open_revision("doc", "alloy") is None
+    # The same document with another voice is a different revision
+    other = converter.open_revision("doc", "echo")
+    assert other is not None
+
+    converter.release_revision(revision)
+    converter.release_revision(other)
+    assert converter.open_revision("doc", "alloy") is not None
+
+
+def test_revision_is_released_when_the_job_cannot_be_opened(converter, monkeypatch):
+    def broken_open_job(*args, **kwargs):
+        raise RuntimeError("jobs directory is broken")
+    monkeypatch.setattr(converter, "open_job", broken_open_job)
+
+    assert not convert(converter, "A short document. It has two sentences.")
+
+    assert converter.open_revision("doc", "alloy") is not None
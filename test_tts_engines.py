@@ -0,0 +1,121 @@
+"""
+Tests for the local TTS engine: reading espeak-ng's WAV output and resampling
+it to the converter's sample rate.
+"""
+
+import os
+import stat
+import struct
+import sys
+import textwrap
+
+import numpy as np
+import pytest
+
+from tts_engines import EspeakTTSEngine, TTSEngine, read_wav_pcm, resample_pcm
+
+SAMPLES = np.arange(-500, 500, 7, dtype="<i2")
+# espeak-ng writes to a pipe, so it can't fill in the sizes and leaves placeholders
+PIPED_SIZE = 0x7FFFF000
+
+
+def chunk(chunk_id: bytes, body: bytes, size=None) -> bytes:
+    padding = b"\0" if len(body) % 2 else b""
+    return chunk_id + struct.pack("<I", len(body) if size is None else size) + body + padding
+
+
+def fmt_chunk(sample_rate: int = 22050, channels: int = 1, bits: int = 16) -> bytes:
+    block_align = channels * bits // 8
+    return chunk(b"fmt ", struct.pack("<HHIIHH", 1, channels, sample_rate, sample_rate * block_align,
+                                      block_align, bits))
+
+
+def wav_file(*chunks: bytes) -> bytes:
+    return b"RIFF" + struct.pack("<I", PIPED_SIZE) + b"WAVE" + b"".join(chunks)
+
+
+def test_reads_a_piped_wav_to_the_end():
+    wav = wav_file(fmt_chunk(), chunk(b"data", SAMPLES.tobytes(), size=PIPED_SIZE))
+
+    samples, sample_rate = read_wav_pcm(wav)
+
+    assert sample_rate == 22050
+    assert np.array_equal(samples, SAMPLES)
+
+
+def test_data_chunk_of_size_zero_is_read_to_the_end():
+    wav = wav_file(fmt_chunk(), chunk(b"data", SAMPLES.tobytes(), size=0))
+
+    samples, _ = read_wav_pcm(wav)
+
+    assert np.array_equal(samples, SAMPLES)
+
+
+def test_skips_chunks_before_the_format_and_the_data():
+    # "data" inside an earlier chunk's body, and an odd-sized chunk that is padded
+    wav = wav_file(chunk(b"JUNK", b"not data at all"), fmt_chunk(16000),
+                   chunk(b"LIST", b"INFOISFT\x05\0\0\0data\0"), chunk(b"data", SAMPLES.tobytes()))
+
+    samples, sample_rate = read_wav_pcm(wav)
+
+    assert sample_rate == 16000
+    assert np.array_equal(samples, SAMPLES)
+
+
+def test_stereo_keeps_the_first_channel():
+    frames = np.stack([SAMPLES, -SAMPLES], axis=1).astype("<i2")
+    wav = wav_file(fmt_chunk(channels=2), chunk(b"data", frames.tobytes()))
+
+    samples, _ = read_wav_pcm(wav)
+
+    assert np.array_equal(samples, SAMPLES)
+
+
+@pytest.mark.parametrize("wav", [
+    b"",
+    b"not a wav file at all",
+    wav_file(fmt_chunk()),
+    wav_file(chunk(b"data", SAMPLES.tobytes())),
+    wav_file(fmt_chunk(bits=8), chunk(b"data", SAMPLES.tobytes())),
+])
+def test_rejects_output_without_16_bit_audio(wav):
+    with pytest.raises(RuntimeError):
+        read_wav_pcm(wav)
+
+
+def test_resample_scales_the_length():
+    samples = np.zeros(22050, dtype="<i2")
+
+    assert len(resample_pcm(samples, 22050, 24000)) == 24000
+    assert resample_pcm(samples, 24000, 24000) is samples
+
+
+def test_engines_must_implement_synthesize():
+    class Incomplete(TTSEngine):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_espeak_engine_returns_audio_at_the_converter_rate(tmp_path, monkeypatch):
+    # A stand-in espeak-ng writing a second of silence per character, with a chunk before the data
+    executable = tmp_path / "espeak-ng"
+    executable.write_text(textwrap.dedent(f"""\
+        #!{sys.executable}
+        import struct, sys
+        text = sys.stdin.buffer.read()
+        data = bytes(2 * 22050 * len(text))
+        fmt = struct.pack("<HHIIHH", 1, 1, 22050, 44100, 2, 16)
+        sys.stdout.buffer.write(b"RIFF" + struct.pack("<I", {PIPED_SIZE}) + b"WAVE"
+                                + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+                                + b"LIST" + struct.pack("<I", 4) + b"INFO"
+                                + b"data" + struct.pack("<I", {PIPED_SIZE}) + data)
+    """), encoding="utf-8")
+    executable.chmod(executable.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv("PATH", str(tmp_path) + os.pathsep + os.environ.get("PATH", ""))
+
+    engine = EspeakTTSEngine(24000, workers=2)
+    pcm = engine.synthesize(None, "abc", "alloy")
+
+    assert len(pcm) == 2 * 24000 * 3
@@ -0,0 +1,318 @@
+"""
+Text cleaning rules that turn extracted PDF text and MinerU markdown into speakable text.
+
+Every pattern is compiled once at import time. Rules that compose are merged
+into a single pass (for example, the final character filter and whitespace
+collapse), and rules whose trigger character is absent from the document are
+skipped with a cheap substring check instead of a full regex scan.
+"""
+
+import functools
+import re
+
+# --- Character filters -------------------------------------------------------
+
+# CJK sentence and clause punctuation, kept so chunking and TTS prosody can use it
+CJK_PUNCTUATION = '。！？，、；：'
+
+# Runs of whitespace and characters TTS shouldn't read collapse to one space.
+# The MinerU variant also keeps CJK ideographs explicitly.
+_TTS_DISALLOWED_RUN = re.compile(r'[^\w.,!?;:\-()\'"' + CJK_PUNCTUATION + r']+')
+_TTS_DISALLOWED_RUN_CJK = re.compile(r'[^\w\u4e00-\u9fff.,!?;:\-()\'"' + CJK_PUNCTUATION + r']+')
+
+# Anything normalize_for_tts would change inside the text: a disallowed
+# character, a whitespace character other than a space, or a double space
+_TTS_NEEDS_NORMALIZING = re.compile(r'[^\w .,!?;:\-()\'"' + CJK_PUNCTUATION + r']|  ')
+
+_WHITESPACE_RUN = re.compile(r'\s+')
+
+# --- Markdown structure ------------------------------------------------------
+
+_IMAGE = re.compile(r'!\[.*?\]\(.*?\)')
+_HEADER = re.compile(r'^#{1,6}\s+', re.MULTILINE)
+_BOLD_STARS = re.compile(r'\*\*(.*?)\*\*')
+_ITALIC_STAR = re.compile(r'\*(.*?)\*')
+_BOLD_UNDERSCORES = re.compile(r'__(.*?)__')
+_ITALIC_UNDERSCORE = re.compile(r'_(.*?)_')
+_LINK = re.compile(r'\[([^\]]+)\]\([^\)]+\)')
+_ANGLE_LINK = re.compile(r'<([^>]+)>')
+_CODE_BLOCK = re.compile(r'```[^`]*```', re.DOTALL)
+_INLINE_CODE = re.compile(r'`([^`]+)`')
+_INLINE_MATH = re.compile(r'\$([^$]+)\$')
+_BULLET_MARKER = re.compile(r'^\s*[-*+]\s+', re.MULTILINE)
+_NUMBERED_MARKER = re.compile(r'^\s*\d+\.\s+', re.MULTILINE)
+_DASH_OR_STAR_RULE = re.compile(r'^(?:-{3,}|\*{3,})$', re.MULTILINE)
+_HORIZONTAL_RULE = re.compile(r'^[-*_]{3,}$', re.MULTILINE)
+_BLOCKQUOTE = re.compile(r'^>\s*', re.MULTILINE)
+
+# --- PDF artifacts ----------------------------------------------------------
+
+# Emails and URLs, typically from page footers
+_EMAIL = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+_URL = re.compile(r'https?://[^\s]+')
+_WWW_LINK = re.compile(r'www\.[^\s]+')
+_PAGE_NUMBER = re.compile(r'\b(?:Page \d+|第\d+页|\d+/\d+)\b')
+_CHINESE_DATE = re.compile(r'\b\d{4}年\d{1,2}月\d{1,2}日\b')
+_ENGLISH_DATE = re.compile(r'\b\d{1,2}/\d{1,2}/\d{4}\b')
+
+# Boundaries between CJK ideographs and Latin letters, which TTS reads better with a space
+_CJK_LATIN_BOUNDARY = re.compile(r'[\u4e00-\u9fff](?=[A-Za-z])|[A-Za-z](?=[\u4e00-\u9fff])')
+_HAS_CJK = re.compile(r'[\u4e00-\u9fff]')
+
+# --- LaTeX math ---------------------------------------------------------------
+
+# Ordinal numbers like "8 ^ { \mathrm { t h } }" or "8 ^ { \\mathrm { t h } }"
+_MATH_ORDINAL = re.compile(r'(\d+)\s*\^\s*\{\s*\\*mathrm\s*\{\s*([a-z]+)\s*\}\s*\}')
+_MATH_POWER = re.compile(r'(\w+)\^(\d+)')
+_MATH_FRACTION = re.compile(r'\\frac\{([^}]+)\}\{([^}]+)\}')
+_MATH_COMMAND = re.compile(r'\\[a-zA-Z]+\s*')
+_MATH_CARET = re.compile(r'\s*\^\s*')
+_BRACES = str.maketrans('', '', '{}')
+
+# --- Page text cleanup ------------------------------------------------------
+
+_BARE_NUMBER = re.compile(r'\b\d+\b')
+_PAGE_NUMBER_LINE = re.compile(r'^\s*\d+\s*$')
+_NUMERIC_LINE = re.compile(r'^[\d\s\-\.\|]+$')
+_FOOTER_LINK = re.compile(r'(https?://|www\.|@.*\.com)', re.IGNORECASE)
+_COPYRIGHT = re.compile(r'(copyright|©|\(c\)|all rights reserved)', re.IGNORECASE)
+_LINE_BREAK_HYPHEN = re.compile(r'-\s+')
+_SPACE_BEFORE_PUNCTUATION = re.compile(r'\s+([,.!?;:])')
+_SENTENCE_SPACING = re.compile(r'([.!?])\s*([A-Z])')
+
+
+def normalize_for_tts(text: str) -> str:
+    """Replace characters TTS shouldn't read with spaces and collapse all whitespace."""
+    if not text.startswith(' ') and not text.endswith(' ') and _TTS_NEEDS_NORMALIZING.search(text) is None:
+        # Already clean (e.g. a chunk of cleaned text): skip the copy
+        return text
+    return _TTS_DISALLOWED_RUN.sub(' ', text).strip()
+
+
+def _strip_emphasis(text: str) -> str:
+    if '*' in text:
+        text = _BOLD_STARS.sub(r'\1', text)   # **bold**
+        text = _ITALIC_STAR.sub(r'\1', text)  # *italic*
+    if '_' in text:
+        text = _BOLD_UNDERSCORES.sub(r'\1', text)   # __bold__
+        text = _ITALIC_UNDERSCORE.sub(r'\1', text)  # _italic_
+    return text
+
+
+def clean_markdown_text(markdown_text: str) -> str:
+    """Convert markdown text to clean plain text suitable for TTS."""
+    if not markdown_text:
+        return ""
+
+    text = markdown_text
+
+    # Remove headers (# ## ###)
+    if '#' in text:
+        text = _HEADER.sub('', text)
+
+    # Remove bold and italic markers
+    text = _strip_emphasis(text)
+
+    # Remove links but keep text
+    if '](' in text:
+        text = _LINK.sub(r'\1', text)  # [text](url)
+    if '<' in text:
+        text = _ANGLE_LINK.sub(r'\1', text)  # <url>
+
+    # Remove code blocks and inline code
+    if '`' in text:
+        text = _CODE_BLOCK.sub('', text)
+        text = _INLINE_CODE.sub(r'\1', text)
+
+    # Remove list markers
+    text = _BULLET_MARKER.sub('', text)    # - * +
+    text = _NUMBERED_MARKER.sub('', text)  # 1. 2. 3.
+
+    # Remove horizontal rules
+    text = _DASH_OR_STAR_RULE.sub('', text)
+
+    # Remove blockquotes
+    if '>' in text:
+        text = _BLOCKQUOTE.sub('', text)
+
+    # Collapse all whitespace, including newlines, for better TTS flow
+    return _WHITESPACE_RUN.sub(' ', text).strip()
+
+
+def clean_mineru_markdown_text(markdown_text: str) -> str:
+    """Specialized cleaning for MinerU markdown content with enhanced TTS optimization."""
+    if not markdown_text:
+        return ""
+
+    text = markdown_text
+
+    # Remove image references completely (not useful for audio)
+    if '![' in text:
+        text = _IMAGE.sub('', text)
+
+    # Remove markdown headers but keep the text
+    if '#' in text:
+        text = _HEADER.sub('', text)
+
+    # Remove bold and italic markers but keep content
+    text = _strip_emphasis(text)
+
+    # Remove links but keep the text content
+    if '](' in text:
+        text = _LINK.sub(r'\1', text)  # [text](url)
+    if '<' in text:
+        text = _ANGLE_LINK.sub('', text)  # Remove <url> completely
+
+    # Remove code blocks and inline code
+    if '`' in text:
+        text = _CODE_BLOCK.sub('', text)
+        text = _INLINE_CODE.sub(r'\1', text)
+
+    # Handle mathematical notation - convert to readable text
+    # LaTeX math expressions like $8 ^ { \mathrm { t h } }$
+    if '$' in text:
+        text = _INLINE_MATH.sub(lambda m: convert_math_to_text(m.group(1)), text)
+
+    # Remove list markers but keep content
+    text = _BULLET_MARKER.sub('', text)
+    text = _NUMBERED_MARKER.sub('', text)
+
+    # Remove horizontal rules
+    text = _HORIZONTAL_RULE.sub('', text)
+
+    # Remove blockquotes markers but keep content
+    if '>' in text:
+        text = _BLOCKQUOTE.sub('', text)
+
+    # Clean up email addresses and URLs that might be in footers
+    if '@' in text:
+        text = _EMAIL.sub('', text)
+    if '://' in text:
+        text = _URL.sub('', text)
+    if 'www.' in text:
+        text = _WWW_LINK.sub('', text)
+
+    # Remove common PDF artifacts and formatting
+    text = _PAGE_NUMBER.sub('', text)    # Page numbers
+    if '年' in text:
+        text = _CHINESE_DATE.sub('', text)  # Chinese dates
+    if '/' in text:
+        text = _ENGLISH_DATE.sub('', text)  # English dates
+
+    # Handle Chinese and English mixed content
+    # Add spaces between Chinese and English characters for better TTS
+    if _HAS_CJK.search(text):
+        text = _CJK_LATIN_BOUNDARY.sub(r'\g<0> ', text)
+
+    # Collapse whitespace and remove any remaining special characters that
+    # might cause TTS issues, in a single pass
+    return _TTS_DISALLOWED_RUN_CJK.sub(' ', text).strip()
+
+
+@functools.lru_cache(maxsize=4096)
+def convert_math_to_text(math_expr: str) -> str:
+    """Convert LaTeX math expressions to readable text for TTS."""
+    # Handle common mathematical expressions
+    math_expr = math_expr.strip()
+
+    # Handle ordinal numbers like "8 ^ { \mathrm { t h } }"
+    ordinal_match = _MATH_ORDINAL.search(math_expr)
+    if ordinal_match:
+        number = ordinal_match.group(1)
+        suffix = ordinal_match.group(2)
+        return f"{number}{suffix}"
+
+    # Handle simple superscripts like "x^2"
+    math_expr = _MATH_POWER.sub(r'\1 to the power of \2', math_expr)
+
+    # Handle fractions
+    math_expr = _MATH_FRACTION.sub(r'\1 over \2', math_expr)
+
+    # Remove LaTeX commands and braces
+    math_expr = _MATH_COMMAND.sub('', math_expr)
+    math_expr = math_expr.translate(_BRACES)
+
+    # Clean up spaces and remaining symbols
+    math_expr = _MATH_CARET.sub(' ', math_expr)  # Remove remaining ^ symbols
+    return " ".join(math_expr.split())
+
+
+def basic_text_cleaning(text: str) -> str:
+    """Basic text cleaning for fallback extraction."""
+    if not text:
+        return ""
+
+    # Remove common PDF artifacts and excessive whitespace in one pass
+    return _TTS_DISALLOWED_RUN.sub(' ', text).strip()
+
+
+def clean_pdf_text(pages_text: list) -> str:
+    """Clean PDF text by removing headers, footers, and improving readability."""
+    if not pages_text:
+        return ""
+
+    # Combine all pages
+    full_text = "\n".join(pages_text)
+
+    # Remove empty lines and very short lines that might be artifacts
+    lines = [line.strip() for line in full_text.split('\n') if len(line.strip()) > 2]
+
+    if not lines:
+        return ""
+
+    # Detect and remove potential headers/footers
+    # Headers/footers often repeat across pages or contain page numbers
+    line_frequency = {}
+    normalized_lines = []
+    for line in lines:
+        # Normalize line for comparison (remove numbers that might be page numbers)
+        normalized = _BARE_NUMBER.sub('', line).strip()
+        normalized_lines.append(normalized)
+        if len(normalized) > 5:  # Only consider substantial lines
+            line_frequency[normalized] = line_frequency.get(normalized, 0) + 1
+
+    # Lines that appear frequently might be headers/footers
+    total_pages = len(pages_text)
+    frequent_lines = set()
+    for normalized_line, count in line_frequency.items():
+        # If a line appears in more than 30% of pages, it might be header/footer
+        if count > max(2, total_pages * 0.3):
+            frequent_lines.add(normalized_line)
+
+    # Filter out likely headers/footers and page numbers
+    cleaned_lines = []
+    for line, normalized in zip(lines, normalized_lines):
+        # Skip lines that are likely page numbers
+        if _PAGE_NUMBER_LINE.match(line):
+            continue
+
+        # Skip lines that are very short and contain mostly numbers/symbols
+        if len(line) < 10 and _NUMERIC_LINE.match(line):
+            continue
+
+        # Check if this line is a frequent header/footer
+        if normalized in frequent_lines and len(normalized) < 50:
+            continue
+
+        # Skip lines that look like URLs or email addresses (often in footers)
+        if _FOOTER_LINK.search(line):
+            continue
+
+        # Skip copyright notices and similar footer content
+        if _COPYRIGHT.search(line):
+            continue
+
+        cleaned_lines.append(line)
+
+    # Join cleaned lines and remove excessive whitespace
+    cleaned_text = _WHITESPACE_RUN.sub(' ', ' '.join(cleaned_lines))
+
+    # Fix common PDF extraction issues
+    # Remove hyphenation at line breaks
+    cleaned_text = _LINE_BREAK_HYPHEN.sub('', cleaned_text)
+
+    # Fix spacing around punctuation
+    cleaned_text = _SPACE_BEFORE_PUNCTUATION.sub(r'\1', cleaned_text)
+    cleaned_text = _SENTENCE_SPACING.sub(r'\1 \2', cleaned_text)
+
+    return cleaned_text.strip()
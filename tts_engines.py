@@ -0,0 +1,198 @@
+"""
+Text-to-speech engines the converter dispatches chunks to.
+
+Every engine turns one chunk of cleaned text into raw 16-bit mono PCM at the
+converter's sample rate, so the audio cache, job checkpoints and assembly work
+the same whichever engine spoke a chunk. OpenAITTSEngine calls the OpenAI
+speech API through the converter session's client and rate budget: HD cloud
+voices, billed per character. EspeakTTSEngine runs espeak-ng processes on
+local cores: plainer voices, but no network, API key or cost, for bulk and
+offline conversions. Conversions pick an engine by name.
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+ENGINE_OPENAI = "openai"
+ENGINE_ESPEAK = "espeak"
+TTS_ENGINES = (ENGINE_OPENAI, ENGINE_ESPEAK)
+DEFAULT_TTS_ENGINE = ENGINE_OPENAI
+
+# espeak-ng voices standing in for the OpenAI voice names, so a job can switch engines without changing voice
+ESPEAK_VOICES = {
+    "alloy": "en-us",
+    "echo": "en-us+m3",
+    "fable": "en-gb+m3",
+    "onyx": "en-us+m7",
+    "nova": "en-us+f3",
+    "shimmer": "en-us+f4",
+}
+# Speaking rate; espeak-ng's default of 175 is brisk for long documents
+ESPEAK_WORDS_PER_MINUTE = 160
+# Seconds one chunk may take to synthesize before espeak-ng is killed
+ESPEAK_TIMEOUT = 300
+
+# Thread pools by worker count, so converters configured with different sizes each get theirs
+_local_tts_pools = {}
+_local_tts_pool_lock = threading.Lock()
+
+
+def find_espeak() -> Optional[str]:
+    """Return the path of the espeak-ng (or espeak) executable, or None if neither is installed."""
+    return shutil.which("espeak-ng") or shutil.which("espeak")
+
+
+def resample_pcm(samples: np.ndarray, from_rate: int, to_rate: int) -> np.ndarray:
+    """Resample 16-bit mono samples by linear interpolation (enough for speech)."""
+    if from_rate == to_rate or len(samples) == 0:
+        return samples
+    count = round(len(samples) * to_rate / from_rate)
+    positions = np.arange(count) * (from_rate / to_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype("<i2")
+
+
+def synthesize_espeak(executable: str, text: str, voice: str, words_per_minute: int, sample_rate: int) -> bytes:
+    """Speak text with espeak-ng and return 16-bit mono PCM at sample_rate."""
+    result = subprocess.run([executable, "-v", voice, "-s", str(words_per_minute), "-b", "1", "--stdout"],
+                            input=text.encode("utf-8"), capture_output=True, timeout=ESPEAK_TIMEOUT)
+    if result.returncode != 0:
+        error = result.stderr.decode("utf-8", errors="replace").strip()
+        raise RuntimeError(f"espeak-ng exited with status {result.returncode}: {error}")
+
+    samples, source_rate = read_wav_pcm(result.stdout)
+    return resample_pcm(samples, source_rate, sample_rate).tobytes()
+
+
+def read_wav_pcm(wav: bytes):
+    """Return (16-bit mono samples, sample rate) from a WAV file's bytes.
+
+    The RIFF chunks are walked in order, so chunks other than "fmt " and "data"
+    are skipped wherever they are. A WAV written to a pipe can't have its sizes
+    filled in afterwards, so a data chunk whose size is 0 or runs past the end
+    of the file is read to the end.
+    """
+    if len(wav) < 12 or wav[:4] != b"RIFF" or wav[8:12] != b"WAVE":
+        raise RuntimeError("espeak-ng returned no audio")
+    source_rate = channels = None
+    position = 12
+    while position + 8 <= len(wav):
+        chunk_id = wav[position:position + 4]
+        size = int.from_bytes(wav[position + 4:position + 8], "little")
+        body = position + 8
+        if chunk_id == b"fmt ":
+            audio_format = int.from_bytes(wav[body:body + 2], "little")
+            channels = max(1, int.from_bytes(wav[body + 2:body + 4], "little"))
+            source_rate = int.from_bytes(wav[body + 4:body + 8], "little")
+            bits = int.from_bytes(wav[body + 14:body + 16], "little")
+            if audio_format != 1 or bits != 16:
+                raise RuntimeError(f"espeak-ng returned unsupported audio (format {audio_format}, {bits} bits)")
+        elif chunk_id == b"data":
+            if source_rate is None:
+                raise RuntimeError("espeak-ng returned audio without a format")
+            # Some writers leave the size of a piped data chunk at 0
+            payload = wav[body:body + size] if size else wav[body:]
+            samples = np.frombuffer(payload, dtype="<i2", count=len(payload) // 2)
+            # Keep the first channel of interleaved frames
+            return samples[::channels], source_rate
+        # Chunks are padded to an even size
+        position = body + size + (size & 1)
+    raise RuntimeError("espeak-ng returned no audio")
+
+
+def get_local_tts_pool(max_workers: int) -> ThreadPoolExecutor:
+    """Return the pool used for local synthesis, with max_workers workers, creating it on first use.
+
+    Each worker only waits on its espeak-ng process, which does the work on a
+    core of its own, so threads are enough; the pool is shared so conversions
+    running at once never start more espeak-ng processes than there are workers.
+    """
+    with _local_tts_pool_lock:
+        pool = _local_tts_pools.get(max_workers)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="espeak")
+            _local_tts_pools[max_workers] = pool
+        return pool
+
+
+class TTSEngine(ABC):
+    """A text-to-speech backend; subclasses set name, label and model and implement synthesize."""
+
+    name = ""
+    label = ""
+    # Part of the audio cache key and job settings, so audio from different engines never mixes
+    model = ""
+    # Whether the converter session needs an OpenAI API key to use this engine
+    needs_api_key = False
+
+    def available(self) -> bool:
+        """True if this engine can run on this system."""
+        return True
+
+    def unavailable_reason(self) -> str:
+        """Why available() is False, for status messages."""
+        return f"{self.label} is not available"
+
+    def concurrency(self, session) -> int:
+        """Chunks to synthesize at once for a converter session."""
+        return session.tts_concurrency
+
+    @abstractmethod
+    def synthesize(self, session, text: str, voice: str) -> bytes:
+        """Return 16-bit mono PCM for text, spoken by voice. Raises on failure."""
+
+
+class OpenAITTSEngine(TTSEngine):
+    """OpenAI's speech API, called with the converter session's client and rate budgets."""
+
+    name = ENGINE_OPENAI
+    label = "OpenAI TTS"
+    needs_api_key = True
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def synthesize(self, session, text: str, voice: str) -> bytes:
+        if not session.client:
+            raise RuntimeError("OpenAI client not initialized. Please set API key first.")
+        # Throttled and transient failures are retried within the rate budgets
+        return session.rate_limiter.call(lambda: session.request_speech(text, voice), characters=len(text))
+
+
+class EspeakTTSEngine(TTSEngine):
+    """espeak-ng on local cores, one espeak-ng process per worker at a time."""
+
+    name = ENGINE_ESPEAK
+    label = "espeak-ng (local)"
+    model = "espeak-ng"
+
+    def __init__(self, sample_rate: int, workers: Optional[int] = None,
+                 words_per_minute: int = ESPEAK_WORDS_PER_MINUTE):
+        self.sample_rate = sample_rate
+        # espeak-ng processes running at once (defaults to one per core)
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.words_per_minute = words_per_minute
+
+    def available(self) -> bool:
+        return find_espeak() is not None
+
+    def unavailable_reason(self) -> str:
+        return "espeak-ng is not installed. Install it (e.g. apt install espeak-ng) to convert offline"
+
+    def concurrency(self, session) -> int:
+        # Keep every worker busy; chunks beyond that would only queue in the pool
+        return self.workers
+
+    def synthesize(self, session, text: str, voice: str) -> bytes:
+        executable = find_espeak()
+        if executable is None:
+            raise RuntimeError(self.unavailable_reason())
+        pool = get_local_tts_pool(self.workers)
+        return pool.submit(synthesize_espeak, executable, text, ESPEAK_VOICES.get(voice, voice),
+                           self.words_per_minute, self.sample_rate).result()